@@ -0,0 +1,116 @@
+# benchmarks/bench_boards.py
+"""Kosten von build_board pro Request und pro Zyklus bei vielen Boards/idents.
+
+    python -m benchmarks.bench_boards [--boards 300] [--idents 300] [--changed 30]
+
+Zusätzlich alle Boards als N einzelne build_board-Aufrufe gegen einen build_boards-Aufruf
+(ein Durchlauf über den Cache, wie /api/boards und die HA-States): kalt und nach Updates.
+"""
+from __future__ import annotations
+import argparse, json, random, time
+from wien_api.boards import set_boards, build_board, build_boards
+from wien_api.state import replace_items, update_item
+from wien_api.model import Item
+
+TOWARDS = ["Floridsdorf", "Strebersdorf", "Hausfeldstraße U", "Oberlaa", "Karlsplatz", "Leopoldau"]
+
+def make_item(ident: int, rnd: random.Random) -> Item:
+    monitors = []
+    for m in range(2):
+        monitors.append({
+            "stop": {"title": f"Stop {ident}", "platform": str(m + 1), "municipality": "Wien", "rbl": ident * 10 + m},
+            "lines": [{
+                "name": str(ln), "towards": rnd.choice(TOWARDS), "type": "ptTram",
+                "departures": [{"countdown": rnd.randint(0, 30), "timePlanned": "", "timeReal": ""} for _ in range(8)],
+            } for ln in range(4)],
+            "trafficInfoCategories": [], "trafficInfos": {},
+        })
+    return Item.from_json({"query": f"diva={ident}", "ok": True, "items": monitors,
+                           "ident": f"diva_{ident}", "ts": 0})
+
+def make_boards(n_boards: int, n_idents: int, rnd: random.Random) -> dict:
+    boards = {}
+    for b in range(n_boards):
+        rules = []
+        for _ in range(3):
+            stop = rnd.randrange(n_idents)
+            rules.append({"stop": f"Stop {stop}", "lines": [
+                {"name": str(rnd.randrange(4)), "towards_regex": rnd.choice(TOWARDS)[:5]},
+                {"name": str(rnd.randrange(4))},
+            ]})
+        boards[f"b{b}"] = {"title": f"Board {b}", "max_departures": 3, "rules": rules}
+    return boards
+
+def setup(n_boards: int, n_idents: int, rnd: random.Random) -> dict:
+    """Boards setzen und LAST_DATA mit n_idents Einträgen füllen. Rückgabe: Board-Specs."""
+    boards = make_boards(n_boards, n_idents, rnd)
+    set_boards(boards)
+    replace_items({f"diva_{i}": make_item(i, rnd) for i in range(n_idents)})
+    return boards
+
+def run(n_boards: int = 300, n_idents: int = 300, changed: int = 30, cycles: int = 10) -> dict:
+    rnd = random.Random(42)
+    boards = setup(n_boards, n_idents, rnd)
+
+    t0 = time.perf_counter()
+    for bid in boards:
+        build_board(bid)
+    cold = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    n_req = 0
+    for _ in range(5):
+        for bid in boards:
+            build_board(bid); n_req += 1
+    per_request = (time.perf_counter() - t0) / n_req
+
+    cycle_times = []
+    for _ in range(cycles):
+        for i in rnd.sample(range(n_idents), changed):
+            update_item(f"diva_{i}", make_item(i, rnd))
+        t0 = time.perf_counter()
+        for bid in boards:
+            build_board(bid)
+        cycle_times.append(time.perf_counter() - t0)
+
+    return {
+        "boards": n_boards, "idents": n_idents, "changed_per_cycle": changed,
+        "cold_all_boards_ms": round(cold * 1e3, 2),
+        "per_request_cached_us": round(per_request * 1e6, 2),
+        "per_cycle_all_boards_ms": round(sum(cycle_times) / len(cycle_times) * 1e3, 2),
+        "separate_vs_single_pass": compare(boards, n_idents, changed, cycles),
+    }
+
+def compare(boards: dict, n_idents: int, changed: int, cycles: int) -> dict:
+    """Alle Boards: N× build_board gegen 1× build_boards (gleiche Updates für beide)."""
+    ids = list(boards)
+    variants = {"separate": lambda: [build_board(b) for b in ids], "single_pass": lambda: build_boards(ids)}
+    res = {}
+    for name, build_all in variants.items():
+        set_boards(boards)  # Board-Caches leeren; Regeln werden erneut ausgewertet
+        t0 = time.perf_counter()
+        build_all()
+        cold = time.perf_counter() - t0
+        times = []
+        crnd = random.Random(5)  # identische Update-Folge je Variante
+        for _ in range(cycles):
+            for i in crnd.sample(range(n_idents), changed):
+                update_item(f"diva_{i}", make_item(i, crnd))
+            t0 = time.perf_counter()
+            build_all()
+            times.append(time.perf_counter() - t0)
+        res[name] = {"cold_ms": round(cold * 1e3, 2),
+                     "per_cycle_ms": round(sum(times) / len(times) * 1e3, 2)}
+    return res
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--boards", type=int, default=300)
+    ap.add_argument("--idents", type=int, default=300)
+    ap.add_argument("--changed", type=int, default=30, help="idents updated per cycle")
+    ap.add_argument("--cycles", type=int, default=10)
+    args = ap.parse_args()
+    print(json.dumps(run(args.boards, args.idents, args.changed, args.cycles)))
+
+if __name__ == "__main__":
+    main()
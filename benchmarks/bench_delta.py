@@ -0,0 +1,109 @@
+# benchmarks/bench_delta.py
+"""Bytes pro Update: ganze Items gegen Deltas (delta.sse / delta.mqtt).
+
+    python -m benchmarks.bench_delta [--idents 20] [--polls 60] [--keyframe-every 30] [--max-ratio 0.5]
+
+Items aus den Antworten in benchmarks/fixtures (wie der Fetch-Loop sie baut). Je Poll
+(30 s) ändert sich, was sich zwischen zwei echten Abfragen ändert: jede zweite Runde
+zählen alle Countdowns eine Minute herunter, einzelne Fahrten verspäten sich (timeReal
++1 min), abgefahrene fallen weg und hinten kommt eine neue dazu.
+Gemessen je Stream: Bytes ganzer Items, Bytes mit Deltas (Keyframes + Deltas), Anteil
+Keyframes, Kodierzeit je Update. Zusätzlich wird geprüft, dass die Deltas beim Client
+(SSE: Kette, MQTT: gegen den Keyframe) wieder genau das Item ergeben.
+"""
+from __future__ import annotations
+import argparse, copy, glob, json, os, random, time
+from typing import Any, Dict, List
+from wien_api.delta import DeltaStream, apply_patch
+from wien_api.fetcher import parse_monitor_response
+from wien_api.model import Item, Monitor
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def fixture_items(n_idents: int) -> List[Dict[str, Any]]:
+    """n_idents Item-JSONs (je 2 Monitore) aus den Fixture-Antworten."""
+    monitors = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES, "*.json"))):
+        with open(path, "rb") as f:
+            data = parse_monitor_response(f.read())["data"]
+        monitors.extend(Monitor.from_wl(m, data) for m in data["monitors"])
+    out = []
+    for i in range(n_idents):
+        mons = tuple(monitors[(2 * i + k) % len(monitors)] for k in range(2))
+        out.append(Item(f"diva={i}", True, mons, ident=f"diva_{i}", ts=0).to_json())
+    return out
+
+def _advance(obj: Dict[str, Any], minute: bool, rnd: random.Random, ts: int) -> Dict[str, Any]:
+    new = copy.deepcopy(obj)
+    new["ts"] = ts
+    for mon in new["items"]:
+        for ln in mon["lines"]:
+            deps = ln["departures"]
+            for d in deps:
+                if minute:
+                    d["countdown"] -= 1
+                if rnd.random() < 0.05:
+                    d["countdown"] += 1
+                    d["timeReal"] = f"{d.get('timeReal', '')[:-1]}{rnd.randrange(10)}"
+            while deps and deps[0]["countdown"] < 0:
+                deps.pop(0)
+                last = deps[-1] if deps else {"countdown": 0, "timePlanned": "", "timeReal": ""}
+                deps.append({**last, "countdown": last["countdown"] + 4})
+    return new
+
+def run(n_idents: int = 20, polls: int = 60, keyframe_every: int = 30, max_ratio: float = 0.5) -> Dict[str, Any]:
+    rnd = random.Random(9)
+    items = fixture_items(n_idents)
+    streams = {"sse": DeltaStream("bench_sse", chain=True), "mqtt": DeltaStream("bench_mqtt", chain=False)}
+    res: Dict[str, Any] = {"idents": n_idents, "polls": polls, "keyframe_every": keyframe_every,
+                           "max_ratio": max_ratio, "item_kb": round(sum(len(json.dumps(o)) for o in items)
+                                                                     / len(items) / 1024, 1)}
+    for name, stream in streams.items():
+        stream.configure(True, keyframe_every, max_ratio)
+        cur = list(items)
+        client: Dict[str, Any] = {}   # SSE: letzter Stand; MQTT: Keyframe
+        full_bytes = sent_bytes = keyframes = updates = 0
+        encode_s = 0.0
+        ok = True
+        prng = random.Random(1)
+        for step in range(polls):
+            for i, obj in enumerate(cur):
+                obj = cur[i] = _advance(obj, step % 2 == 1, prng, step * 30)
+                ident = f"diva_{i}"
+                t0 = time.perf_counter()
+                seq, base, ops = stream.encode(ident, obj)
+                encode_s += time.perf_counter() - t0
+                updates += 1
+                full_bytes += len(json.dumps(obj, ensure_ascii=False))
+                if ops is None:
+                    keyframes += 1
+                    sent_bytes += len(json.dumps(obj, ensure_ascii=False))
+                    client[ident] = obj
+                    continue
+                sent_bytes += len(json.dumps({"ident": ident, "seq": seq, "base": base, "ops": ops},
+                                             ensure_ascii=False, separators=(",", ":")))
+                got = apply_patch(client[ident], ops)
+                ok = ok and got == obj
+                if stream.chain:
+                    client[ident] = got
+        res[name] = {
+            "full_kb": round(full_bytes / 1024, 1),
+            "delta_kb": round(sent_bytes / 1024, 1),
+            "ratio": round(full_bytes / sent_bytes, 1) if sent_bytes else None,
+            "keyframe_share": round(keyframes / updates, 3),
+            "encode_per_update_us": round(encode_s / updates * 1e6, 1),
+            "consistent": ok,
+        }
+    return res
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--idents", type=int, default=20)
+    ap.add_argument("--polls", type=int, default=60)
+    ap.add_argument("--keyframe-every", type=int, default=30)
+    ap.add_argument("--max-ratio", type=float, default=0.5)
+    args = ap.parse_args()
+    print(json.dumps(run(args.idents, args.polls, args.keyframe_every, args.max_ratio)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/bench_fetch.py
+"""Zykluslatenz von fetch_all gegen einen lokalen Stub-Upstream.
+
+    python -m benchmarks.bench_fetch [--latency 0.2] [--concurrency 1 4 8] [--ids 10 20 40 80] [--batch 1 20]
+                                     [--cached] [--etag] [--payloads benchmarks/fixtures] [--fail-rate 0.1]
+
+--cached misst zusätzlich einen zweiten Zyklus mit ResponseCache (unveränderte Antworten);
+--etag lässt den Stub ETags senden und 304 antworten. Stub: benchmarks/stub.py.
+"""
+from __future__ import annotations
+import argparse, json, time
+from typing import Any, Dict, List
+from wien_api.config import WienConf
+from wien_api.fetcher import ResponseCache, fetch_all, make_session
+from .stub import StubUpstream
+
+def start_stub(latency: float, etag: bool = False, payload_dir: str | None = None,
+               fail_rate: float = 0.0) -> StubUpstream:
+    return StubUpstream(payload_dir, latency=latency, etag=etag, fail_rate=fail_rate).start()
+
+def wien_conf(base_url: str, n_ids: int, concurrency: int, batch: int = 1) -> WienConf:
+    return WienConf(
+        base_url=base_url, sender="bench", activate_info=[], interval_seconds=30,
+        http_timeout=10, user_agent="bench", stop_ids=[],
+        diva_ids=[str(60200000 + i) for i in range(n_ids)],
+        max_concurrency=concurrency, cycle_timeout=30, batch_size=batch, max_url_length=2000,
+        adaptive=False, min_interval=30, max_interval=300, max_requests_per_minute=0,
+        quiet_hours=[], quiet_factor=4.0, stale_after=0.0, refresh_deadline=1.5, refresh_per_minute=20,
+    )
+
+def run(stub: StubUpstream, ids: List[int], concurrency: List[int], batch: List[int],
+        cached: bool = False, log: bool = True) -> List[Dict[str, Any]]:
+    results = []
+    for b, conc, n in ((b, c, n) for b in batch for c in concurrency for n in ids):
+        cfg = wien_conf(stub.url, n, conc, b)
+        session = make_session(cfg)
+        cache = ResponseCache() if cached else None
+        t0 = time.perf_counter()
+        items = fetch_all(cfg, session, cache=cache)
+        dt = time.perf_counter() - t0
+        ok = sum(1 for it in items if it.ok)
+        res = {"ids": n, "concurrency": conc, "batch": b, "cycle_s": round(dt, 3), "ok": ok}
+        line = f"ids={n:4d} concurrency={conc:2d} batch={b:3d} cycle={dt:7.3f}s ok={ok}/{len(items)}"
+        if cache is not None:
+            t0 = time.perf_counter()
+            items = fetch_all(cfg, session, cache=cache)
+            dt = time.perf_counter() - t0
+            res["cached_cycle_s"] = round(dt, 3)
+            res["not_modified"] = sum(1 for it in items if it.not_modified)
+            line += f" cached={dt:7.3f}s not_modified={res['not_modified']}/{len(items)}"
+        session.close()
+        results.append(res)
+        if log:
+            print(line)
+    return results
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--latency", type=float, default=0.2)
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    ap.add_argument("--ids", type=int, nargs="+", default=[10, 20, 40, 80])
+    ap.add_argument("--batch", type=int, nargs="+", default=[1])
+    ap.add_argument("--cached", action="store_true")
+    ap.add_argument("--etag", action="store_true")
+    ap.add_argument("--payloads", default=None, help="Verzeichnis mit aufgezeichneten Antworten")
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    args = ap.parse_args()
+
+    stub = start_stub(args.latency, args.etag, args.payloads, args.fail_rate)
+    try:
+        results = run(stub, args.ids, args.concurrency, args.batch, args.cached)
+    finally:
+        stub.close()
+    print(json.dumps(results))
+
+if __name__ == "__main__":
+    main()
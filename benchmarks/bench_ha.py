@@ -0,0 +1,83 @@
+# benchmarks/bench_ha.py
+"""Nachrichtenrate von publish_board_states (Home-Assistant-Sensoren) gegen einen Fake-Broker.
+
+    python -m benchmarks.bench_ha [--boards 50] [--idents 100] [--changed 10] [--cycles 5]
+                                  [--mode sensor board]
+
+Misst pro Zyklus über alle Boards: Nachrichten, Bytes und Dauer – einmal ohne PublishCache
+(alles senden), einmal mit Cache und unveränderten Daten, einmal nach --changed Updates;
+je state_mode (sensor: state+attributes je Sensor, board: ein Dokument je Board).
+Broker: benchmarks/fake_mqtt.py, über FlowControl wie im Worker.
+"""
+from __future__ import annotations
+import argparse, json, os, random, tempfile, time
+from typing import Any, Dict
+import yaml
+from wien_api.config import AppConfig, load_config
+from wien_api.ha_discovery import publish_board_states
+from wien_api.mqtt_flow import FlowControl
+from wien_api.state import update_item
+from wien_api.utils import PublishCache
+from .bench_boards import make_item, setup
+from .fake_mqtt import FakeClient
+
+def bench_config(cfg_dict: Dict[str, Any]) -> AppConfig:
+    with tempfile.NamedTemporaryFile("w", suffix=".yaml", delete=False) as f:
+        yaml.safe_dump(cfg_dict, f)
+    try:
+        return load_config(f.name)
+    finally:
+        os.unlink(f.name)
+
+def _cycle(client: FakeClient, cfg: AppConfig, board_ids, cache: PublishCache | None) -> Dict[str, Any]:
+    client.reset_counts()
+    flow = FlowControl(client, cfg.mqtt.max_inflight)
+    t0 = time.perf_counter()
+    for board_id in board_ids:
+        publish_board_states(flow, cfg, board_id, cache)
+    dt = time.perf_counter() - t0
+    return {"messages": client.messages, "kb": round(client.bytes / 1024, 1), "ms": round(dt * 1e3, 2),
+            "msgs_per_s": round(client.messages / dt) if dt > 0 else None}
+
+def run_mode(state_mode: str, n_boards: int, n_idents: int, changed: int, cycles: int) -> Dict[str, Any]:
+    rnd = random.Random(3)
+    boards = setup(n_boards, n_idents, rnd)
+    cfg = bench_config({"mqtt": {"discovery": {"enabled": True, "state_mode": state_mode}}, "boards": boards})
+    client = FakeClient()
+    board_ids = list(boards)
+
+    full = _cycle(client, cfg, board_ids, None)
+    cache = PublishCache()
+    _cycle(client, cfg, board_ids, cache)  # Cache füllen
+    unchanged = _cycle(client, cfg, board_ids, cache)
+    after = []
+    for _ in range(cycles):
+        for i in rnd.sample(range(n_idents), changed):
+            update_item(f"diva_{i}", make_item(i, rnd))
+        after.append(_cycle(client, cfg, board_ids, cache))
+    return {
+        "full": full, "unchanged": unchanged,
+        "after_changes": {"messages": round(sum(c["messages"] for c in after) / len(after), 1),
+                          "kb": round(sum(c["kb"] for c in after) / len(after), 1),
+                          "ms": round(sum(c["ms"] for c in after) / len(after), 2)},
+    }
+
+def run(n_boards: int = 50, n_idents: int = 100, changed: int = 10, cycles: int = 5,
+        modes: tuple = ("sensor", "board")) -> Dict[str, Any]:
+    res: Dict[str, Any] = {"boards": n_boards, "idents": n_idents, "changed_per_cycle": changed}
+    for mode in modes:
+        res[mode] = run_mode(mode, n_boards, n_idents, changed, cycles)
+    return res
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--boards", type=int, default=50)
+    ap.add_argument("--idents", type=int, default=100)
+    ap.add_argument("--changed", type=int, default=10, help="idents updated per cycle")
+    ap.add_argument("--cycles", type=int, default=5)
+    ap.add_argument("--mode", nargs="+", choices=["sensor", "board"], default=["sensor", "board"])
+    args = ap.parse_args()
+    print(json.dumps(run(args.boards, args.idents, args.changed, args.cycles, tuple(args.mode))))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# benchmarks/bench_log.py
+"""Kosten einer Logzeile im aufrufenden Thread: print vs. LOG (Queue + Writer-Thread).
+
+    python -m benchmarks.bench_log [--lines 20000] [--format text|json] [--sample-rate 1.0] > /dev/null
+
+Die Ergebnisse gehen nach stderr; stdout ist das Logziel. Interessant ist ein langsamer
+Leser (Docker-Logtreiber, ARM): `... | python -c "import sys,time; [time.sleep(5e-5) for _ in sys.stdin]"`
+– print blockiert dann den Aufrufer, LOG nicht.
+"""
+from __future__ import annotations
+import argparse, json, sys, time
+from wien_api.log import Logger
+
+def run(lines: int = 20000, fmt: str = "text", sample_rate: float = 1.0) -> dict:
+    t0 = time.perf_counter()
+    for i in range(lines):
+        print(f"[mqtt] published topic=vienna/lines/diva_{i % 300} rc=0 bytes={1200 + i % 50}")
+    sys.stdout.flush()
+    t_print = time.perf_counter() - t0
+
+    log = Logger(queue_size=lines + 1)
+    log.configure("info", fmt, sample_rate)
+    t0 = time.perf_counter()
+    for i in range(lines):
+        log.info("mqtt", "published", sample=True, topic=f"vienna/lines/diva_{i % 300}", rc=0, bytes=1200 + i % 50)
+    t_call = time.perf_counter() - t0
+    log.flush(timeout=60)
+    t_total = time.perf_counter() - t0
+    return {"lines": lines, "format": fmt, "sample_rate": sample_rate,
+            "print_us": round(t_print / lines * 1e6, 2),
+            "log_call_us": round(t_call / lines * 1e6, 2),
+            "log_until_written_us": round(t_total / lines * 1e6, 2),
+            "written": log.written, "dropped": log.dropped}
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=20000)
+    ap.add_argument("--format", choices=["text", "json"], default="text")
+    ap.add_argument("--sample-rate", type=float, default=1.0)
+    args = ap.parse_args()
+    print(json.dumps(run(args.lines, args.format, args.sample_rate)), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
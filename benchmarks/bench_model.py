@@ -0,0 +1,108 @@
+# benchmarks/bench_model.py
+"""Speicher und CPU: kompaktes Modell (wien_api.model) vs. verschachtelte dicts, stadtweit.
+
+    python -m benchmarks.bench_model [--monitors 4000] [--boards 300]
+
+Referenz "dict" ist die frühere Darstellung (ein dict pro Stop/Linie/Abfahrt, wie das API-JSON).
+"""
+from __future__ import annotations
+import argparse, gc, json, random, time, tracemalloc
+from wien_api.boards import set_boards, build_board
+from wien_api.model import Item, Monitor
+from wien_api.state import replace_items
+
+TOWARDS = ["Floridsdorf", "Strebersdorf", "Hausfeldstraße U", "Oberlaa", "Karlsplatz", "Leopoldau",
+           "Heiligenstadt", "Simmering", "Ottakring", "Seestadt"]
+
+def wl_monitor(i: int, rnd: random.Random) -> dict:
+    """Ein Monitor im Format der Wiener-Linien-Antwort."""
+    lines = []
+    for _ in range(rnd.randint(1, 4)):
+        deps = []
+        for k in range(10):
+            h, m = divmod(8 * 60 + k * 4 + rnd.randint(0, 3), 60)
+            tp = f"2025-10-17T{h:02d}:{m:02d}:00.000+0200"
+            deps.append({"departureTime": {"countdown": k * 4, "timePlanned": tp, "timeReal": tp}})
+        lines.append({"name": str(rnd.randint(1, 80)), "towards": rnd.choice(TOWARDS), "type": "ptTram",
+                      "richtungsId": "1", "barrierFree": True, "departures": {"departure": deps}})
+    return {"locationStop": {"properties": {"name": str(60200000 + i), "title": f"Stop {i // 2}",
+                                            "municipality": "Wien", "platform": str(i % 2 + 1),
+                                            "attributes": {"rbl": i}}}, "lines": lines}
+
+def dict_monitor(mon: dict, data: dict) -> dict:
+    """Frühere Darstellung (nested dicts), zum Vergleich."""
+    stop = (mon.get("locationStop", {}) or {}).get("properties", {}) or {}
+    lines = []
+    for ln in mon.get("lines", []) or []:
+        deps = (ln.get("departures", {}) or {}).get("departure", []) or []
+        lines.append({"name": ln.get("name"), "towards": ln.get("towards"), "type": ln.get("type"),
+                      "departures": [{"countdown": d.get("departureTime", {}).get("countdown"),
+                                      "timePlanned": d.get("departureTime", {}).get("timePlanned"),
+                                      "timeReal": d.get("departureTime", {}).get("timeReal")} for d in deps][:8]})
+    return {"stop": {"title": stop.get("title"), "municipality": stop.get("municipality"),
+                     "platform": stop.get("platform") or stop.get("gate"),
+                     "rbl": (stop.get("attributes", {}) or {}).get("rbl")},
+            "lines": lines, "trafficInfoCategories": data.get("trafficInfoCategories", []) or [],
+            "trafficInfos": data.get("trafficInfos") or {}}
+
+def measure(build):
+    """(Ergebnis, Sekunden, belegte Bytes) für build()."""
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    res = build()
+    dt = time.perf_counter() - t0
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return res, dt, size
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--monitors", type=int, default=4000)
+    ap.add_argument("--boards", type=int, default=300)
+    args = ap.parse_args()
+
+    rnd = random.Random(7)
+    payloads = [(wl_monitor(i, rnd), {"trafficInfos": [], "trafficInfoCategories": []})
+                for i in range(args.monitors)]
+    # Zeit-Messung ohne tracemalloc (verzerrt sonst die CPU-Werte)
+    t0 = time.perf_counter()
+    dicts = [{"query": "", "ok": True, "items": [dict_monitor(m, d)]} for m, d in payloads]
+    dict_parse = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    items = [Item("", True, (Monitor.from_wl(m, d),)) for m, d in payloads]
+    model_parse = time.perf_counter() - t0
+    del dicts, items
+
+    dicts, _, dict_mem = measure(lambda: [{"query": "", "ok": True, "items": [dict_monitor(m, d)]}
+                                          for m, d in payloads])
+    items, _, model_mem = measure(lambda: [Item("", True, (Monitor.from_wl(m, d),)) for m, d in payloads])
+
+    t0 = time.perf_counter()
+    json.dumps(dicts, ensure_ascii=False)
+    dict_dump = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    json.dumps([it.to_json() for it in items], ensure_ascii=False)
+    model_dump = time.perf_counter() - t0
+
+    boards = {f"b{b}": {"title": f"Board {b}", "max_departures": 3, "rules": [
+        {"stop": f"Stop {rnd.randrange(args.monitors // 2)}",
+         "lines": [{"towards_regex": rnd.choice(TOWARDS)[:5]}]} for _ in range(3)]} for b in range(args.boards)}
+    set_boards(boards)
+    replace_items({f"diva_{i}": it for i, it in enumerate(items)})
+    t0 = time.perf_counter()
+    for bid in boards:
+        build_board(bid)
+    boards_cold = time.perf_counter() - t0
+
+    res = {
+        "monitors": args.monitors,
+        "dict_mem_mb": round(dict_mem / 2**20, 2), "model_mem_mb": round(model_mem / 2**20, 2),
+        "dict_parse_ms": round(dict_parse * 1e3, 1), "model_parse_ms": round(model_parse * 1e3, 1),
+        "dict_dump_ms": round(dict_dump * 1e3, 1), "model_dump_ms": round(model_dump * 1e3, 1),
+        "boards": args.boards, "boards_cold_ms": round(boards_cold * 1e3, 1),
+    }
+    print(json.dumps(res))
+
+if __name__ == "__main__":
+    main()
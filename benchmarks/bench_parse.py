@@ -0,0 +1,129 @@
+# benchmarks/bench_parse.py
+"""Parse-Zeit und Spitzenspeicher für Monitor-Antworten: json, json + Projektion, orjson.
+
+    python -m benchmarks.bench_parse [--payloads antwort1.json ...] [--record DIR] [--monitors 40] [--runs 20]
+
+Ohne --payloads werden Antworten im Format der Wiener-Linien-API erzeugt (mit Fahrzeugdaten je
+Abfahrt, Geometrie, Verkehrsinfos wie bei activateTrafficInfo=stoerunglang); --record schreibt sie
+als Dateien, damit Messungen mit denselben Bytes wiederholt werden können.
+"""
+from __future__ import annotations
+import argparse, gc, json, os, random, time, tracemalloc
+from typing import Any, Callable, Dict, List
+from wien_api import fetcher
+from wien_api.model import Monitor
+
+TOWARDS = ["Floridsdorf", "Strebersdorf", "Hausfeldstraße U", "Oberlaa", "Karlsplatz", "Leopoldau"]
+
+def _vehicle(name: str, towards: str) -> Dict[str, Any]:
+    return {"name": name, "towards": towards, "direction": "H", "richtungsId": "1", "barrierFree": True,
+            "foldingRamp": False, "realtimeSupported": True, "trafficjam": False, "type": "ptTram",
+            "attributes": {}, "linienId": 126}
+
+def wl_payload(n_monitors: int, rnd: random.Random, departures: int = 40) -> Dict[str, Any]:
+    monitors = []
+    for i in range(n_monitors):
+        lines = []
+        for _ in range(rnd.randint(1, 3)):
+            name, towards = str(rnd.randint(1, 80)), rnd.choice(TOWARDS)
+            deps = []
+            for k in range(departures):
+                h, m = divmod(8 * 60 + k * 4 + rnd.randint(0, 3), 60)
+                tp = f"2025-10-17T{h % 24:02d}:{m:02d}:00.000+0200"
+                deps.append({"departureTime": {"timePlanned": tp, "timeReal": tp, "countdown": k * 4},
+                             "vehicle": _vehicle(name, towards)})
+            lines.append({"name": name, "towards": towards, "direction": "H", "platform": "1",
+                          "richtungsId": "1", "barrierFree": True, "realtimeSupported": True,
+                          "trafficjam": False, "departures": {"departure": deps}, "type": "ptTram",
+                          "lineId": 126})
+        monitors.append({
+            "locationStop": {"type": "Feature",
+                             "geometry": {"type": "Point", "coordinates": [16.38 + i / 1e4, 48.2]},
+                             "properties": {"name": str(60200000 + i), "title": f"Stop {i}",
+                                            "municipality": "Wien", "municipalityId": 90001, "type": "stop",
+                                            "coordName": "WGS84", "gate": "1",
+                                            "attributes": {"rbl": 4000 + i}}},
+            "lines": lines, "attributes": {}})
+    infos = [{"refTrafficInfoCategoryId": 2, "name": f"ma{j}", "priority": "1", "owner": "WL",
+              "title": "Gleisbauarbeiten", "description": "Wegen Bauarbeiten " * 20,
+              "time": {"start": "2025-10-01T04:00:00.000+0200", "end": "2025-11-01T23:59:00.000+0200"},
+              "relatedLines": ["26", "27"], "relatedStops": [60200000 + j],
+              "attributes": {"status": "aktiv"}} for j in range(10)]
+    return {"data": {"monitors": monitors, "trafficInfoCategories": [{"id": 2, "name": "stoerunglang"}],
+                     "trafficInfos": infos},
+            "message": {"value": "OK", "messageCode": 1, "serverTime": "2025-10-17T08:00:00.000+0200"}}
+
+def _json_full(body: bytes) -> Any:
+    return json.loads(body)
+
+def _json_project(body: bytes) -> Any:
+    return fetcher._PROJECTING_DECODER.decode(body.decode("utf-8"))
+
+def _to_monitors(payload: Any) -> List[Monitor]:
+    data = payload.get("data", {})
+    return [Monitor.from_wl(m, data) for m in data.get("monitors", [])]
+
+def _measure(parse: Callable[[bytes], Any], bodies: List[bytes], runs: int) -> Dict[str, float]:
+    for b in bodies:  # Aufwärmen
+        _to_monitors(parse(b))
+    gc.collect()
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        for b in bodies:
+            parse(b)
+    parse_ms = (time.perf_counter() - t0) * 1e3 / runs
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        for b in bodies:
+            _to_monitors(parse(b))
+    total_ms = (time.perf_counter() - t0) * 1e3 / runs
+    peak = 0
+    for b in bodies:  # Spitze pro Antwort (so läuft es in _fetch_batch)
+        gc.collect()
+        tracemalloc.start()
+        _to_monitors(parse(b))
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return {"parse_ms": round(parse_ms, 2), "parse_to_model_ms": round(total_ms, 2),
+            "peak_kb": round(peak / 1024, 1)}
+
+def run(bodies: List[bytes], runs: int = 20, log: bool = True) -> Dict[str, Any]:
+    # alle Varianten müssen dasselbe Modell liefern
+    ref = [[m.to_json() for m in _to_monitors(_json_full(b))] for b in bodies]
+    backends: Dict[str, Callable[[bytes], Any]] = {"json": _json_full, "json_project": _json_project}
+    if fetcher.orjson is not None:
+        backends["orjson"] = fetcher.orjson.loads
+    res: Dict[str, Any] = {"responses": len(bodies), "body_kb": round(sum(map(len, bodies)) / 1024, 1),
+                           "default": fetcher.JSON_BACKEND}
+    for name, parse in backends.items():
+        assert [[m.to_json() for m in _to_monitors(parse(b))] for b in bodies] == ref, name
+        res[name] = _measure(parse, bodies, runs)
+        if log:
+            print(f"{name:13s} {res[name]}")
+    return res
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--payloads", nargs="*", default=[])
+    ap.add_argument("--record", default=None)
+    ap.add_argument("--monitors", type=int, default=40, help="Monitore pro erzeugter Antwort")
+    ap.add_argument("--responses", type=int, default=5)
+    ap.add_argument("--runs", type=int, default=20)
+    args = ap.parse_args()
+
+    if args.payloads:
+        bodies = [open(p, "rb").read() for p in args.payloads]
+    else:
+        rnd = random.Random(7)
+        bodies = [json.dumps(wl_payload(args.monitors, rnd), ensure_ascii=False).encode("utf-8")
+                  for _ in range(args.responses)]
+        if args.record:
+            os.makedirs(args.record, exist_ok=True)
+            for i, b in enumerate(bodies):
+                with open(os.path.join(args.record, f"monitor_{i}.json"), "wb") as f:
+                    f.write(b)
+
+    print(json.dumps(run(bodies, args.runs)))
+
+if __name__ == "__main__":
+    main()
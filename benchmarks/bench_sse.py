@@ -0,0 +1,228 @@
+# benchmarks/bench_sse.py
+"""SSE-Benchmarks (http.server: async vs. waitress).
+
+    python -m benchmarks.bench_sse [--server async] [--clients 2000] [--requests 500] [--threads 16]
+    python -m benchmarks.bench_sse --scenario fanout [--clients 500] [--events 50] [--publish-rate 20]
+
+latency: öffnet --clients idle /api/stream-Verbindungen, veröffentlicht währenddessen Updates
+und misst parallel die Latenz von /health und /api/board/<id>. Bei waitress blockiert
+jeder Stream einen Worker-Thread; Requests laufen dann in den Timeout.
+fanout: --clients Streams lesen mit; --events ungetaggte Events (an alle) mit Sendezeitpunkt,
+gemessen wird publish -> beim Client gelesen (inkl. Client-Event-Loop) und wie viele ankommen.
+(Für viele Clients ggf. `ulimit -n` erhöhen.)
+"""
+from __future__ import annotations
+import argparse, asyncio, json, os, random, resource, statistics, tempfile, threading, time
+import yaml
+from wien_api import create_app
+from wien_api.config import load_config
+from wien_api.state import HUB, update_item
+from .bench_boards import make_boards, make_item
+
+def make_app(n_idents: int, threads: int, server: str):
+    rnd = random.Random(1)
+    cfg_dict = {"http": {"server": server, "waitress_threads": threads, "compress": False},
+                "boards": make_boards(20, n_idents, rnd)}
+    with tempfile.NamedTemporaryFile("w", suffix=".yaml", delete=False) as f:
+        yaml.safe_dump(cfg_dict, f)
+    try:
+        cfg = load_config(f.name)
+    finally:
+        os.unlink(f.name)
+    for i in range(n_idents):
+        update_item(f"diva_{i}", make_item(i, rnd))
+    return create_app(cfg), cfg
+
+def start_server(app, server: str, threads: int) -> int:
+    """Startet den Server im Hintergrund; Rückgabe: Port."""
+    ready = threading.Event()
+    port: list = []
+    if server == "async":
+        from wien_api.async_server import AsyncServer
+
+        def run():
+            async def main():
+                srv = AsyncServer(app, "127.0.0.1", 0, threads)
+                await srv.start()
+                port.append(srv.port)
+                ready.set()
+                await asyncio.Event().wait()
+            asyncio.run(main())
+    else:
+        from waitress.server import create_server
+
+        def run():
+            srv = create_server(app, host="127.0.0.1", port=0, threads=threads, connection_limit=100000)
+            port.append(srv.effective_port)
+            ready.set()
+            srv.run()
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return port[0]
+
+async def open_stream(port: int, board: str | None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    path = f"/api/stream?board={board}" if board else "/api/stream"
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: bench\r\nAccept: text/event-stream\r\n\r\n".encode())
+    await writer.drain()
+
+    first = asyncio.get_running_loop().create_future()
+
+    async def drain():  # Client liest nur mit, damit der Server nicht am Socket-Puffer hängt
+        try:
+            while await reader.read(65536):
+                if not first.done():
+                    first.set_result(None)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+    return writer, asyncio.create_task(drain()), first
+
+async def timed_get(port: int, path: str, timeout: float) -> float | None:
+    t0 = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), timeout)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n".encode())
+        await asyncio.wait_for(reader.read(), timeout)
+        writer.close()
+        return time.perf_counter() - t0
+    except (asyncio.TimeoutError, ConnectionError):
+        return None
+
+async def run(args) -> dict:
+    app, cfg = make_app(args.idents, args.threads, args.server)
+    port = start_server(app, args.server, args.threads)
+    boards = list(cfg.boards)
+
+    t0 = time.perf_counter()
+    streams = []
+    for i in range(args.clients):
+        streams.append(await open_stream(port, boards[i % len(boards)] if i % 2 else None))
+    # warten, bis alle Streams Header + Snapshot bekommen haben (waitress: nur so viele wie Threads)
+    await asyncio.wait([first for _, _, first in streams], timeout=args.timeout)
+    connect_s = time.perf_counter() - t0
+
+    stop = threading.Event()
+
+    def publisher():  # Updates wie aus dem Fetch-Loop
+        i = 0
+        while not stop.is_set():
+            ident = f"diva_{i % args.idents}"
+            HUB.publish(json.dumps({"type": "update", "ident": ident}), tags=[f"ident:{ident}"])
+            i += 1
+            time.sleep(1 / args.publish_rate)
+    threading.Thread(target=publisher, daemon=True).start()
+
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def one(i: int):
+        async with sem:
+            path = "/health" if i % 2 else f"/api/board/{boards[i % len(boards)]}"
+            return await timed_get(port, path, args.timeout)
+    lat = await asyncio.gather(*(one(i) for i in range(args.requests)))
+    stop.set()
+    for writer, task, _ in streams:
+        writer.close()
+        task.cancel()
+
+    ok = sorted(x for x in lat if x is not None)
+    q = lambda p: round(ok[min(int(len(ok) * p), len(ok) - 1)] * 1000, 2) if ok else None
+    return {"server": args.server, "clients": args.clients, "threads": args.threads,
+            "connect_s": round(connect_s, 2), "requests": args.requests, "ok": len(ok),
+            "p50_ms": q(0.5), "p99_ms": q(0.99),
+            "mean_ms": round(statistics.mean(ok) * 1000, 2) if ok else None}
+
+async def _listen(port: int, board: str | None, lat: list, ready: asyncio.Future):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    path = f"/api/stream?board={board}" if board else "/api/stream"
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: bench\r\nAccept: text/event-stream\r\n\r\n".encode())
+    await writer.drain()
+
+    async def read():
+        buf = b""
+        try:
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    return
+                now = time.perf_counter()
+                if not ready.done():
+                    ready.set_result(None)
+                *lines, buf = (buf + chunk).split(b"\n")
+                for ln in lines:
+                    if ln.startswith(b"data: ") and b'"type": "bench"' in ln:
+                        lat.append(now - json.loads(ln[6:])["t"])
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+    return writer, asyncio.create_task(read())
+
+async def fanout(args) -> dict:
+    app, cfg = make_app(args.idents, args.threads, args.server)
+    port = start_server(app, args.server, args.threads)
+    boards = list(cfg.boards)
+    loop = asyncio.get_running_loop()
+
+    lat: list = []
+    readies = [loop.create_future() for _ in range(args.clients)]
+    t0 = time.perf_counter()
+    streams = [await _listen(port, boards[i % len(boards)] if i % 2 else None, lat, readies[i])
+               for i in range(args.clients)]
+    await asyncio.wait(readies, timeout=args.timeout)
+    connect_s = time.perf_counter() - t0
+    connected = sum(1 for r in readies if r.done())
+
+    def publisher():
+        for seq in range(args.events):
+            HUB.publish(json.dumps({"type": "bench", "seq": seq, "t": time.perf_counter()}))
+            time.sleep(1 / args.publish_rate)
+    t0 = time.perf_counter()
+    await loop.run_in_executor(None, publisher)
+    expected = connected * args.events
+    deadline = time.perf_counter() + args.timeout
+    while len(lat) < expected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    total_s = time.perf_counter() - t0
+    for writer, task in streams:
+        writer.close()
+        task.cancel()
+
+    ok = sorted(lat)
+    q = lambda p: round(ok[min(int(len(ok) * p), len(ok) - 1)] * 1000, 2) if ok else None
+    return {"server": args.server, "clients": args.clients, "connected": connected,
+            "connect_s": round(connect_s, 2), "events": args.events,
+            "delivered": len(ok), "expected": expected,
+            "deliveries_per_s": round(len(ok) / total_s) if total_s > 0 else None,
+            "p50_ms": q(0.5), "p99_ms": q(0.99), "max_ms": q(1.0)}
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scenario", choices=["latency", "fanout"], default="latency")
+    ap.add_argument("--server", choices=["async", "waitress"], default="async")
+    ap.add_argument("--clients", type=int, default=2000)
+    ap.add_argument("--requests", type=int, default=500)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--idents", type=int, default=50)
+    ap.add_argument("--publish-rate", type=float, default=2.0)
+    ap.add_argument("--timeout", type=float, default=5.0)
+    ap.add_argument("--events", type=int, default=50, help="fanout: Events pro Lauf")
+    args = ap.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    want = min(hard, 2 * args.clients + 1024)
+    if soft < want:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (want, hard))
+
+    if args.scenario == "fanout":
+        res = asyncio.run(fanout(args))
+        print(f"server={res['server']} clients={res['connected']}/{res['clients']} "
+              f"delivered={res['delivered']}/{res['expected']} p50={res['p50_ms']}ms p99={res['p99_ms']}ms")
+        print(json.dumps(res))
+        return
+    res = asyncio.run(run(args))
+    print(f"server={res['server']} clients={res['clients']} threads={res['threads']} "
+          f"connect={res['connect_s']}s ok={res['ok']}/{res['requests']} "
+          f"p50={res['p50_ms']}ms p99={res['p99_ms']}ms")
+    print(json.dumps(res))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# benchmarks/bench_state.py
+"""Viele lesende Threads gegen einen Schreiber auf dem Item-Cache (LAST_DATA).
+
+    python -m benchmarks.bench_state [--idents 300] [--readers 16] [--duration 2] [--write-rate 200]
+
+Varianten:
+  dict_iter  gemeinsames dict, Leser iterieren direkt (zählt "changed size during iteration")
+  dict_copy  gemeinsames dict, Leser kopieren erst (list(d.values())) – der frühere Stand
+  locked     dict hinter einem Lock, Leser kopieren unter dem Lock
+  snapshot   wien_api.state: unveränderlicher Snapshot, Schreiber tauscht ihn aus (copy-on-write)
+
+Gemessen: Lesevorgänge/s über alle Leser, Leselatenz p50/p99, Schreiblatenz p50/p99, Fehler.
+Ein Lesevorgang läuft über alle Items und zählt deren Monitore (wie items_json/_refresh, ohne JSON).
+"""
+from __future__ import annotations
+import argparse, json, random, threading, time
+from typing import Any, Callable, Dict, List, Tuple
+from wien_api import state
+from wien_api.model import Item
+from .bench_boards import make_item
+
+def _pct(xs: List[float], q: float) -> float | None:
+    if not xs:
+        return None
+    xs = sorted(xs)
+    return xs[min(int(len(xs) * q), len(xs) - 1)]
+
+Ops = Tuple[Callable[[], int], Callable[[str, Item], None], Callable[[str], None]]
+
+def _variant(name: str, items: Dict[str, Item]) -> Ops:
+    """(read, write, remove) für eine Variante; read() liefert die Anzahl gelesener Monitore."""
+    if name == "snapshot":
+        state.replace_items(items)
+
+        def read() -> int:
+            return sum(len(it.monitors) for it in state.snapshot().values())
+        return read, state.update_item, lambda ident: state.remove_items((ident,))
+
+    d = dict(items)
+    lock = threading.Lock() if name == "locked" else None
+    if name == "dict_iter":
+        def read() -> int:
+            return sum(len(it.monitors) for it in d.values())
+    elif name == "dict_copy":
+        def read() -> int:
+            return sum(len(it.monitors) for it in list(d.values()))
+    elif name == "locked":
+        def read() -> int:
+            with lock:
+                vals = list(d.values())
+            return sum(len(it.monitors) for it in vals)
+    else:
+        raise ValueError(name)
+
+    def write(ident: str, item: Item) -> None:
+        if lock is None:
+            d[ident] = item
+            return
+        with lock:
+            d[ident] = item
+
+    def remove(ident: str) -> None:
+        if lock is None:
+            d.pop(ident, None)
+            return
+        with lock:
+            d.pop(ident, None)
+    return read, write, remove
+
+def run_variant(name: str, n_idents: int, readers: int, duration: float, write_rate: float,
+                churn: float = 0.1) -> Dict[str, Any]:
+    """write_rate: Updates/s (0 = so schnell wie möglich). churn: Anteil der Updates, die einen
+       neuen ident hinzufügen bzw. einen alten entfernen (dict-Größe ändert sich -> Iterationsfehler).
+    """
+    rnd = random.Random(7)
+    items = {f"diva_{i}": make_item(i, rnd) for i in range(n_idents)}
+    pool = [make_item(i, rnd) for i in range(n_idents)]
+    read, write, remove = _variant(name, items)
+    stop = threading.Event()
+    read_lat: List[List[float]] = [[] for _ in range(readers)]
+    errors = [0] * readers
+    write_lat: List[float] = []
+    extra: List[str] = []
+
+    def reader(k: int) -> None:
+        lat = read_lat[k]
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            try:
+                read()
+            except RuntimeError:
+                errors[k] += 1
+                continue
+            lat.append(time.perf_counter() - t0)
+
+    def writer() -> None:
+        wrnd = random.Random(11)
+        gap = 1.0 / write_rate if write_rate > 0 else 0.0
+        nxt = time.perf_counter()
+        n = 0
+        while not stop.is_set():
+            n += 1
+            if wrnd.random() < churn:
+                if extra and wrnd.random() < 0.5:
+                    ident, item = extra.pop(), None
+                else:
+                    ident = f"extra_{n}"
+                    extra.append(ident)
+                    item = pool[n % len(pool)]
+            else:
+                ident, item = f"diva_{wrnd.randrange(n_idents)}", pool[n % len(pool)]
+            t0 = time.perf_counter()
+            if item is None:
+                remove(ident)
+            else:
+                write(ident, item)
+            write_lat.append(time.perf_counter() - t0)
+            if gap:
+                nxt += gap
+                delay = nxt - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+    threads = [threading.Thread(target=reader, args=(k,), daemon=True) for k in range(readers)]
+    threads.append(threading.Thread(target=writer, daemon=True))
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    lat = [x for xs in read_lat for x in xs]
+    return {
+        "reads_per_s": round(len(lat) / elapsed),
+        "read_p50_us": round(_pct(lat, 0.5) * 1e6, 1) if lat else None,
+        "read_p99_us": round(_pct(lat, 0.99) * 1e6, 1) if lat else None,
+        "writes": len(write_lat),
+        "write_p50_us": round(_pct(write_lat, 0.5) * 1e6, 1) if write_lat else None,
+        "write_p99_us": round(_pct(write_lat, 0.99) * 1e6, 1) if write_lat else None,
+        "read_errors": sum(errors),
+    }
+
+def run(n_idents: int = 300, readers: int = 16, duration: float = 2.0, write_rate: float = 200.0,
+        variants: Tuple[str, ...] = ("dict_iter", "dict_copy", "locked", "snapshot")) -> Dict[str, Any]:
+    res: Dict[str, Any] = {"idents": n_idents, "readers": readers, "duration_s": duration,
+                           "write_rate": write_rate}
+    for v in variants:
+        res[v] = run_variant(v, n_idents, readers, duration, write_rate)
+    return res
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--idents", type=int, default=300)
+    ap.add_argument("--readers", type=int, default=16)
+    ap.add_argument("--duration", type=float, default=2.0, help="seconds per variant")
+    ap.add_argument("--write-rate", type=float, default=200.0, help="updates per second (0 = unthrottled)")
+    ap.add_argument("--variant", nargs="+", choices=["dict_iter", "dict_copy", "locked", "snapshot"],
+                    default=["dict_iter", "dict_copy", "locked", "snapshot"])
+    args = ap.parse_args()
+    print(json.dumps(run(args.idents, args.readers, args.duration, args.write_rate, tuple(args.variant))))
+
+if __name__ == "__main__":
+    main()
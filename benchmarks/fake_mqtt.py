@@ -0,0 +1,103 @@
+# benchmarks/fake_mqtt.py
+"""In-Process-Ersatz für paho.mqtt.client.Client (nur was wien_api benutzt), für Benchmarks.
+
+Zählt Nachrichten/Bytes pro Topic-Art, hält retained Messages und liefert an Abonnenten
+(message_callback_add, sonst on_message) direkt im aufrufenden Thread aus – kein Broker, keine Sockets.
+"""
+from __future__ import annotations
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List, Tuple
+
+class _Info:
+    __slots__ = ("rc", "mid")
+
+    def __init__(self, rc: int, mid: int) -> None:
+        self.rc = rc
+        self.mid = mid
+
+class _Msg:
+    __slots__ = ("topic", "payload", "qos", "retain")
+
+    def __init__(self, topic: str, payload: bytes, qos: int, retain: bool) -> None:
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+
+def _matches(pattern: str, topic: str) -> bool:
+    p, t = pattern.split("/"), topic.split("/")
+    for i, part in enumerate(p):
+        if part == "#":
+            return True
+        if i >= len(t) or (part != "+" and part != t[i]):
+            return False
+    return len(p) == len(t)
+
+class FakeClient:
+    def __init__(self, fail_every: int = 0) -> None:
+        self._lock = threading.Lock()
+        self._mid = 0
+        self.fail_every = fail_every  # jede n-te publish mit rc=4 (MQTT_ERR_NO_CONN), 0 = nie
+        self.messages = 0
+        self.bytes = 0
+        self.by_kind: Counter = Counter()  # letzter Topic-Teil (state, attributes, config, ...)
+        self.retained: Dict[str, bytes] = {}
+        self.subscriptions: List[str] = []
+        self.on_message = None
+        self.callbacks: Dict[str, Callable] = {}  # message_callback_add: Topic-Filter -> Callback
+        self.on_publish = None  # wird (wie bei einem schnellen Broker) sofort aufgerufen
+        self.on_connect = None
+        self.on_disconnect = None
+        self.log: List[Tuple[str, int]] | None = None  # optional: (topic, bytes) je Nachricht
+
+    def publish(self, topic: str, payload: Any = None, qos: int = 0, retain: bool = False) -> _Info:
+        data = payload.encode("utf-8") if isinstance(payload, str) else (payload or b"")
+        with self._lock:
+            self._mid += 1
+            rc = 4 if self.fail_every and self._mid % self.fail_every == 0 else 0
+            if rc == 0:
+                self.messages += 1
+                self.bytes += len(data)
+                self.by_kind[topic.rsplit("/", 1)[-1] if "/boards/" in topic or topic.endswith("/config")
+                             else "departures"] += 1
+                if retain:
+                    self.retained[topic] = data
+                if self.log is not None:
+                    self.log.append((topic, len(data)))
+            handler = None
+            if rc == 0 and any(_matches(s, topic) for s in self.subscriptions):
+                handler = next((cb for f, cb in self.callbacks.items() if _matches(f, topic)), self.on_message)
+            mid = self._mid
+        if rc == 0 and self.on_publish is not None:
+            self.on_publish(self, None, mid, 0, None)
+        if handler is not None:
+            handler(self, None, _Msg(topic, data, qos, retain))
+        return _Info(rc, mid)
+
+    def subscribe(self, topic: str, qos: int = 0) -> Tuple[int, int]:
+        with self._lock:
+            self.subscriptions.append(topic)
+        return 0, 0
+
+    def message_callback_add(self, sub: str, callback: Callable) -> None:
+        with self._lock:
+            self.callbacks[sub] = callback
+
+    def reset_counts(self) -> None:
+        with self._lock:
+            self.messages = 0
+            self.bytes = 0
+            self.by_kind.clear()
+
+    # von wien_api aufgerufen, hier ohne Wirkung
+    def username_pw_set(self, *a, **kw) -> None: pass
+    def will_set(self, *a, **kw) -> None: pass
+    def user_data_set(self, *a, **kw) -> None: pass
+    def reconnect_delay_set(self, *a, **kw) -> None: pass
+    def max_inflight_messages_set(self, *a, **kw) -> None: pass
+    def connect(self, *a, **kw) -> int: return 0
+    def is_connected(self) -> bool: return True
+    def disconnect(self, *a, **kw) -> int: return 0
+    def loop_start(self) -> int: return 0
+    def loop_stop(self) -> int: return 0
@@ -0,0 +1,42 @@
+# benchmarks/record.py
+"""Echte Monitor-Antworten von Wiener Linien aufzeichnen (für stub.py/bench_parse --payloads).
+
+    python -m benchmarks.record --config config.yaml --out benchmarks/fixtures [--count 3] [--pause 30]
+
+Nimmt wien.* aus der Konfiguration (IDs, batch_size, activate_info, sender) und speichert
+jede Antwort unverändert als <out>/wl_<Zeitstempel>_<n>.json. Fair Use: --pause >= 15s.
+"""
+from __future__ import annotations
+import argparse, os, time
+from wien_api.config import load_config
+from wien_api.fetcher import build_batches, make_session
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--out", default="benchmarks/fixtures")
+    ap.add_argument("--count", type=int, default=1, help="Durchläufe über alle Batches")
+    ap.add_argument("--pause", type=float, default=30.0)
+    args = ap.parse_args()
+
+    cfg = load_config(args.config).wien
+    session = make_session(cfg)
+    os.makedirs(args.out, exist_ok=True)
+    batches = build_batches(cfg)
+    for run in range(args.count):
+        if run:
+            time.sleep(max(15.0, args.pause))
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        for n, (url, params) in enumerate(batches):
+            r = session.get(url, timeout=cfg.http_timeout)
+            if r.status_code != 200:
+                print(f"[record] {url}: HTTP {r.status_code}, skipped")
+                continue
+            path = os.path.join(args.out, f"wl_{stamp}_{n}.json")
+            with open(path, "wb") as f:
+                f.write(r.content)
+            print(f"[record] {path} ({len(r.content)} bytes, ids={len(params)})")
+    session.close()
+
+if __name__ == "__main__":
+    main()
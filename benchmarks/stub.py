@@ -0,0 +1,162 @@
+# benchmarks/stub.py
+"""Lokaler Stub für den Wiener-Linien-Monitor-Endpunkt (für Benchmarks, ohne Netz).
+
+    stub = StubUpstream(payload_dir="benchmarks/fixtures", latency=0.05, fail_rate=0.1).start()
+    cfg = wien_conf(stub.url, ...)
+    ...
+    stub.close()
+
+Antworten kommen aus aufgezeichneten Monitor-Antworten (*.json in payload_dir, siehe
+benchmarks/record.py) oder, ohne payload_dir, aus wl_payload (synthetisch). Jede angefragte
+diva/stopId bekommt deterministisch einen Monitor aus dem Vorrat, umbenannt auf die ID.
+Latenz, Jitter, Fehlerquote (503) und ETag/304 sind einstellbar; Zufall mit festem Seed.
+"""
+from __future__ import annotations
+import copy, glob, hashlib, json, os, random, threading, time, zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+from .bench_parse import wl_payload
+
+def load_payloads(payload_dir: str) -> List[Dict[str, Any]]:
+    out = []
+    for path in sorted(glob.glob(os.path.join(payload_dir, "*.json"))):
+        with open(path, "rb") as f:
+            out.append(json.loads(f.read()))
+    return out
+
+class StubUpstream:
+    def __init__(self, payload_dir: str | None = None, latency: float = 0.0, jitter: float = 0.0,
+                 fail_rate: float = 0.0, etag: bool = False, seed: int = 1) -> None:
+        payloads = load_payloads(payload_dir) if payload_dir else [wl_payload(20, random.Random(seed))]
+        # Vorrat: (Monitor, data-Block der Antwort ohne monitors)
+        self._pool: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+        for p in payloads:
+            data = p.get("data", {})
+            rest = {k: v for k, v in data.items() if k != "monitors"}
+            self._pool.extend((m, rest) for m in data.get("monitors", []))
+        if not self._pool:
+            raise ValueError(f"no monitors in {payload_dir}")
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.etag = etag
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self._monitors: Dict[Tuple[str, str], Tuple[Dict[str, Any], Dict[str, Any]]] = {}
+        self._bodies: Dict[Tuple[Tuple[str, str], ...], Tuple[str, str]] = {}
+        self.requests = 0
+        self.failures = 0
+        self.not_modified = 0
+        self.bytes = 0
+        self._srv: ThreadingHTTPServer | None = None
+
+    # ---------- Antworten ----------
+
+    def _monitor(self, key: Tuple[str, str]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Monitor aus dem Vorrat, auf die angefragte ID umbenannt (für die Zuordnung im Batch).
+           DIVA (properties.name) und RBL werden beide gesetzt: die jeweils andere ID bekommt einen
+           Wert, den keine angefragte ID haben kann – sonst passte die Kopie im Batch auch zu der
+           ID, von der der Vorrats-Monitor stammt.
+        """
+        m = self._monitors.get(key)
+        if m is None:
+            src, rest = self._pool[zlib.crc32(f"{key[0]}={key[1]}".encode()) % len(self._pool)]
+            mon = copy.deepcopy(src)
+            props = mon.setdefault("locationStop", {}).setdefault("properties", {})
+            attrs = props.setdefault("attributes", {})
+            if key[0] == "diva":
+                props["name"], attrs["rbl"] = key[1], f"diva:{key[1]}"
+            else:
+                props["name"] = f"stopId:{key[1]}"
+                attrs["rbl"] = int(key[1]) if key[1].isdigit() else key[1]
+            m = self._monitors[key] = (mon, rest)
+        return m
+
+    def body(self, params: List[Tuple[str, str]]) -> Tuple[str, str]:
+        """data-Teil der Antwort (ohne message/serverTime) und sein ETag."""
+        key = tuple(params)
+        cached = self._bodies.get(key)
+        if cached is not None:
+            return cached
+        data: Dict[str, Any] = {"monitors": []}
+        for p in params:
+            mon, rest = self._monitor(p)
+            data["monitors"].append(mon)
+            for k, v in rest.items():
+                if k not in data:
+                    data[k] = v
+        raw = json.dumps(data, ensure_ascii=False)
+        out = self._bodies[key] = (raw, '"%s"' % hashlib.md5(raw.encode("utf-8")).hexdigest())
+        return out
+
+    def _decide(self) -> Tuple[float, bool]:
+        with self._lock:
+            delay = self.latency + (self._rnd.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = self.fail_rate > 0 and self._rnd.random() < self.fail_rate
+            self.requests += 1
+            self.failures += fail
+            return delay, fail
+
+    # ---------- Server ----------
+
+    def start(self) -> "StubUpstream":
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                qs = parse_qs(urlparse(self.path).query)
+                params = [("diva", v) for v in qs.get("diva", [])] + [("stopId", v) for v in qs.get("stopId", [])]
+                delay, fail = stub._decide()
+                if delay:
+                    time.sleep(delay)
+                if fail:
+                    self._send(503, b'{"message":{"value":"unavailable"}}')
+                    return
+                with stub._lock:
+                    data, tag = stub.body(params)
+                if stub.etag and self.headers.get("If-None-Match") == tag:
+                    with stub._lock:
+                        stub.not_modified += 1
+                    self._send(304, b"", tag)
+                    return
+                body = ('{"data":%s,"message":{"value":"OK","messageCode":1,"serverTime":"%s"}}'
+                        % (data, time.strftime("%Y-%m-%dT%H:%M:%S.000+0200"))).encode("utf-8")
+                with stub._lock:
+                    stub.bytes += len(body)
+                self._send(200, body, tag if stub.etag else None)
+
+            def _send(self, status: int, body: bytes, etag: str | None = None) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                if etag:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        srv = self._srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        srv.daemon_threads = True
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def url(self) -> str:
+        assert self._srv is not None
+        return f"http://127.0.0.1:{self._srv.server_address[1]}/monitor"
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"requests": self.requests, "failures": self.failures,
+                    "not_modified": self.not_modified, "bytes": self.bytes}
+
+    def close(self) -> None:
+        if self._srv is not None:
+            self._srv.shutdown()
+            self._srv.server_close()
+            self._srv = None
@@ -0,0 +1,143 @@
+# benchmarks/suite.py
+"""Alle Szenarien in einem Lauf, Ergebnis als JSON – zum Vergleichen zwischen Commits.
+
+    python -m benchmarks.suite [--out result.json] [--compare baseline.json] [--threshold 0.2]
+                               [--only fetch parse boards ha sse state delta] [--quick]
+
+Szenarien (alles lokal, kein Netz, kein Broker):
+  fetch   fetch_all-Zykluszeit gegen stub.py (Latenz, 5% Fehler, ETag/304)
+  parse   JSON-Backends auf den aufgezeichneten Antworten (benchmarks/fixtures)
+  boards  build_board: kalt, gecacht, pro Zyklus nach Updates
+  ha      publish_board_states gegen fake_mqtt.py (Nachrichten/Zyklus, Dauer)
+  sse     Fan-out eines Events an N Stream-Clients (async-Server)
+  state   viele Leser auf dem Item-Cache während laufender Updates (Snapshot vs. dict/Lock)
+  delta   Bytes pro Update: ganze Items gegen Deltas (SSE-Kette, MQTT gegen Keyframe)
+
+--compare vergleicht Zeitwerte (*_s, *_ms, *_us) und Raten (*_per_s) mit einer früheren
+Ausgabe und beendet sich mit Exit-Code 1, wenn einer um mehr als --threshold (relativ)
+schlechter ist (Zeit höher bzw. Rate niedriger).
+"""
+from __future__ import annotations
+import argparse, asyncio, glob, json, os, platform, subprocess, sys, time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Tuple
+from wien_api import fetcher
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def _fetch(quick: bool) -> Any:
+    from .bench_fetch import run, start_stub
+    stub = start_stub(0.02, etag=True, payload_dir=FIXTURES, fail_rate=0.05)
+    try:
+        return {"runs": run(stub, [20] if quick else [20, 80], [4], [1, 20], cached=True, log=False),
+                "stub": stub.stats()}
+    finally:
+        stub.close()
+
+def _parse(quick: bool) -> Any:
+    from .bench_parse import run
+    bodies = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES, "*.json"))):
+        with open(path, "rb") as f:
+            bodies.append(f.read())
+    return run(bodies, 5 if quick else 20, log=False)
+
+def _boards(quick: bool) -> Any:
+    from .bench_boards import run
+    return run(100 if quick else 300, 100 if quick else 300, 30, 5 if quick else 10)
+
+def _ha(quick: bool) -> Any:
+    from .bench_ha import run
+    return run(20 if quick else 50, 50 if quick else 100, 10, 3 if quick else 5)
+
+def _sse(quick: bool) -> Any:
+    from .bench_sse import fanout
+    args = SimpleNamespace(server="async", threads=16, idents=50, timeout=10.0,
+                           clients=100 if quick else 500, events=20 if quick else 50, publish_rate=20.0)
+    return asyncio.run(fanout(args))
+
+def _state(quick: bool) -> Any:
+    from .bench_state import run
+    return run(300, 8 if quick else 16, 0.5 if quick else 2.0, 200.0)
+
+def _delta(quick: bool) -> Any:
+    from .bench_delta import run
+    return run(10 if quick else 20, 20 if quick else 60)
+
+SCENARIOS: Dict[str, Callable[[bool], Any]] = {
+    "fetch": _fetch, "parse": _parse, "boards": _boards, "ha": _ha, "sse": _sse, "state": _state,
+    "delta": _delta,
+}
+
+def _environment() -> Dict[str, Any]:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(__file__), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        rev = None
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "json_backend": fetcher.JSON_BACKEND, "git": rev,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z")}
+
+def _timings(obj: Any, path: str = "") -> Dict[str, float]:
+    """Alle Zeitwerte und Raten (Schlüssel endet auf _s/_ms/_us) als flache {pfad: wert}."""
+    out: Dict[str, float] = {}
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            p = f"{path}.{k}" if path else str(k)
+            if isinstance(v, (int, float)) and not isinstance(v, bool) and k.endswith(("_s", "_ms", "_us")):
+                out[p] = float(v)
+            else:
+                out.update(_timings(v, p))
+    elif isinstance(obj, list):
+        for i, v in enumerate(obj):
+            out.update(_timings(v, f"{path}[{i}]"))
+    return out
+
+def compare(base: Dict[str, Any], cur: Dict[str, Any], threshold: float) -> List[Tuple[str, float, float, float]]:
+    """Rückgabe: [(pfad, alt, neu, relative Verschlechterung)] für alle über threshold."""
+    old, new = _timings(base.get("results", {})), _timings(cur.get("results", {}))
+    worse = []
+    for p, v in sorted(new.items()):
+        b = old.get(p)
+        if not b:
+            continue
+        rel = (b - v) / b if p.endswith("_per_s") else (v - b) / b
+        print(f"{p:60s} {b:10.3f} -> {v:10.3f} ({rel:+.0%} {'worse' if rel > 0 else 'better'})")
+        if rel > threshold:
+            worse.append((p, b, v, rel))
+    return worse
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", default=None)
+    ap.add_argument("--compare", default=None)
+    ap.add_argument("--threshold", type=float, default=0.2)
+    ap.add_argument("--only", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    ap.add_argument("--quick", action="store_true", help="kleinere Szenarien (CI/Smoke)")
+    args = ap.parse_args()
+
+    res: Dict[str, Any] = {"environment": _environment(), "quick": args.quick, "results": {}}
+    for name in args.only:
+        t0 = time.perf_counter()
+        res["results"][name] = SCENARIOS[name](args.quick)
+        print(f"[bench] {name} done in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+    out = json.dumps(res, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)
+        worse = compare(base, res, args.threshold)
+        for p, b, v, rel in worse:
+            print(f"[bench] REGRESSION {p}: {b} -> {v} ({rel:+.0%})", file=sys.stderr)
+        if worse:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
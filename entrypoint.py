@@ -2,13 +2,22 @@
 from wien_api.config import load_config
 from wien_api import create_app
 from wien_api.mqtt_worker import start_background
+from wien_api.reload import start_reloader
 from waitress import serve
 
+CONFIG_PATH = "/app/config.yaml"
+
 def main():
-    cfg = load_config("/app/config.yaml")
+    cfg = load_config(CONFIG_PATH)
     app = create_app(cfg)
     start_background(cfg)
-    serve(app, listen=f"{cfg.http.bind}:{cfg.http.port}", threads=cfg.http.waitress_threads)
+    start_reloader(app, CONFIG_PATH)  # SIGHUP / reload.watch_interval
+    if cfg.http.server == "async":
+        # SSE-Streams als Coroutinen; übrige Routen im Thread-Pool (waitress_threads)
+        from wien_api.async_server import serve as serve_async
+        serve_async(app, cfg.http.bind, cfg.http.port, threads=cfg.http.waitress_threads)
+    else:
+        serve(app, listen=f"{cfg.http.bind}:{cfg.http.port}", threads=cfg.http.waitress_threads)
 
 if __name__ == "__main__":
     main()
@@ -1,17 +1,48 @@
 # wien_api/__init__.py
-import os
-from flask import Flask
+import os, time
+from flask import Flask, g, request
 from .config import AppConfig
 from .routes import create_blueprint
 from .boards import set_boards
+from .state import HUB
+from .model import CLOCK
+from .refresh import REFRESH
+from .delta import MQTT_DELTA, SSE_DELTA
+from .persist import load_snapshot
+from .traffic import TRAFFIC
+from .metrics import HTTP_SECONDS
+from .log import LOG
 
 def create_app(cfg: AppConfig) -> Flask:
     app = Flask(__name__)
     base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
     web_dir = os.path.join(base_dir, "web")
 
+    LOG.configure(cfg.log.level, cfg.log.format, cfg.log.sample_rate)  # vor allem anderen
+    CLOCK.configure(cfg.countdown.live, cfg.countdown.tick)  # Countdowns beim Ausliefern neu berechnen
     set_boards(cfg.boards)                       # Boards aus config.json aktivieren
-    app.register_blueprint(create_blueprint(web_dir, sse_snapshot_on_connect=True))
+    HUB.set_replay_size(cfg.http.sse_replay)     # Replay-Puffer für Last-Event-ID
+    TRAFFIC.set_inline(cfg.traffic.inline)       # Störungsinfos eingebettet oder nur als IDs
+    REFRESH.configure(cfg.wien.stale_after, cfg.wien.refresh_deadline,  # veraltete Boards beim Abruf
+                      cfg.wien.refresh_per_minute)
+    SSE_DELTA.configure(cfg.delta.sse, cfg.delta.keyframe_every, cfg.delta.max_ratio)    # Deltas statt
+    MQTT_DELTA.configure(cfg.delta.mqtt, cfg.delta.keyframe_every, cfg.delta.max_ratio)  # ganzer Items
+    if cfg.cache.snapshot_path:                  # Warmstart aus der Snapshot-Datei
+        load_snapshot(cfg.cache.snapshot_path, cfg.cache.snapshot_max_age)
+    app.register_blueprint(create_blueprint(web_dir, sse_snapshot_on_connect=True,
+                                            compress=cfg.http.compress))
+
+    @app.before_request
+    def _start_timer():
+        g.t0 = time.perf_counter()
+
+    @app.after_request
+    def _observe_latency(resp):
+        t0 = g.get("t0")
+        if t0 is not None:
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            HTTP_SECONDS.observe(time.perf_counter() - t0, route, request.method, str(resp.status_code))
+        return resp
 
     app.config["CFG"] = cfg
     return app
@@ -0,0 +1,222 @@
+# wien_api/async_server.py
+"""asyncio-Server (http.server: async): SSE-Streams als Coroutinen statt als Worker-Threads.
+
+/api/stream wird direkt im Event-Loop bedient (ein offener Stream kostet nur einen Socket
+und eine Coroutine). Alle anderen Routen laufen unverändert über die Flask-App aus
+create_app/create_blueprint, ausgeführt in einem kleinen Thread-Pool.
+"""
+from __future__ import annotations
+import asyncio, io, sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, FrozenSet, List, Set, Tuple
+from urllib.parse import parse_qsl, unquote
+from werkzeug.datastructures import Headers, MultiDict
+from .state import HUB
+from .routes import snapshot_frame, stream_request
+from .log import LOG
+
+_MAX_HEADER = 64 * 1024
+_MAX_BODY = 1024 * 1024
+_PING_SECONDS = 30
+
+class _Wakeup:
+    """Weckt wartende Stream-Coroutinen nach HUB.publish (beliebiger Thread).
+
+    Streams mit Filter werden nur bei passenden Tags geweckt, ungefilterte bei jedem Event.
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        self._all: Set[asyncio.Event] = set()
+        self._by_tag: Dict[str, Set[asyncio.Event]] = {}
+
+    def register(self, tags: FrozenSet[str] | None) -> asyncio.Event:
+        ev = asyncio.Event()
+        if tags is None:
+            self._all.add(ev)
+        else:
+            for t in tags:
+                self._by_tag.setdefault(t, set()).add(ev)
+        return ev
+
+    def unregister(self, ev: asyncio.Event, tags: FrozenSet[str] | None) -> None:
+        self._all.discard(ev)
+        for t in tags or ():
+            evs = self._by_tag.get(t)
+            if evs is not None:
+                evs.discard(ev)
+                if not evs:
+                    del self._by_tag[t]
+
+    def notify(self, tags: FrozenSet[str] | None) -> None:  # aus dem Publisher-Thread
+        self._loop.call_soon_threadsafe(self._fire, tags)
+
+    def _fire(self, tags: FrozenSet[str] | None) -> None:
+        if tags is None:
+            targets = set(self._all).union(*self._by_tag.values())
+        else:
+            targets = set(self._all).union(*(self._by_tag.get(t, ()) for t in tags))
+        for ev in targets:
+            ev.set()
+
+class AsyncServer:
+    def __init__(self, app, bind: str, port: int, threads: int = 4,
+                 sse_snapshot_on_connect: bool = True) -> None:
+        self.app = app
+        self.bind = bind
+        self.port = port
+        self.sse_snapshot_on_connect = sse_snapshot_on_connect
+        self._pool = ThreadPoolExecutor(max_workers=max(threads, 1), thread_name_prefix="wsgi")
+        self._wakeup: _Wakeup | None = None
+        self._server: asyncio.AbstractServer | None = None
+        self.streams = 0  # offene SSE-Verbindungen
+
+    async def start(self) -> None:
+        self._wakeup = _Wakeup(asyncio.get_running_loop())
+        HUB.add_listener(self._wakeup.notify)
+        self._server = await asyncio.start_server(self._handle, self.bind, self.port,
+                                                  limit=_MAX_HEADER, backlog=1024)
+        if not self.port:
+            self.port = self._server.sockets[0].getsockname()[1]
+        LOG.info("http", "async server listening", bind=self.bind, port=self.port)
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._wakeup is not None:
+            HUB.remove_listener(self._wakeup.notify)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # ---------- HTTP/1.1 ----------
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                req = await self._read_request(reader)
+                if req is None:
+                    break
+                method, target, version, headers, body = req
+                path, _, query = target.partition("?")
+                keep_alive = (version == "HTTP/1.1" and (headers.get("Connection") or "").lower() != "close")
+                if method == "GET" and path == "/api/stream":
+                    await self._stream(writer, query, headers)
+                    break
+                status, resp_headers, payload = await asyncio.get_running_loop().run_in_executor(
+                    self._pool, self._call_wsgi, method, path, query, version, headers, body, writer)
+                resp_headers = [(k, v) for k, v in resp_headers if k.lower() not in ("connection", "content-length")]
+                resp_headers.append(("Content-Length", str(len(payload))))
+                resp_headers.append(("Connection", "keep-alive" if keep_alive else "close"))
+                head = f"HTTP/1.1 {status}\r\n" + "".join(f"{k}: {v}\r\n" for k, v in resp_headers) + "\r\n"
+                writer.write(head.encode("latin-1") + (b"" if method == "HEAD" else payload))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, str, Headers, bytes] | None:
+        raw = await reader.readuntil(b"\r\n\r\n") if not reader.at_eof() else b""
+        if not raw:
+            return None
+        lines = raw.decode("latin-1").split("\r\n")
+        method, target, version = lines[0].split(" ", 2)
+        headers = Headers()
+        for line in lines[1:]:
+            if ":" in line:
+                k, v = line.split(":", 1)
+                headers.add(k.strip(), v.strip())
+        length = int(headers.get("Content-Length") or 0)
+        if length > _MAX_BODY:
+            raise ValueError("request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method, target, version, headers, body
+
+    def _call_wsgi(self, method: str, path: str, query: str, version: str, headers: Headers,
+                   body: bytes, writer: asyncio.StreamWriter) -> Tuple[str, List[Tuple[str, str]], bytes]:
+        peer = writer.get_extra_info("peername") or ("", 0)
+        environ: Dict[str, Any] = {
+            "REQUEST_METHOD": method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": unquote(path).encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": query,
+            "SERVER_NAME": self.bind,
+            "SERVER_PORT": str(self.port),
+            "SERVER_PROTOCOL": version,
+            "REMOTE_ADDR": peer[0],
+            "CONTENT_TYPE": headers.get("Content-Type", ""),
+            "CONTENT_LENGTH": str(len(body)) if body else "",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for k, v in headers.items():
+            key = "HTTP_" + k.upper().replace("-", "_")
+            if key not in ("HTTP_CONTENT_TYPE", "HTTP_CONTENT_LENGTH"):
+                environ[key] = f"{environ[key]},{v}" if key in environ else v
+        started: List[Any] = []
+
+        def start_response(status, response_headers, exc_info=None):
+            started[:] = [status, response_headers]
+            return lambda data: None
+
+        result = self.app(environ, start_response)
+        try:
+            payload = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return started[0], list(started[1]), payload
+
+    # ---------- SSE ----------
+
+    async def _stream(self, writer: asyncio.StreamWriter, query: str, headers: Headers) -> None:
+        args = MultiDict(parse_qsl(query, keep_blank_values=True))
+        tags, boards, idents, last_id = stream_request(args, headers)
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream; charset=utf-8\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        sub = HUB.subscribe(tags, last_id)
+        wake = self._wakeup.register(sub.tags)
+        self.streams += 1
+        # Snapshot beim Connect (ohne Last-Event-ID) bzw. Resync, wenn Events verpasst wurden
+        need_snapshot = last_id is None or sub.missed
+        try:
+            while True:
+                if need_snapshot:
+                    sub.missed = False
+                    snap = None
+                    if self.sse_snapshot_on_connect:  # nimmt Locks und baut Boards: nicht im Event-Loop
+                        snap = await asyncio.get_running_loop().run_in_executor(
+                            self._pool, snapshot_frame, sub.cursor, boards, idents)
+                    if snap:
+                        writer.write(snap)
+                wake.clear()  # vor poll, sonst kann ein publish verloren gehen
+                frames = HUB.poll(sub)
+                need_snapshot = sub.missed
+                if frames:
+                    writer.write(b"".join(frames))
+                elif not need_snapshot:
+                    try:
+                        await asyncio.wait_for(wake.wait(), _PING_SECONDS)
+                        continue
+                    except asyncio.TimeoutError:
+                        writer.write(b": ping\n\n")
+                await writer.drain()
+        finally:
+            self.streams -= 1
+            self._wakeup.unregister(wake, sub.tags)
+            HUB.unsubscribe(sub)
+
+def serve(app, bind: str, port: int, threads: int = 4) -> None:
+    """Blockierend, analog zu waitress.serve."""
+    asyncio.run(AsyncServer(app, bind, port, threads).serve_forever())
@@ -1,71 +1,286 @@
 # wien_api/boards.py
 from __future__ import annotations
-import re, time
-from typing import Any, Dict, List, Tuple
-from .state import LAST_DATA
+import re, threading, time
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Set, Tuple
+from .state import DataSnapshot, snapshot
+from .model import CLOCK, NO_COUNTDOWN, Departure, Item, Line, departure_json, project_departures, traffic_json
+from .metrics import BOARD_BUILD_SECONDS
 
 _BOARDS: Dict[str, Any] = {}
 
-def set_boards(boards: Dict[str, Any]) -> None:
-    """Set/replace board specs (raw dict from config.yaml)."""
-    global _BOARDS
-    _BOARDS = boards or {}
+# Kompilierter Regel-Index (aus set_boards)
+_RULES_BY_STOP: Dict[str, List["_Rule"]] = {}   # stop title -> Regeln (Board-/Regel-Reihenfolge)
+_WILDCARD_RULES: List["_Rule"] = []              # Regeln ohne 'stop'
 
-# ---------- helpers ----------
+# Inkrementeller Zustand: Beiträge je ident, fertige Boards je board_id
+_lock = threading.RLock()
+_CONTRIB: Dict[str, Tuple[Item, Dict[str, List[Any]]]] = {}  # ident -> (cache_item, board_id -> hits)
+_BOARD_CACHE: Dict[str, Dict[str, Any]] = {}
+_BOARD_AT: Dict[str, int | None] = {}  # board_id -> CLOCK.now() beim Bauen (countdown.live)
+_TOUCHED: Dict[str, Set[str]] = {}  # ident -> Boards, die die letzte Änderung betroffen hat
+_SEEN: DataSnapshot | None = None   # zuletzt von _refresh verarbeiteter Cache-Stand
+_ORDER: List[str] = []              # dessen idents (Reihenfolge)
+
+class CompiledBoards:
+    """Board-Specs mit fertigem Regel-Index; errors: Konfigurationsfehler (ungültige Regex o.ä.)."""
+    __slots__ = ("boards", "by_stop", "wildcard", "errors")
+
+    def __init__(self, boards: Dict[str, Any], by_stop: Dict[str, List["_Rule"]], wildcard: List["_Rule"],
+                 errors: List[str]) -> None:
+        self.boards = boards
+        self.by_stop = by_stop
+        self.wildcard = wildcard
+        self.errors = errors
+
+def compile_boards(boards: Dict[str, Any]) -> CompiledBoards:
+    """Board-Specs (raw dict aus config.yaml) kompilieren, ohne etwas zu aktivieren."""
+    by_stop: Dict[str, List[_Rule]] = {}
+    wildcard: List[_Rule] = []
+    errors: List[str] = []
+    if boards and not isinstance(boards, dict):
+        return CompiledBoards({}, {}, [], [f"boards: expected a mapping, got {type(boards).__name__}"])
+    for pos, (board_id, spec) in enumerate((boards or {}).items()):
+        if not spec or not isinstance(spec, dict):
+            errors.append(f"boards.{board_id}: expected a mapping")
+            continue
+        default_limit = int(spec.get("max_departures") or 0)
+        for idx, r in enumerate(spec.get("rules") or []):
+            if not r or not isinstance(r, dict):
+                continue  # tolerate empty entries ('-')
+            rule = _Rule(board_id, pos, idx, r, default_limit)
+            errors.extend(f"boards.{board_id}.rules[{idx}].lines[{i}]: invalid towards_regex"
+                          for i, lr in enumerate(rule.line_rules) if lr.invalid)
+            if rule.stop:
+                by_stop.setdefault(rule.stop, []).append(rule)
+            else:
+                wildcard.append(rule)
+    # Wildcard-Regeln in jede Stop-Liste einsortieren, Reihenfolge wie in der Config
+    for stop, rules in by_stop.items():
+        by_stop[stop] = sorted(rules + wildcard, key=lambda x: (x.pos, x.idx))
+    return CompiledBoards(boards or {}, by_stop, wildcard, errors)
+
+def set_boards(boards: Dict[str, Any] | CompiledBoards) -> None:
+    """Set/replace board specs (raw dict from config.yaml or compile_boards result) atomically.
+       Die Daten (LAST_DATA) bleiben; Board-Inhalte werden beim nächsten Zugriff neu berechnet.
+    """
+    global _BOARDS, _RULES_BY_STOP, _WILDCARD_RULES, _SEEN
+    compiled = boards if isinstance(boards, CompiledBoards) else compile_boards(boards)
+    with _lock:
+        _BOARDS = compiled.boards
+        _RULES_BY_STOP = compiled.by_stop
+        _WILDCARD_RULES = compiled.wildcard
+        _CONTRIB.clear()
+        _BOARD_CACHE.clear()
+        _BOARD_AT.clear()
+        _TOUCHED.clear()
+        _SEEN = None
+
+# ---------- compiled rules ----------
+
+class _LineRule:
+    """Line-rule (name, towards_regex) with the regex compiled once."""
+    __slots__ = ("name", "regex", "invalid", "title")
 
-def _match_line(line: Dict[str, Any], rule: Dict[str, Any]) -> bool:
-    """Check if a WL 'line' matches a single line-rule (name, towards_regex)."""
-    if not isinstance(line, dict) or not isinstance(rule, dict):
-        return False
-    want_name = (rule.get("name") or "").strip()
-    if want_name and (line.get("name") or "").strip() != want_name:
-        return False
-    rgx = rule.get("towards_regex")
-    if rgx:
-        tw = (line.get("towards") or "").strip()
-        try:
-            if not re.search(rgx, tw, flags=re.IGNORECASE):
-                return False
-        except re.error:
+    def __init__(self, lr: Dict[str, Any]) -> None:
+        self.name = (lr.get("name") or "").strip()
+        self.title = (lr.get("title") or "").strip() or None
+        self.regex = None
+        self.invalid = False
+        rgx = lr.get("towards_regex")
+        if rgx:
+            try:
+                self.regex = re.compile(rgx, flags=re.IGNORECASE)
+            except re.error:
+                self.invalid = True  # wie bisher: ungültige Regex matcht nie
+
+    def match(self, line: Line) -> bool:
+        """Check if a WL line matches this line-rule."""
+        if self.invalid:
+            return False
+        if self.name and (line.name or "").strip() != self.name:
+            return False
+        if self.regex is not None and not self.regex.search((line.towards or "").strip()):
             return False
-    return True
+        return True
 
-def _dedupe_and_limit(deps: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
-    """Remove duplicates by (timeReal|timePlanned|countdown), sort by countdown, and limit."""
+class _Rule:
+    __slots__ = ("board_id", "pos", "idx", "stop", "has_platform", "platform", "title", "limit", "line_rules")
+
+    def __init__(self, board_id: str, pos: int, idx: int, r: Dict[str, Any], default_limit: int) -> None:
+        self.board_id = board_id
+        self.pos = pos
+        self.idx = idx
+        self.stop = (r.get("stop") or "").strip()
+        self.has_platform = "platform" in r
+        self.platform = r.get("platform") if self.has_platform else None
+        self.title = r.get("title")
+        self.limit = int(r.get("max_departures") or 0) or default_limit
+        self.line_rules = [_LineRule(lr) for lr in (r.get("lines") or []) if isinstance(lr, dict)]
+
+# ---------- helpers ----------
+
+def _dedupe_and_limit(deps: Iterable[Departure], limit: int) -> List[Departure]:
+    """Remove duplicates by (timeReal, timePlanned, countdown), sort by countdown, and limit."""
     seen = set()
-    out: List[Dict[str, Any]] = []
-    for d in deps or []:
-        if not isinstance(d, dict):
-            continue
-        cd = d.get("countdown")
-        if not isinstance(cd, (int, float)):
+    out: List[Departure] = []
+    for d in deps:
+        cd = d[0]
+        if cd == NO_COUNTDOWN:
             continue
-        key = f"{d.get('timeReal') or ''}|{d.get('timePlanned') or ''}|{cd}"
+        key = (d[2], d[1], cd)
         if key in seen:
             continue
         seen.add(key)
         out.append(d)
-    out.sort(key=lambda x: x.get("countdown", 1e9))
+    out.sort(key=itemgetter(0))
     return out[:limit] if (isinstance(limit, int) and limit > 0) else out
 
-def _minutes_text(items: List[Dict[str, Any]], sep: str = " / ") -> str:
-    parts: List[str] = []
-    for d in items or []:
-        cd = d.get("countdown")
-        if isinstance(cd, float) and cd.is_integer():
-            parts.append(str(int(cd)))
-        else:
-            parts.append(str(cd))
-    return sep.join(parts)
-
-def _line_key(ln: Dict[str, Any], display_title: str | None) -> Tuple[str, str, str]:
+def _minutes_text(items: List[Departure], sep: str = " / ") -> str:
+    return sep.join(str(d[0]) for d in items)
+
+def _line_key(ln: Line, display_title: str | None) -> Tuple[str, str, str]:
     """Stable key to merge the same line across multiple monitors of the same stop/rule."""
     return (
-        (ln.get("name") or "").strip(),
-        (ln.get("towards") or "").strip(),
+        (ln.name or "").strip(),
+        (ln.towards or "").strip(),
         (display_title or "").strip(),
     )
 
+def _contributions(cache_item: Item) -> Dict[str, List[Any]]:
+    """Evaluate all board rules against one LAST_DATA entry.
+
+    Returns board_id -> hits in monitor/rule order; a hit is
+    (group key, item head, traffic refs, [(line key, line head, display title, departures, limit)]).
+    """
+    out: Dict[str, List[Any]] = {}
+    live = CLOCK.live  # abgefahrene fallen erst beim Materialisieren weg -> hier nicht kürzen
+    for mon in cache_item.monitors:
+        stop = mon.stop
+        stop_name = (stop.title or "").strip()
+        stop_platform = stop.platform or None
+        rules = _RULES_BY_STOP.get(stop_name, _WILDCARD_RULES)
+        if not rules:
+            continue
+        mon_lines = mon.lines
+        for r in rules:
+            # platform exact match if provided in rule
+            if r.has_platform and (r.platform or None) != stop_platform:
+                continue
+            rule_title = r.title or stop_name
+            # group key for this rule/stop (include platform if rule specified one)
+            key = (rule_title, stop_name, r.platform if r.has_platform else None)
+            head = {
+                "municipality": stop.municipality,
+                "platform": stop_platform,  # show actual platform
+                "rbl": stop.rbl,
+                "name": stop_name,          # original stop name
+                "title": rule_title,        # display (from rule)
+            }
+            lines = []
+            for ln in mon_lines:
+                # If there are line rules, require at least one match; else accept all
+                display_title = None
+                if r.line_rules:
+                    matched = next((lr for lr in r.line_rules if lr.match(ln)), None)
+                    if matched is None:
+                        continue
+                    display_title = matched.title
+                # Dedup + limit departures per rule
+                deps = _dedupe_and_limit(ln.departures(), 0 if live else r.limit)
+                ln_head = {"name": ln.name, "type": ln.type, "towards": ln.towards}
+                lines.append((_line_key(ln, display_title), ln_head, display_title, deps, r.limit))
+            out.setdefault(r.board_id, []).append(
+                (key, head, mon.traffic, lines))
+    return out
+
+def _refresh() -> List[str]:
+    """Re-evaluate rules only for idents whose LAST_DATA entry changed; drop affected boards.
+       Rückgabe: idents in LAST_DATA-Reihenfolge. Unveränderter Snapshot: nichts zu tun.
+    """
+    global _SEEN, _ORDER
+    current = snapshot()
+    if current is _SEEN:
+        return _ORDER
+    for ident, cache_item in current.items():
+        prev = _CONTRIB.get(ident)
+        if prev is not None and prev[0] is cache_item:
+            continue
+        contrib = _contributions(cache_item)
+        _CONTRIB[ident] = (cache_item, contrib)
+        touched = _TOUCHED[ident] = set(contrib) | set(prev[1] if prev else ())
+        for board_id in touched:
+            _BOARD_CACHE.pop(board_id, None)
+    if len(_CONTRIB) > len(current):
+        for ident in [i for i in _CONTRIB if i not in current]:
+            for board_id in _CONTRIB.pop(ident)[1]:
+                _BOARD_CACHE.pop(board_id, None)
+            _TOUCHED.pop(ident, None)
+    _SEEN, _ORDER = current, list(current)
+    return _ORDER
+
+def _line_json(ln_head: Dict[str, Any], display_title: str | None, deps: List[Departure]) -> Dict[str, Any]:
+    ln = {**ln_head, "departures": [departure_json(d) for d in deps], "countdown_text": _minutes_text(deps)}
+    if display_title:
+        ln["title"] = display_title
+    return ln
+
+def _materialize(specs: Dict[str, Dict[str, Any]], order: List[str],
+                 now: int | None = None) -> Dict[str, Dict[str, Any]]:
+    """Boards (board_id -> spec) in einem Durchlauf über die idents bauen.
+       Jeder ident wird einmal angesehen und nur in die Boards gemischt, zu denen er beiträgt.
+    """
+    # Aggregate items per RULE to avoid duplicates when the same stop appears multiple times
+    maps: Dict[str, Dict[Tuple[str, str, str | None], Dict[str, Any]]] = {b: {} for b in specs}
+    stale: Set[str] = set()  # Boards mit mind. einem Eintrag aus dem Warmstart-Snapshot
+    for ident in order:
+        entry = _CONTRIB.get(ident)
+        if not entry:
+            continue
+        for board_id, hits in entry[1].items():
+            items_map = maps.get(board_id)
+            if items_map is None or not hits:
+                continue
+            if entry[0].stale:
+                stale.add(board_id)
+            for key, head, traffic, lines in hits:
+                item_ref = items_map.get(key)
+                if item_ref is None:
+                    item_ref = items_map[key] = {**head, "lines": [], "_lines_map": {}}
+                lm: Dict[Tuple[str, str, str], List[Any]] = item_ref["_lines_map"]
+                # Merge lines across multiple monitors for the same rule item
+                for lkey, ln_head, display_title, deps, limit in lines:
+                    existing = lm.get(lkey)
+                    if now is not None:
+                        deps = project_departures(deps, now)  # Countdowns ab jetzt, ohne abgefahrene
+                    if existing is None:
+                        lm[lkey] = [ln_head, display_title, _dedupe_and_limit(deps, limit) if now is not None else deps]
+                    else:
+                        # merge departures (union by key, then re-trim)
+                        existing[2] = _dedupe_and_limit(existing[2] + deps, limit)
+                # keep traffic info fresh (last one wins)
+                item_ref["_traffic"] = traffic
+
+    out: Dict[str, Dict[str, Any]] = {}
+    ts = int(time.time())
+    for board_id, spec in specs.items():
+        # Materialize items list from items_map
+        out_items: List[Dict[str, Any]] = []
+        for itm in maps[board_id].values():
+            itm["lines"] = [_line_json(ln_head, display_title, deps)
+                            for ln_head, display_title, deps in itm.pop("_lines_map", {}).values()]
+            itm.update(traffic_json(itm.pop("_traffic")))
+            out_items.append(itm)
+        out[board_id] = {
+            "id": board_id,
+            "title": spec.get("title") or board_id,
+            "generatedAt": ts,
+            "max_departures": int(spec.get("max_departures") or 0),
+            "stale": board_id in stale,
+            "items": out_items
+        }
+    return out
+
 # ---------- main ----------
 
 def build_board(board_id: str) -> Dict[str, Any]:
@@ -90,119 +305,62 @@ def build_board(board_id: str) -> Dict[str, Any]:
       - name: original stop name
       - title: rule title (display)
       - lines[].title: line display title from rule (if provided)
+    Rules are evaluated once per changed LAST_DATA entry (see _refresh);
+    unchanged boards are served from cache.
     """
-    spec = _BOARDS.get(board_id)
+    board = get_board(board_id)
     now = int(time.time())
-    if not spec or not isinstance(spec, dict):
+    if board is None:
         return {"id": board_id, "title": board_id, "generatedAt": now, "items": [], "max_departures": 0}
+    return {**board, "generatedAt": now}
 
-    board_title = spec.get("title") or board_id
-    default_limit = int(spec.get("max_departures") or 0)
-    rules = spec.get("rules") or []
+def build_boards(board_ids: Iterable[str] | None = None) -> Dict[str, Dict[str, Any]]:
+    """build_board für mehrere Boards (None: alle konfigurierten) in einem Durchlauf über den Cache.
+       Unbekannte board_ids fehlen im Ergebnis.
+    """
+    now = int(time.time())
+    return {b: {**board, "generatedAt": now} for b, board in get_boards(board_ids).items()}
 
-    # Aggregate items per RULE to avoid duplicates when the same stop appears multiple times
-    # Key includes: rule_title, stop_name, and optionally platform if rule specifies it.
-    items_map: Dict[Tuple[str, str, str | None], Dict[str, Any]] = {}
-
-    for cache_item in (LAST_DATA or {}).values():
-        for mon in (cache_item.get("items") or []):
-            stop = (mon.get("stop") or {})
-            stop_name = (stop.get("title") or "").strip()
-            stop_platform = stop.get("platform") or None
-            stop_municipality = stop.get("municipality", "")
-            stop_rbl = stop.get("rbl", 0)
-
-            for r in rules:
-                if not r or not isinstance(r, dict):
-                    continue  # tolerate empty entries ('-')
-                want_stop = (r.get("stop") or "").strip()
-                if want_stop and want_stop != stop_name:
-                    continue
-                # platform exact match if provided in rule
-                rule_platform = r.get("platform") if "platform" in r else None
-                if "platform" in r and (rule_platform or None) != stop_platform:
-                    continue
-
-                rule_title = r.get("title") or stop_name
-                rule_limit = int(r.get("max_departures") or 0) or default_limit
-                line_rules = [lr for lr in (r.get("lines") or []) if isinstance(lr, dict)]
-
-                # group key for this rule/stop (include platform if rule specified one)
-                key = (rule_title, stop_name, rule_platform if "platform" in r else None)
-
-                # ensure item exists
-                if key not in items_map:
-                    items_map[key] = {
-                        "municipality": stop_municipality,
-                        "platform": stop_platform if "platform" in r else stop_platform,  # show actual platform
-                        "rbl": stop_rbl,
-                        "name": stop_name,         # original stop name
-                        "title": rule_title,       # display (from rule)
-                        "lines": [],
-                        "trafficInfoCategories": mon.get("trafficInfoCategories", []),
-                        "trafficInfos": mon.get("trafficInfos", {}),
-                        # internal helper: lines map for merging
-                        "_lines_map": {}
-                    }
-                item_ref = items_map[key]
-
-                # Build/merge matching lines
-                for ln in (mon.get("lines") or []):
-                    # If there are line rules, require at least one match; else accept all
-                    if line_rules:
-                        matched_lr = None
-                        for lr in line_rules:
-                            if _match_line(ln, lr):
-                                matched_lr = lr
-                                break
-                        if not matched_lr:
-                            continue
-                        display_title = (matched_lr.get("title") or "").strip() or None
-                    else:
-                        matched_lr = None
-                        display_title = None
-
-                    # Dedup + limit departures per rule
-                    deps = _dedupe_and_limit(ln.get("departures") or [], rule_limit)
-
-                    # Merge lines across multiple monitors for the same rule item
-                    lkey = _line_key(ln, display_title)
-                    lm: Dict[Tuple[str, str, str], Dict[str, Any]] = item_ref["_lines_map"]  # type: ignore
-                    if lkey not in lm:
-                        ln2 = {
-                            "name": ln.get("name"),
-                            "type": ln.get("type"),
-                            "towards": ln.get("towards"),
-                            "departures": deps,
-                            "countdown_text": _minutes_text(deps),
-                        }
-                        if display_title:
-                            ln2["title"] = display_title
-                        lm[lkey] = ln2
-                    else:
-                        # merge departures (union by key, then re-trim)
-                        existing = lm[lkey]
-                        merged = (existing.get("departures") or []) + deps
-                        merged = _dedupe_and_limit(merged, rule_limit)
-                        existing["departures"] = merged
-                        existing["countdown_text"] = _minutes_text(merged)
+def board_ids() -> List[str]:
+    """Konfigurierte board_ids (Config-Reihenfolge)."""
+    return list(_BOARDS)
 
-                # keep traffic info fresh (last one wins)
-                item_ref["trafficInfoCategories"] = mon.get("trafficInfoCategories", [])
-                item_ref["trafficInfos"] = mon.get("trafficInfos", {})
-
-    # Materialize items list from items_map
-    out_items: List[Dict[str, Any]] = []
-    for itm in items_map.values():
-        lines = list(itm.pop("_lines_map", {}).values())
-        itm["lines"] = lines
-        out_items.append(itm)
-
-    return {
-        "id": board_id,
-        "title": board_title,
-        "generatedAt": now,
-        "max_departures": default_limit,
-        "items": out_items
-    }
+def boards_for_ident(ident: str) -> Set[str]:
+    """Boards, deren Inhalt von der letzten Änderung an LAST_DATA[ident] abhängt (vorher oder nachher)."""
+    with _lock:
+        _refresh()
+        return set(_TOUCHED.get(ident, ()))
+
+def idents_for_board(board_id: str) -> List[str]:
+    """idents, deren LAST_DATA-Eintrag aktuell zum Board beiträgt (LAST_DATA-Reihenfolge)."""
+    with _lock:
+        return [i for i in _refresh() if board_id in _CONTRIB[i][1]]
 
+def get_board(board_id: str) -> Dict[str, Any] | None:
+    """Cached board object (same object until its inputs change); None for unknown boards.
+       Nicht verändern – wird zwischen Aufrufern geteilt.
+    """
+    return get_boards((board_id,)).get(board_id)
+
+def get_boards(board_ids: Iterable[str] | None = None) -> Dict[str, Dict[str, Any]]:
+    """Wie get_board für mehrere Boards (None: alle), in Anfrage- bzw. Config-Reihenfolge;
+       unbekannte fehlen im Ergebnis. Was neu gebaut werden muss, entsteht in einem Durchlauf.
+    """
+    with _lock:
+        ids = list(_BOARDS) if board_ids is None else list(dict.fromkeys(board_ids))
+        specs = {b: _BOARDS[b] for b in ids if isinstance(_BOARDS.get(b), dict) and _BOARDS[b]}
+        if not specs:
+            return {}
+        order = _refresh()
+        now = CLOCK.now()
+        todo = {b: spec for b, spec in specs.items()
+                if b not in _BOARD_CACHE or (now is not None and _BOARD_AT.get(b) != now)}
+        if todo:
+            t0 = time.perf_counter()
+            built = _materialize(todo, order, now)
+            share = (time.perf_counter() - t0) / len(todo)  # ein Durchlauf für alle: Anteil je Board
+            for board_id, board in built.items():
+                _BOARD_CACHE[board_id] = board
+                _BOARD_AT[board_id] = now
+                BOARD_BUILD_SECONDS.observe(share, board_id)
+        return {b: _BOARD_CACHE[b] for b in specs}
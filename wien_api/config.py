@@ -32,9 +32,13 @@ class MQTTDiscoveryConf:
     enabled: bool
     prefix: str
     device: Dict[str, Any]
+    state_mode: str  # "sensor": state+attributes je Sensor, "board": ein JSON-Dokument je Board
+    remove_after: int  # Sekunden; so lange fehlende Sensoren werden aus HA entfernt (0 = nie)
 
 @dataclass(frozen=True)
 class MQTTConf:
+    enabled: bool
+    subscribe: bool
     host: str
     port: int
     username: str | None
@@ -44,6 +48,9 @@ class MQTTConf:
     log_publish: bool
     reconnect_min: int
     reconnect_max: int
+    qos: int
+    max_inflight: int
+    publish_timeout: float
     discovery: MQTTDiscoveryConf | None
 
 @dataclass(frozen=True)
@@ -51,6 +58,9 @@ class HTTPConf:
     bind: str
     port: int
     waitress_threads: int
+    compress: bool
+    sse_replay: int
+    server: str
 
 @dataclass(frozen=True)
 class WienConf:
@@ -62,12 +72,64 @@ class WienConf:
     user_agent: str
     stop_ids: List[str]
     diva_ids: List[str]
+    max_concurrency: int
+    cycle_timeout: float
+    batch_size: int
+    max_url_length: int
+    adaptive: bool
+    min_interval: int
+    max_interval: int
+    max_requests_per_minute: int
+    quiet_hours: List[int]
+    quiet_factor: float
+    stale_after: float         # Sekunden (>= 15); ältere idents holt GET /api/board neu (0 = aus)
+    refresh_deadline: float    # Sekunden, die ein Board-Abruf höchstens darauf wartet
+    refresh_per_minute: int    # On-Demand-Requests pro Minute (zusätzlich max_requests_per_minute)
+
+@dataclass(frozen=True)
+class CacheConf:
+    snapshot_path: str | None
+    snapshot_max_age: int
+
+@dataclass(frozen=True)
+class TrafficConf:
+    inline: bool
+
+@dataclass(frozen=True)
+class LogConf:
+    level: str
+    format: str
+    sample_rate: float
+    summary_interval: float
+
+@dataclass(frozen=True)
+class CountdownConf:
+    live: bool     # Countdowns beim Ausliefern aus timeReal neu berechnen, abgefahrene weglassen
+    tick: int      # Sekunden; Auflösung der Neuberechnung
+    ha_tick: int   # Sekunden; HA-States ohne Fetch so oft aktualisieren (0 = nur nach Fetch)
+
+@dataclass(frozen=True)
+class ReloadConf:
+    watch_interval: float  # Sekunden; config.yaml auf Änderungen prüfen (0 = nur SIGHUP)
+
+@dataclass(frozen=True)
+class DeltaConf:
+    sse: bool            # SSE-Updates als Deltas (seq/base/ops) statt ganzer Items
+    mqtt: bool           # Keyframes retained auf {base_topic}/<ident>, Deltas auf {base_topic}/<ident>/delta
+    keyframe_every: int  # spätestens nach so vielen Deltas je ident wieder das ganze Item
+    max_ratio: float     # Delta größer als dieser Anteil des Items -> Keyframe
 
 @dataclass(frozen=True)
 class AppConfig:
     mqtt: MQTTConf
     http: HTTPConf
     wien: WienConf
+    cache: CacheConf
+    traffic: TrafficConf
+    log: LogConf
+    countdown: CountdownConf
+    reload: ReloadConf
+    delta: DeltaConf
     boards: Dict[str, Any]
 
 def load_config(path: str = "/app/config.yaml") -> AppConfig:
@@ -91,6 +153,12 @@ def load_config(path: str = "/app/config.yaml") -> AppConfig:
     disc = (mqtt.get("discovery") or {}) if isinstance(mqtt.get("discovery"), dict) else {}
     http = cfg.get("http", {}) or {}
     wien = cfg.get("wien", {}) or {}
+    cache = cfg.get("cache", {}) or {}
+    traffic = cfg.get("traffic", {}) or {}
+    logging = cfg.get("logging", {}) or {}
+    countdown = cfg.get("countdown", {}) or {}
+    reload = cfg.get("reload", {}) or {}
+    delta = cfg.get("delta", {}) or {}
     boards = cfg.get("boards", {}) or {}
 
     disc_conf = MQTTDiscoveryConf(
@@ -100,9 +168,13 @@ def load_config(path: str = "/app/config.yaml") -> AppConfig:
             "name": "Vienna Lines",
             "identifiers": ["vienna_lines_gateway"]
         }),
+        state_mode="board" if str(disc.get("state_mode", "sensor")).strip().lower() == "board" else "sensor",
+        remove_after=max(int(disc.get("remove_after", 86400)), 0),
     )
 
     mqtt_conf = MQTTConf(
+        enabled=_as_bool(mqtt.get("enabled"), True),
+        subscribe=_as_bool(mqtt.get("subscribe"), False),
         host=mqtt.get("host", "mqtt"),
         port=int(mqtt.get("port", 1883)),
         username=(mqtt.get("username") or None) or None,
@@ -112,22 +184,70 @@ def load_config(path: str = "/app/config.yaml") -> AppConfig:
         log_publish=_as_bool(mqtt.get("log_publish"), False),
         reconnect_min=int(mqtt.get("reconnect_min", 2)),
         reconnect_max=int(mqtt.get("reconnect_max", 30)),
+        qos=min(max(int(mqtt.get("qos", 0)), 0), 1),
+        max_inflight=max(int(mqtt.get("max_inflight", 100)), 1),
+        publish_timeout=max(float(mqtt.get("publish_timeout", 5)), 0.0),
         discovery=disc_conf,
     )
     http_conf = HTTPConf(
         bind=str(http.get("bind", "0.0.0.0")),
         port=int(http.get("port", 5000)),
         waitress_threads=int(http.get("waitress_threads", 16)),
+        compress=_as_bool(http.get("compress"), True),
+        sse_replay=max(int(http.get("sse_replay", 256)), 1),
+        server=str(http.get("server", "waitress")).strip().lower(),
     )
+    interval_seconds = max(int(wien.get("interval_seconds", 30)), 15)
+    stale_after = max(float(wien.get("stale_after", 0)), 0.0)
+    stale_after = max(stale_after, 15.0) if stale_after > 0 else 0.0  # Fair-Use wie interval_seconds
+    min_interval = max(int(wien.get("min_interval", interval_seconds)), 15)
     wien_conf = WienConf(
         base_url=str(wien.get("base_url", "http://www.wienerlinien.at/ogd_realtime/monitor")),
         sender=str(wien.get("sender", "smart-home")),
         activate_info=list(wien.get("activate_info", ["stoerunglang"])),
-        interval_seconds=max(int(wien.get("interval_seconds", 30)), 15),
+        interval_seconds=interval_seconds,
         http_timeout=int(wien.get("http_timeout", 10)),
         user_agent=str(wien.get("user_agent", "Mozilla/5.0")),
         stop_ids=[str(x) for x in (wien.get("stop_ids") or [])],
         diva_ids=[str(x) for x in (wien.get("diva_ids") or [])],
+        max_concurrency=max(int(wien.get("max_concurrency", 4)), 1),
+        cycle_timeout=float(wien.get("cycle_timeout", interval_seconds)),
+        batch_size=max(int(wien.get("batch_size", 1)), 1),
+        max_url_length=int(wien.get("max_url_length", 2000)),
+        adaptive=_as_bool(wien.get("adaptive"), False),
+        min_interval=min_interval,
+        max_interval=max(int(wien.get("max_interval", 300)), min_interval),
+        max_requests_per_minute=max(int(wien.get("max_requests_per_minute", 0)), 0),
+        quiet_hours=[int(h) % 24 for h in (wien.get("quiet_hours") or [])][:2],
+        quiet_factor=max(float(wien.get("quiet_factor", 4)), 1.0),
+        stale_after=stale_after,
+        refresh_deadline=max(float(wien.get("refresh_deadline", 1.5)), 0.0),
+        refresh_per_minute=max(int(wien.get("refresh_per_minute", 20)), 0),
+    )
+    cache_conf = CacheConf(
+        snapshot_path=(str(cache.get("snapshot_path") or "").strip() or None),
+        snapshot_max_age=int(cache.get("snapshot_max_age", 3600)),
+    )
+    traffic_conf = TrafficConf(inline=_as_bool(traffic.get("inline"), True))
+    log_conf = LogConf(
+        level=str(logging.get("level", "info")).strip().lower(),
+        format=str(logging.get("format", "text")).strip().lower(),
+        sample_rate=min(max(float(logging.get("sample_rate", 1.0)), 0.0), 1.0),
+        summary_interval=max(float(logging.get("summary_interval", 0)), 0.0),
+    )
+    countdown_conf = CountdownConf(
+        live=_as_bool(countdown.get("live"), False),
+        tick=min(max(int(countdown.get("tick", 15)), 1), 60),
+        ha_tick=max(int(countdown.get("ha_tick", 0)), 0),
+    )
+    reload_conf = ReloadConf(watch_interval=max(float(reload.get("watch_interval", 0)), 0.0))
+    delta_conf = DeltaConf(
+        sse=_as_bool(delta.get("sse"), False),
+        mqtt=_as_bool(delta.get("mqtt"), False),
+        keyframe_every=max(int(delta.get("keyframe_every", 30)), 1),
+        max_ratio=min(max(float(delta.get("max_ratio", 0.5)), 0.0), 1.0),
     )
-    return AppConfig(mqtt=mqtt_conf, http=http_conf, wien=wien_conf, boards=boards)
+    return AppConfig(mqtt=mqtt_conf, http=http_conf, wien=wien_conf, cache=cache_conf,
+                     traffic=traffic_conf, log=log_conf, countdown=countdown_conf,
+                     reload=reload_conf, delta=delta_conf, boards=boards)
 
@@ -0,0 +1,167 @@
+# wien_api/delta.py
+"""Delta-Kodierung für SSE- und MQTT-Updates (delta.sse / delta.mqtt).
+
+Jeder ident bekommt eine laufende Sequenznummer (seq). Statt des ganzen Items geht eine Liste
+von Patch-Operationen gegen einen früheren Stand (base) raus – eine Teilmenge von JSON Patch
+(RFC 6902): add/remove/replace mit JSON-Pointer-Pfaden. Ein Keyframe (das ganze Item) geht
+für neue idents, alle keyframe_every Updates und wenn der Patch größer als max_ratio des
+Items wäre.
+
+SSE (chain): base ist die vorige seq. Passt base nicht zum Stand des Clients, holt er
+GET /api/item/<ident> (Resync) und wendet ab dort wieder Deltas an.
+MQTT: base ist der letzte Keyframe (retained auf {base_topic}/<ident>); jedes Delta ist allein
+darauf anwendbar, ein verlorenes Delta (QoS 0) kostet also nichts.
+"""
+from __future__ import annotations
+import copy, json, threading
+from typing import Any, Dict, List, Tuple
+from .metrics import REGISTRY
+
+Ops = List[Dict[str, Any]]
+
+FRAMES = REGISTRY.counter("wien_delta_frames_total", "Delta-encoded updates by stream (sse, mqtt) and kind "
+                          "(keyframe, delta)", ("stream", "kind"))
+BYTES_SAVED = REGISTRY.counter("wien_delta_bytes_saved_total",
+                               "Payload bytes saved by sending deltas instead of full items", ("stream",))
+
+def _size(obj: Any) -> int:
+    return len(json.dumps(obj, ensure_ascii=False, separators=(",", ":")))
+
+def _op_size(op: Dict[str, Any]) -> int:
+    """Ungefähre JSON-Länge einer Operation (ohne sie zu serialisieren, außer bei Containern)."""
+    v = op.get("value")
+    return len(op["path"]) + 32 + (_size(v) if isinstance(v, (dict, list)) else len(str(v)))
+
+def _esc(key: Any) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+def _unesc(part: str) -> str:
+    return part.replace("~1", "/").replace("~0", "~")
+
+def diff(old: Any, new: Any, path: str = "", ops: Ops | None = None) -> Ops:
+    """Patch-Operationen, die old in new überführen. Listen gleicher Länge elementweise,
+       sonst (oder wenn das billiger ist) als Ganzes ersetzt.
+    """
+    if ops is None:
+        ops = []
+    if type(old) is dict and type(new) is dict:
+        for k, v in new.items():
+            p = f"{path}/{_esc(k)}"
+            if k not in old:
+                ops.append({"op": "add", "path": p, "value": v})
+            elif old[k] != v:
+                diff(old[k], v, p, ops)
+        for k in old:
+            if k not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_esc(k)}"})
+    elif type(old) is list and type(new) is list and len(old) == len(new):
+        sub: Ops = []
+        for i, (a, b) in enumerate(zip(old, new)):
+            if a != b:
+                diff(a, b, f"{path}/{i}", sub)
+        # z.B. vorgerückte Abfahrten: jedes Element geändert -> Liste ersetzen ist kürzer
+        if len(sub) > 1 and sum(_op_size(op) for op in sub) >= _size(new):
+            ops.append({"op": "replace", "path": path, "value": new})
+        else:
+            ops.extend(sub)
+    elif old != new:
+        ops.append({"op": "replace", "path": path, "value": new})
+    return ops
+
+def apply_patch(obj: Any, ops: Ops) -> Any:
+    """ops (aus diff) auf eine Kopie von obj anwenden. KeyError/IndexError bei unpassendem Stand."""
+    obj = copy.deepcopy(obj)
+    for op in ops:
+        parts = [_unesc(p) for p in op["path"].split("/")[1:]]
+        if not parts:
+            obj = copy.deepcopy(op["value"])
+            continue
+        target = obj
+        for p in parts[:-1]:
+            target = target[int(p)] if isinstance(target, list) else target[p]
+        last = parts[-1]
+        if isinstance(target, list):
+            if op["op"] == "remove":
+                del target[int(last)]
+            elif op["op"] == "add":
+                target.insert(len(target) if last == "-" else int(last), op["value"])
+            else:
+                target[int(last)] = op["value"]
+        elif op["op"] == "remove":
+            del target[last]
+        else:
+            if op["op"] == "replace" and last not in target:
+                raise KeyError(last)
+            target[last] = op["value"]
+    return obj
+
+class DeltaStream:
+    """seq und Bezugsstände je ident für einen Ausgang (SSE oder MQTT)."""
+
+    def __init__(self, name: str, chain: bool) -> None:
+        self.name = name
+        self.chain = chain      # True: Delta gegen die vorige seq, False: gegen den letzten Keyframe
+        self.enabled = False
+        self.keyframe_every = 30
+        self.max_ratio = 0.5
+        self.lock = threading.RLock()
+        # ident -> [seq, Keyframe-seq, Keyframe, letzter Stand, Deltas seit dem Keyframe]
+        self._state: Dict[str, List[Any]] = {}
+
+    def configure(self, enabled: bool, keyframe_every: int, max_ratio: float) -> None:
+        with self.lock:
+            if enabled != self.enabled:
+                self._state.clear()  # Clients/Broker kennen die alten Stände nicht
+            self.enabled = enabled
+            self.keyframe_every = max(int(keyframe_every), 1)
+            self.max_ratio = max(float(max_ratio), 0.0)
+
+    def encode(self, ident: str, obj: Dict[str, Any]) -> Tuple[int, int | None, Ops | None]:
+        """Nächste seq für obj. Rückgabe: (seq, base, ops); base/ops None bei einem Keyframe."""
+        with self.lock:
+            st = self._state.get(ident)
+            seq = st[0] + 1 if st is not None else 1
+            ops: Ops | None = None
+            if st is not None and st[4] + 1 < self.keyframe_every:
+                ops = diff(st[3] if self.chain else st[2], obj)
+                full, size = _size(obj), _size(ops)
+                if size > full * self.max_ratio:
+                    ops = None
+                else:
+                    BYTES_SAVED.inc(self.name, amount=full - size)
+            if ops is None:
+                self._state[ident] = [seq, seq, obj, obj, 0]
+                FRAMES.inc(self.name, "keyframe")
+                return seq, None, None
+            st[0], st[3], st[4] = seq, obj, st[4] + 1
+            FRAMES.inc(self.name, "delta")
+            return seq, (seq - 1) if self.chain else st[1], ops
+
+    def frame(self, ident: str, obj: Dict[str, Any], ts: int) -> Dict[str, Any]:
+        """SSE-Event: {"type": "update", "seq", "item"} (Keyframe) oder {"type": "delta", "seq", "base", "ops"}."""
+        seq, base, ops = self.encode(ident, obj)
+        if ops is None:
+            return {"type": "update", "ts": ts, "ident": ident, "seq": seq, "item": obj}
+        return {"type": "delta", "ts": ts, "ident": ident, "seq": seq, "base": base, "ops": ops}
+
+    def current(self, ident: str) -> Tuple[int, Dict[str, Any]] | None:
+        """(seq, Item) des letzten Updates – Resync-Stand für Clients, die eine seq verpasst haben."""
+        with self.lock:
+            st = self._state.get(ident)
+            return (st[0], st[3]) if st is not None else None
+
+    def states(self) -> Dict[str, Tuple[int, Dict[str, Any]]]:
+        """ident -> (seq, Item) für alle idents (unter lock lesen, zusammen mit dem Cache-Stand)."""
+        with self.lock:
+            return {i: (st[0], st[3]) for i, st in self._state.items()}
+
+    def forget(self, ident: str) -> None:
+        with self.lock:
+            self._state.pop(ident, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self._state.clear()
+
+SSE_DELTA = DeltaStream("sse", chain=True)
+MQTT_DELTA = DeltaStream("mqtt", chain=False)
@@ -1,18 +1,67 @@
 # wien_api/fetcher.py
+import hashlib, json, re, threading, time
 import requests
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Any, Tuple
 from .config import WienConf
+from .model import MAX_DEPARTURES, Item, Monitor, traffic_refs
+from .metrics import FETCH_BYTES, FETCH_SECONDS, FETCH_TOTAL, PARSE_SECONDS
 
-def build_urls(cfg: WienConf) -> List[str]:
+try:
+    import orjson  # type: ignore
+except ImportError:  # optional
+    orjson = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+def ident_params(cfg: WienConf) -> List[Tuple[str, str]]:
+    return [("stopId", sid) for sid in cfg.stop_ids or []] + [("diva", d) for d in cfg.diva_ids or []]
+
+def param_ident(p: Tuple[str, str]) -> str:
+    """("diva", "60200607") -> "diva_60200607", ("stopId", "1234") -> "1234" (wie die Topics)."""
+    return "diva_" + p[1] if p[0] == "diva" else p[1]
+
+def ident_param(ident: str) -> Tuple[str, str]:
+    """Umkehrung von param_ident: "diva_60200607" -> ("diva", "60200607"), "1234" -> ("stopId", "1234")."""
+    return ("diva", ident[5:]) if ident.startswith("diva_") else ("stopId", ident)
+
+def _observe(params: List[Tuple[str, str]], status: str, seconds: float | None = None, size: int = 0) -> None:
+    share = size / len(params) if params else 0
+    for p in params:
+        ident = param_ident(p)
+        FETCH_TOTAL.inc(ident, status)
+        if seconds is not None:
+            FETCH_SECONDS.observe(seconds, ident)
+        if share:
+            FETCH_BYTES.inc(ident, amount=share)
+
+def _url(cfg: WienConf, params: List[Tuple[str, str]]) -> str:
     qs_act = [("activateTrafficInfo", a) for a in (cfg.activate_info or [])]
-    urls: List[str] = []
-    for sid in cfg.stop_ids or []:
-        parts = ["stopId=" + sid] + [f"{k}={v}" for k, v in qs_act] + ["sender=" + cfg.sender]
-        urls.append(cfg.base_url + "?" + "&".join(parts))
-    for diva in cfg.diva_ids or []:
-        parts = ["diva=" + diva] + [f"{k}={v}" for k, v in qs_act] + ["sender=" + cfg.sender]
-        urls.append(cfg.base_url + "?" + "&".join(parts))
-    return urls
+    parts = [f"{k}={v}" for k, v in params] + [f"{k}={v}" for k, v in qs_act] + ["sender=" + cfg.sender]
+    return cfg.base_url + "?" + "&".join(parts)
+
+def build_urls(cfg: WienConf) -> List[str]:
+    """Eine URL pro stopId/DIVA (Schlüssel für ident/Topic)."""
+    return [_url(cfg, [p]) for p in ident_params(cfg)]
+
+def build_batches(cfg: WienConf, params: List[Tuple[str, str]] | None = None
+                  ) -> List[Tuple[str, List[Tuple[str, str]]]]:
+    """Packt stopIds/DIVAs (alle oder nur params) in möglichst wenige Requests.
+
+    Grenzen: batch_size IDs pro Request und max_url_length Zeichen pro URL.
+    Rückgabe: Liste (url, [(param, id), ...]).
+    """
+    batches: List[Tuple[str, List[Tuple[str, str]]]] = []
+    cur: List[Tuple[str, str]] = []
+    for p in (ident_params(cfg) if params is None else params):
+        if cur and (len(cur) >= cfg.batch_size or len(_url(cfg, cur + [p])) > cfg.max_url_length):
+            batches.append((_url(cfg, cur), cur))
+            cur = []
+        cur.append(p)
+    if cur:
+        batches.append((_url(cfg, cur), cur))
+    return batches
 
 def _headers(cfg: WienConf) -> Dict[str, str]:
     return {
@@ -21,47 +70,240 @@ def _headers(cfg: WienConf) -> Dict[str, str]:
         "User-Agent": cfg.user_agent,
     }
 
-def fetch_all(cfg: WienConf, session: requests.Session) -> List[Dict[str, Any]]:
-    out: List[Dict[str, Any]] = []
-    for url in build_urls(cfg):
+class FetchSession(requests.Session):
+    """Session mit Connection-Pool und einem langlebigen Thread-Pool gleicher Größe.
+       Mehr als max_concurrency Requests laufen so nie gleichzeitig – auch nicht, wenn
+       Requests über die Zyklus-Deadline hinaus weiterlaufen (sie belegen dann einen Worker,
+       der nächste Zyklus wartet in der Queue statt auf einen freien Pool-Slot).
+    """
+
+    def __init__(self, size: int) -> None:
+        super().__init__()
+        self.size = size
+        self.pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix="wien_fetch")
+
+    def close(self) -> None:
+        # laufende Requests enden spätestens nach http_timeout; nicht darauf warten
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        super().close()
+
+def make_session(cfg: WienConf) -> FetchSession:
+    """Session mit Connection-Pool passend zu max_concurrency (ein Host, keep-alive)."""
+    size = max(cfg.max_concurrency, 1)
+    session = FetchSession(size)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size, pool_block=True)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+_LINE_KEYS = ("name", "towards", "type", "departures")
+_PROP_KEYS = ("name", "title", "municipality", "platform", "gate")
+
+def _project(d: Dict[str, Any]) -> Dict[str, Any]:
+    """object_hook: verwirft beim Parsen, was Monitor.from_wl nicht braucht (Fahrzeugdaten je
+       Abfahrt, Geometrie, Linien-Metadaten) und kürzt Abfahrtslisten auf MAX_DEPARTURES.
+       Verkehrsinfos bleiben unverändert.
+    """
+    if "departureTime" in d:                 # Abfahrt (mit "vehicle")
+        return {"departureTime": d["departureTime"]}
+    dep = d.get("departure")
+    if type(dep) is list and len(dep) > MAX_DEPARTURES:
+        d["departure"] = dep[:MAX_DEPARTURES]
+        return d
+    if "departures" in d and "towards" in d:  # Linie
+        return {k: d[k] for k in _LINE_KEYS if k in d}
+    if "geometry" in d and "properties" in d:  # locationStop
+        return {"properties": d["properties"]}
+    if "municipality" in d and "attributes" in d:  # locationStop.properties
+        out = {k: d[k] for k in _PROP_KEYS if k in d}
+        attrs = d["attributes"]
+        out["attributes"] = {"rbl": attrs.get("rbl")} if isinstance(attrs, dict) else {}
+        return out
+    return d
+
+_PROJECTING_DECODER = json.JSONDecoder(object_hook=_project)
+
+def parse_monitor_response(body: bytes) -> Any:
+    """Antwort von /monitor parsen. Mit orjson (falls installiert) in C und komplett, sonst mit
+       json und Projektion beim Parsen (_project) – weniger Spitzenspeicher im Fallback.
+    """
+    if not body:
+        return {}
+    if orjson is not None:
+        return orjson.loads(body)
+    return _PROJECTING_DECODER.decode(body.decode("utf-8"))
+
+# serverTime ändert sich bei jeder Antwort, auch wenn die Abfahrten gleich sind
+_SERVER_TIME = re.compile(rb'"serverTime"\s*:\s*"[^"]*"')
+
+def body_hash(body: bytes) -> bytes:
+    return hashlib.blake2b(_SERVER_TIME.sub(b"", body), digest_size=16).digest()
+
+class _CachedResponse:
+    __slots__ = ("etag", "last_modified", "body_hash", "items")
+
+    def __init__(self, etag: str | None, last_modified: str | None, body_hash: bytes, items: List[Item]) -> None:
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body_hash = body_hash
+        self.items = items
+
+class _IdentCounters:
+    __slots__ = ("requests", "not_modified", "same_body", "parsed")
+
+    def __init__(self) -> None:
+        self.requests = 0      # erfolgreiche Antworten
+        self.not_modified = 0  # 304 auf If-None-Match/If-Modified-Since
+        self.same_body = 0     # 200, aber Body-Hash wie beim letzten Mal -> nicht geparst
+        self.parsed = 0
+
+class ResponseCache:
+    """Pro URL: ETag/Last-Modified (für bedingte Requests), Body-Hash und die zuletzt geparsten Items.
+       Unveränderte Antworten (304 oder gleicher Body-Hash) werden nicht geparst; die Items kommen
+       mit not_modified=True aus dem Cache.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _CachedResponse] = {}
+        self._counters: Dict[Tuple[str, str], _IdentCounters] = {}
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        e = self._entries.get(url)
+        h: Dict[str, str] = {}
+        if e is not None:
+            if e.etag:
+                h["If-None-Match"] = e.etag
+            if e.last_modified:
+                h["If-Modified-Since"] = e.last_modified
+        return h
+
+    def lookup(self, url: str, body_hash: bytes | None = None) -> List[Item] | None:
+        """Items der letzten Antwort, wenn sie (bei body_hash: mit diesem Hash) vorliegt."""
+        e = self._entries.get(url)
+        if e is None or (body_hash is not None and e.body_hash != body_hash):
+            return None
+        return [Item(it.query, it.ok, it.monitors, status=it.status, error=it.error, not_modified=True)
+                for it in e.items]
+
+    def store(self, url: str, r: requests.Response, body_hash: bytes, items: List[Item]) -> None:
+        with self._lock:
+            self._entries[url] = _CachedResponse(r.headers.get("ETag"), r.headers.get("Last-Modified"),
+                                                 body_hash, items)
+
+    def count(self, params: List[Tuple[str, str]], field: str) -> None:
+        with self._lock:
+            for p in params:
+                c = self._counters.get(p)
+                if c is None:
+                    c = self._counters[p] = _IdentCounters()
+                c.requests += 1
+                setattr(c, field, getattr(c, field) + 1)
+
+    def clear(self) -> None:
+        """Nächster Zyklus holt und parst alles neu (Zähler bleiben)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {param_ident(p): {f: getattr(c, f) for f in _IdentCounters.__slots__}
+                    for p, c in self._counters.items()}
+
+def _monitor_matches(mon: Dict[str, Any], param: str, value: str) -> bool:
+    """Ordnet einen Monitor einer angefragten ID zu (DIVA = properties.name, stopId = rbl)."""
+    props = (mon.get("locationStop", {}) or {}).get("properties", {}) or {}
+    if param == "diva":
+        return str(props.get("name") or "") == value
+    return str((props.get("attributes", {}) or {}).get("rbl") or "") == value
+
+def _fetch_batch(cfg: WienConf, session: requests.Session, url: str,
+                 params: List[Tuple[str, str]], cache: ResponseCache | None = None,
+                 timeout: float | None = None) -> List[Item]:
+    """Ein Request, aufgeteilt in ein Item pro ID. timeout: höchstens so lange (sonst http_timeout)."""
+    queries = [_url(cfg, [p]) for p in params]
+    try:
+        headers = _headers(cfg)
+        if cache is not None:
+            headers.update(cache.conditional_headers(url))
+        t0 = time.perf_counter()
         try:
-            r = session.get(url, headers=_headers(cfg), timeout=cfg.http_timeout)
-            if not r.ok:
-                out.append({"query": url, "ok": False, "status": r.status_code, "items": []})
-                continue
-            payload = r.json() if r.content else {}
-            data = payload.get("data", {}) if isinstance(payload, dict) else {}
-            items = []
-            for mon in data.get("monitors", []) or []:
-                stop = (mon.get("locationStop", {}) or {}).get("properties", {}) or {}
-                lines = []
-                for ln in mon.get("lines", []) or []:
-                    deps = (ln.get("departures", {}) or {}).get("departure", []) or []
-                    lines.append({
-                        "name": ln.get("name"),
-                        "towards": ln.get("towards"),
-                        "type": ln.get("type"),
-                        "departures": [{
-                            "countdown": d.get("departureTime", {}).get("countdown"),
-                            "timePlanned": d.get("departureTime", {}).get("timePlanned"),
-                            "timeReal": d.get("departureTime", {}).get("timeReal"),
-                        } for d in deps][:8]
-                    })
-                tinfo = data.get("trafficInfos") or data.get("trafficInfo") or {}
-                categories = data.get("trafficInfoCategories", []) or []
-                items.append({
-                    "stop": {
-                        "title": stop.get("title"),
-                        "municipality": stop.get("municipality"),
-                        "platform": stop.get("platform") or stop.get("gate"),
-                        "rbl": (stop.get("attributes", {}) or {}).get("rbl"),
-                    },
-                    "lines": lines,
-                    "trafficInfoCategories": categories,
-                    "trafficInfos": tinfo
-                })
-            out.append({"query": url, "ok": True, "items": items, "raw": None})
-        except Exception as e:
-            out.append({"query": url, "ok": False, "error": str(e), "items": []})
-    return out
+            r = session.get(url, headers=headers, timeout=cfg.http_timeout if timeout is None else timeout)
+        except Exception:
+            _observe(params, "error", time.perf_counter() - t0)
+            raise
+        _observe(params, str(r.status_code), time.perf_counter() - t0, len(r.content))
+        if r.status_code == 304 and cache is not None:
+            cached = cache.lookup(url)
+            if cached is not None:
+                cache.count(params, "not_modified")
+                return cached
+        if not r.ok:
+            return [Item.failed(q, status=r.status_code) for q in queries]
+        h = body_hash(r.content)
+        if cache is not None:
+            cached = cache.lookup(url, h)
+            if cached is not None:
+                cache.count(params, "same_body")
+                return cached
+        with PARSE_SECONDS.time():
+            payload = parse_monitor_response(r.content)
+        data = payload.get("data", {}) if isinstance(payload, dict) else {}
+        monitors = data.get("monitors", []) or []
+        traffic = traffic_refs(data)  # Störungsinfos einmal pro Antwort, nicht pro Monitor
+        out = []
+        for q, (param, value) in zip(queries, params):
+            mons = monitors if len(params) == 1 else [m for m in monitors if _monitor_matches(m, param, value)]
+            out.append(Item(q, True, tuple(Monitor.from_wl(m, data, traffic=traffic) for m in mons)))
+        if cache is not None:
+            cache.store(url, r, h, out)
+            cache.count(params, "parsed")
+        return out
+    except Exception as e:
+        return [Item.failed(q, error=str(e)) for q in queries]
+
+def _deadline_failed(cfg: WienConf, params: List[Tuple[str, str]], waited: float) -> List[Item]:
+    _observe(params, "deadline")
+    return [Item.failed(_url(cfg, [p]), error=f"cycle deadline exceeded ({waited:.1f}s)") for p in params]
 
+def fetch_all(cfg: WienConf, session: FetchSession,
+              params: List[Tuple[str, str]] | None = None, cache: ResponseCache | None = None) -> List[Item]:
+    """Holt alle Monitore; ein Ergebnis pro URL aus build_urls(), in derselben Reihenfolge.
+    Mit params nur diese IDs (ein Ergebnis pro Eintrag, gleiche Reihenfolge).
+
+    Mit batch_size > 1 werden mehrere IDs pro Request abgefragt (build_batches)
+    und die Antwort wieder pro ID aufgeteilt.
+
+    Mit max_concurrency > 1 laufen bis zu max_concurrency Requests parallel (im Thread-Pool
+    der Session). URLs, die bis zur Zyklus-Deadline (cycle_timeout) nicht fertig sind, liefern
+    ein Fehler-Item, damit ein einzelner langsamer Monitor nicht den ganzen Zyklus blockiert;
+    nacheinander (max_concurrency 1) bekommt jeder Request höchstens die Restzeit.
+
+    Mit cache (ResponseCache) werden bedingte Requests gesendet und unveränderte Antworten
+    nicht erneut geparst (Items mit not_modified=True).
+    """
+    batches = build_batches(cfg, params)
+    deadline = cfg.cycle_timeout if cfg.cycle_timeout > 0 else None
+    started = time.monotonic()
+    out: List[Item] = []
+    if min(max(cfg.max_concurrency, 1), len(batches)) <= 1:
+        for url, params in batches:
+            waited = time.monotonic() - started
+            if deadline is None:
+                out.extend(_fetch_batch(cfg, session, url, params, cache))
+            elif waited >= deadline:
+                out.extend(_deadline_failed(cfg, params, waited))
+            else:
+                out.extend(_fetch_batch(cfg, session, url, params, cache,
+                                        timeout=min(cfg.http_timeout, deadline - waited)))
+        return out
+
+    futures = [session.pool.submit(_fetch_batch, cfg, session, url, params, cache) for url, params in batches]
+    wait(futures, timeout=deadline)
+    for (url, params), fut in zip(batches, futures):
+        if fut.done():
+            out.extend(fut.result())
+        else:
+            fut.cancel()  # noch in der Queue: gar nicht erst senden
+            out.extend(_deadline_failed(cfg, params, time.monotonic() - started))
+    return out
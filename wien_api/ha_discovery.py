@@ -1,10 +1,13 @@
 # wien_api/ha_discovery.py
 from __future__ import annotations
-import json, re, time
-from typing import Any, Dict, List, Tuple
+import json, re, threading, time
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
 from paho.mqtt.client import Client
 from .config import AppConfig
-from .boards import build_board
+from .boards import build_board, get_board
+from .utils import PublishCache, content_hash
+from .metrics import mqtt_published
+from .log import LOG
 
 _slug_re = re.compile(r"[^a-z0-9]+")
 def slugify(s: str) -> str:
@@ -22,6 +25,25 @@ def _topics(cfg: AppConfig, sensor_id: str) -> Dict[str, str]:
         "config":     f"{cfg.mqtt.discovery.prefix}/sensor/{sensor_id}/config",
     }
 
+def board_topic(cfg: AppConfig, board_id: str) -> str:
+    """state_mode "board": ein JSON-Dokument mit allen Sensoren des Boards."""
+    return f"{cfg.mqtt.base_topic.rstrip('/')}/boards/{slugify(board_id)}/states"
+
+def _board_mode(cfg: AppConfig) -> bool:
+    return bool(cfg.mqtt.discovery and cfg.mqtt.discovery.state_mode == "board")
+
+def _sensors(board_id: str, board: Dict[str, Any]) -> Iterator[Tuple[str, str, str, str, List[Any]]]:
+    """(sensor_id, Haltestelle, Linie, Richtung, departures) je Linie eines Boards."""
+    for item in board.get("items", []):
+        stop_title = (item.get("title") or "Unknown").strip()
+        for ln in item.get("lines", []) or []:
+            name = (ln.get("name") or "").strip()
+            towards = (ln.get("towards") or "").strip()
+            if not name:
+                continue
+            yield (_sensor_id(board_id, stop_title, name, towards or "-"), stop_title, name, towards,
+                   ln.get("departures") or [])
+
 def _device(cfg: AppConfig) -> Dict[str, Any]:
     dev = cfg.mqtt.discovery.device if cfg.mqtt.discovery else {}
     # minimale Pflichtfelder absichern
@@ -31,74 +53,195 @@ def _device(cfg: AppConfig) -> Dict[str, Any]:
         dev = {**dev, "name": "Vienna Lines"}
     return dev
 
-def publish_discovery_for_board(client: Client, cfg: AppConfig, board_id: str) -> List[str]:
-    """Veröffentlicht Discovery-Configs für alle Linien eines Boards.
-       Rückgabe: Liste sensor_ids, die angelegt/aktualisiert wurden.
-    """
-    sensor_ids: List[str] = []
-    board = build_board(board_id)  # nutzt getrimmte departures (max_departures)
+def _discovery_payloads(cfg: AppConfig, board_id: str, board: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """sensor_id -> Discovery-Config für alle Linien eines Boards."""
     dev = _device(cfg)
+    shared = board_topic(cfg, board_id) if _board_mode(cfg) else None
+    out: Dict[str, Dict[str, Any]] = {}
+    for sid, stop_title, name, towards, _ in _sensors(board_id, board):
+        t = _topics(cfg, sid)
+        payload = {
+            "name": f"{stop_title} – {name}{(' → ' + towards) if towards else ''}",
+            "unique_id": sid,
+            "state_topic": t["state"],
+            "json_attributes_topic": t["attributes"],
+            "availability": [{"topic": t["availability"]}],
+            "device": dev,
+            "icon": "mdi:train",
+            # Damit HA die Einheit/Art besser versteht (numeric, min)
+            "unit_of_measurement": "min",
+            "state_class": "measurement"
+        }
+        if shared is not None:
+            # alle Sensoren lesen dasselbe Board-Dokument; fehlender Eintrag -> None (unknown)
+            payload["state_topic"] = payload["json_attributes_topic"] = shared
+            payload["value_template"] = f"{{{{ value_json.sensors.get('{sid}', {{}}).get('state') }}}}"
+            payload["json_attributes_template"] = f"{{{{ value_json.sensors.get('{sid}', {{}}) | tojson }}}}"
+        out[sid] = payload
+    return out
 
-    for item in board.get("items", []):
-        stop_title = (item.get("title") or "Unknown").strip()
-        for ln in item.get("lines", []) or []:
-            name = (ln.get("name") or "").strip()
-            towards = (ln.get("towards") or "").strip()
-            if not name:
-                continue
-            sid = _sensor_id(board_id, stop_title, name, towards or "-")
-            t = _topics(cfg, sid)
-            payload = {
-                "name": f"{stop_title} – {name}{(' → ' + towards) if towards else ''}",
-                "unique_id": sid,
-                "state_topic": t["state"],
-                "json_attributes_topic": t["attributes"],
-                "availability": [{"topic": t["availability"]}],
-                "device": dev,
-                "icon": "mdi:train",
-                # Damit HA die Einheit/Art besser versteht (numeric, min)
-                "unit_of_measurement": "min",
-                "state_class": "measurement"
-            }
-            client.publish(t["config"], json.dumps(payload, ensure_ascii=False), qos=0, retain=True)
-            sensor_ids.append(sid)
-            print(f"[mqtt][ha] discovery config published for board {board_id} (sensors={len(sensor_ids)})")
-    return sensor_ids
+class DiscoveryRegistry:
+    """Veröffentlichte Discovery-Configs: sensor_id -> [board_id, Payload-Hash, zuletzt gesehen].
+
+    sync() sendet nur neue/geänderte Configs und entfernt (leere retained Config) Sensoren,
+    die länger als remove_after Sekunden nicht mehr im Board vorkamen. Nur im Speicher:
+    nach einem Neustart wird einmal alles gesendet.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._sensors: Dict[str, List[Any]] = {}
+
+    def sensors(self, board_id: str | None = None) -> List[str]:
+        with self._lock:
+            return [sid for sid, e in self._sensors.items() if board_id is None or e[0] == board_id]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sensors.clear()
+
+    def sync(self, client: Client, cfg: AppConfig, board_id: str, force: bool = False,
+             remove_after: float | None = None, cache: PublishCache | None = None,
+             board: Dict[str, Any] | None = None) -> Dict[str, int]:
+        """Discovery eines Boards abgleichen. force: alles senden; remove_after=None: nichts entfernen.
+           cache: PublishCache der States (gelöschte State-Topics dort vergessen).
+           board: bereits gebautes Board (aus get_boards), sonst get_board(board_id).
+           Rückgabe: Anzahl added/changed/unchanged/removed/failed.
+        """
+        if board is None:
+            board = get_board(board_id)
+        payloads = _discovery_payloads(cfg, board_id, board or {"items": []})
+        now = time.monotonic()
+        stats = {"added": 0, "changed": 0, "unchanged": 0, "removed": 0, "failed": 0}
+        with self._lock:
+            for sid, payload in payloads.items():
+                h = content_hash(payload, ignore=())
+                cur = self._sensors.get(sid)
+                if cur is not None and cur[1] == h and not force:
+                    cur[2] = now
+                    stats["unchanged"] += 1
+                    continue
+                r = client.publish(_topics(cfg, sid)["config"], json.dumps(payload, ensure_ascii=False),
+                                   qos=cfg.mqtt.qos, retain=True)
+                mqtt_published("discovery", r.rc)
+                if r.rc != 0:
+                    self._sensors.pop(sid, None)  # beim nächsten Abgleich erneut
+                    stats["failed"] += 1
+                    continue
+                stats["added" if cur is None else "changed"] += 1
+                self._sensors[sid] = [board_id, h, now]
+            if remove_after is not None:
+                gone = [sid for sid, e in self._sensors.items()
+                        if e[0] == board_id and sid not in payloads and now - e[2] >= remove_after]
+                for sid in gone:
+                    self._remove(client, cfg, sid, cache)
+                stats["removed"] = len(gone)
+        if stats["added"] or stats["changed"] or stats["removed"] or stats["failed"]:
+            LOG.info("mqtt", "ha discovery", board=board_id, **stats)
+        return stats
+
+    def prune_boards(self, client: Client, cfg: AppConfig, board_ids: Iterable[str],
+                     cache: PublishCache | None = None) -> int:
+        """Sensoren von Boards entfernen, die es nicht mehr gibt. Rückgabe: Anzahl."""
+        keep = set(board_ids)
+        with self._lock:
+            gone = [sid for sid, e in self._sensors.items() if e[0] not in keep]
+            for sid in gone:
+                self._remove(client, cfg, sid, cache)
+        return len(gone)
+
+    def _remove(self, client: Client, cfg: AppConfig, sid: str, cache: PublishCache | None) -> None:
+        # leere retained Payload: HA löscht die Entität, der Broker die retained Message
+        t = _topics(cfg, sid)
+        topics = [t["config"]] if _board_mode(cfg) else [t["config"], t["state"], t["attributes"]]
+        for topic in topics:
+            r = client.publish(topic, "", qos=cfg.mqtt.qos, retain=True)
+            mqtt_published("discovery", r.rc)
+            if cache is not None:
+                cache.forget(topic)
+        del self._sensors[sid]
+
+DISCOVERY = DiscoveryRegistry()
+
+def publish_discovery_for_board(client: Client, cfg: AppConfig, board_id: str,
+                                board: Dict[str, Any] | None = None) -> List[str]:
+    """Veröffentlicht Discovery-Configs für alle Linien eines Boards (ohne Registry-Abgleich).
+       board: bereits gebautes Board (aus build_boards), sonst build_board(board_id).
+       Rückgabe: Liste sensor_ids, die angelegt/aktualisiert wurden.
+    """
+    if board is None:
+        board = build_board(board_id)
+    payloads = _discovery_payloads(cfg, board_id, board)  # getrimmte departures
+    for sid, payload in payloads.items():
+        r = client.publish(_topics(cfg, sid)["config"], json.dumps(payload, ensure_ascii=False),
+                           qos=cfg.mqtt.qos, retain=True)
+        mqtt_published("discovery", r.rc)
+    LOG.info("mqtt", "ha discovery published", board=board_id, sensors=len(payloads))
+    return list(payloads)
 
 def publish_availability(client: Client, cfg: AppConfig, online: bool) -> None:
     topic = _topics(cfg, "x")["availability"]  # nur Basis gebraucht
-    client.publish(topic, "online" if online else "offline", qos=0, retain=True)
+    r = client.publish(topic, "online" if online else "offline", qos=cfg.mqtt.qos, retain=True)
+    mqtt_published("availability", r.rc)
 
-def publish_board_states(client: Client, cfg: AppConfig, board_id: str) -> None:
-    """Aktualisiert alle Sensorzustände eines Boards (state + attributes)."""
-    board = build_board(board_id)
+def _state(deps: List[Any]) -> int | None:
+    """State = erster Countdown (oder None)."""
+    if deps and isinstance(deps, list):
+        cd = deps[0].get("countdown")
+        if isinstance(cd, (int, float)):
+            return int(cd)
+    return None
+
+def _countdowns(deps: List[Any]) -> List[int]:
+    return [int(d.get("countdown")) for d in deps if isinstance(d.get("countdown"), (int, float))]
+
+def publish_board_states(client: Client, cfg: AppConfig, board_id: str,
+                         cache: PublishCache | None = None, board: Dict[str, Any] | None = None) -> None:
+    """Aktualisiert alle Sensorzustände eines Boards (state + attributes).
+       Mit cache werden unveränderte state-/attributes-Payloads (ts ignoriert) nicht erneut gesendet.
+       state_mode "board": statt zwei Nachrichten je Sensor eine pro Board (board_topic).
+       board: bereits gebautes Board (alle Boards eines Zyklus aus einem get_boards-Aufruf).
+    """
+    if board is None:
+        board = build_board(board_id)
     ts = int(time.time())
-    for item in board.get("items", []):
-        stop_title = (item.get("title") or "Unknown").strip()
-        for ln in item.get("lines", []) or []:
-            name = (ln.get("name") or "").strip()
-            towards = (ln.get("towards") or "").strip()
-            if not name:
-                continue
-            sid = _sensor_id(board_id, stop_title, name, towards or "-")
-            t = _topics(cfg, sid)
-            deps = ln.get("departures") or []
-            # State = erster Countdown (oder null)
-            state = None
-            if deps and isinstance(deps, list):
-                first = deps[0]
-                cd = first.get("countdown")
-                if isinstance(cd, (int, float)):
-                    state = int(cd)
-            # publish
-            attr = {
-                "stop": stop_title,
-                "line": name,
-                "towards": towards,
-                "countdowns": [int(d.get("countdown")) for d in deps if isinstance(d.get("countdown"), (int,float))],
-                "ts": ts,
-                "board": board_id,
-            }
-            client.publish(t["state"], "null" if state is None else str(state), qos=0, retain=True)
-            client.publish(t["attributes"], json.dumps(attr, ensure_ascii=False), qos=0, retain=True)
+    if _board_mode(cfg):
+        topic = board_topic(cfg, board_id)
+        doc = {
+            "board": board_id,
+            "sensors": {sid: {"state": _state(deps), "stop": stop_title, "line": name, "towards": towards,
+                              "countdowns": _countdowns(deps)}
+                        for sid, stop_title, name, towards, deps in _sensors(board_id, board)},
+            "ts": ts,
+        }
+        if cache is None or cache.changed(topic, doc):
+            r = client.publish(topic, json.dumps(doc, ensure_ascii=False, separators=(",", ":")),
+                               qos=cfg.mqtt.qos, retain=True)
+            mqtt_published("board_state", r.rc)
+            if r.rc != 0 and cache is not None:
+                cache.forget(topic)
+        return
 
+    for sid, stop_title, name, towards, deps in _sensors(board_id, board):
+        t = _topics(cfg, sid)
+        state = _state(deps)
+        # publish
+        attr = {
+            "stop": stop_title,
+            "line": name,
+            "towards": towards,
+            "countdowns": _countdowns(deps),
+            "ts": ts,
+            "board": board_id,
+        }
+        state_payload = "null" if state is None else str(state)
+        if cache is None or cache.changed(t["state"], state_payload):
+            r = client.publish(t["state"], state_payload, qos=cfg.mqtt.qos, retain=True)
+            mqtt_published("state", r.rc)
+            if r.rc != 0 and cache is not None:
+                cache.forget(t["state"])
+        if cache is None or cache.changed(t["attributes"], attr):
+            r = client.publish(t["attributes"], json.dumps(attr, ensure_ascii=False), qos=cfg.mqtt.qos, retain=True)
+            mqtt_published("attributes", r.rc)
+            if r.rc != 0 and cache is not None:
+                cache.forget(t["attributes"])
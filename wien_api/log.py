@@ -0,0 +1,203 @@
+# wien_api/log.py
+"""Gepufferte, strukturierte Logausgabe statt print im Hot-Path.
+
+LOG.info("mqtt", "connect", rc=0, ok=True) legt nur ein Tupel in eine Queue; ein
+Hintergrund-Thread formatiert und schreibt gesammelt nach stdout – als Text wie bisher
+("[mqtt] connect rc=0 ok=True") oder als JSON-Zeilen. Bei voller Queue wird die Zeile
+verworfen (gezählt), der Aufrufer wartet nie auf stdout.
+
+Drosselung: Zeilen mit sample=True (z.B. je Publish) werden mit sample_rate ausgedünnt;
+Zeilen mit key=... höchstens alle every Sekunden ausgegeben (unterdrückte werden mitgezählt).
+Summary fasst Zähler über Zyklen zusammen ("published 412 msgs in 38ms").
+"""
+from __future__ import annotations
+import atexit, json, sys, threading, time
+from collections import deque
+from typing import Any, Dict, List, TextIO, Tuple
+from .metrics import REGISTRY
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+_NAMES = {v: k for k, v in LEVELS.items()}
+
+Record = Tuple[float, int, str, str, Dict[str, Any]]
+
+def _text_value(v: Any) -> str:
+    if isinstance(v, float):
+        return f"{v:.3f}".rstrip("0").rstrip(".") if v == v else "nan"
+    s = str(v)
+    return f'"{s}"' if (" " in s or not s) else s
+
+class Logger:
+    def __init__(self, stream: TextIO | None = None, queue_size: int = 10000) -> None:
+        self.stream = stream
+        self.level = LEVELS["info"]
+        self.json = False
+        self.sample_rate = 1.0
+        self._sample_every = 1
+        self._sample_n: Dict[str, int] = {}
+        self._limits: Dict[str, List[float]] = {}  # key -> [zuletzt ausgegeben, unterdrückt seitdem]
+        self._limits_lock = threading.Lock()
+        self.queue_size = queue_size
+        self._buf: "deque[Record | threading.Event]" = deque()  # append/popleft sind threadsicher
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self.dropped = 0
+        self.written = 0
+
+    def configure(self, level: str = "info", fmt: str = "text", sample_rate: float = 1.0) -> None:
+        self.level = LEVELS.get(str(level).lower(), LEVELS["info"])
+        self.json = str(fmt).lower() == "json"
+        self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        self._sample_every = round(1 / self.sample_rate) if self.sample_rate > 0 else 0
+
+    def enabled(self, level: str) -> bool:
+        return LEVELS[level] >= self.level
+
+    # ---------- Aufruf ----------
+
+    def log(self, level: str, tag: str, msg: str, sample: bool = False, key: str | None = None,
+            every: float = 0.0, **fields: Any) -> None:
+        lv = LEVELS[level]
+        if lv < self.level:
+            return
+        if sample and self._sample_every != 1:
+            # jede n-te Zeile je tag+msg (deterministisch, kein Zufall im Hot-Path)
+            if self._sample_every == 0:
+                return
+            k = f"{tag}:{msg}"
+            n = self._sample_n.get(k, 0)
+            self._sample_n[k] = n + 1
+            if n % self._sample_every:
+                return
+            fields["sampled"] = self._sample_every
+        if key is not None and every > 0:
+            now = time.monotonic()
+            with self._limits_lock:
+                lim = self._limits.get(key)
+                if lim is not None and now - lim[0] < every:
+                    lim[1] += 1
+                    return
+                if lim is not None and lim[1]:
+                    fields["suppressed"] = int(lim[1])
+                self._limits[key] = [now, 0]
+        if len(self._buf) >= self.queue_size:
+            self.dropped += 1
+            return
+        if self._thread is None:
+            self._start()
+        self._buf.append((time.time(), lv, tag, msg, fields))
+        if not self._wake.is_set():
+            self._wake.set()
+
+    def debug(self, tag: str, msg: str, **kw: Any) -> None:
+        self.log("debug", tag, msg, **kw)
+
+    def info(self, tag: str, msg: str, **kw: Any) -> None:
+        self.log("info", tag, msg, **kw)
+
+    def warning(self, tag: str, msg: str, **kw: Any) -> None:
+        self.log("warning", tag, msg, **kw)
+
+    def error(self, tag: str, msg: str, **kw: Any) -> None:
+        self.log("error", tag, msg, **kw)
+
+    # ---------- Ausgabe ----------
+
+    def format(self, rec: Record) -> str:
+        ts, lv, tag, msg, fields = rec
+        if self.json:
+            d = {"ts": round(ts, 3), "level": _NAMES[lv], "tag": tag, "msg": msg}
+            d.update(fields)
+            return json.dumps(d, ensure_ascii=False, default=str)
+        parts = [f"[{tag}]"]
+        if lv >= LEVELS["warning"]:
+            parts.append(_NAMES[lv].upper())
+        parts.append(msg)
+        parts.extend(f"{k}={_text_value(v)}" for k, v in fields.items())
+        return " ".join(parts)
+
+    def _start(self) -> None:
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._writer, name="log_writer", daemon=True)
+                self._thread.start()
+
+    def _writer(self) -> None:
+        buf = self._buf
+        while True:
+            self._wake.wait()
+            self._wake.clear()  # vor dem Leeren: was danach kommt, weckt erneut
+            while buf:
+                self._write_batch([buf.popleft() for _ in range(min(len(buf), 512))])
+
+    def _write_batch(self, batch: List[Any]) -> None:
+        lines, flushed = [], []
+        for rec in batch:
+            if isinstance(rec, threading.Event):
+                flushed.append(rec)
+                continue
+            try:
+                lines.append(self.format(rec))
+            except Exception as e:  # nie am Logging sterben
+                lines.append(f"[log] cannot format {rec[2]}/{rec[3]}: {e}")
+        if lines:
+            stream = self.stream or sys.stdout
+            try:
+                stream.write("\n".join(lines) + "\n")
+                stream.flush()
+                self.written += len(lines)
+            except Exception:
+                self.dropped += len(lines)
+        for ev in flushed:
+            ev.set()
+
+    def flush(self, timeout: float = 2.0) -> None:
+        """Wartet, bis alles bis hierher Geloggte geschrieben ist (Tests, Prozessende)."""
+        if self._thread is None:
+            return
+        ev = threading.Event()
+        self._buf.append(ev)
+        self._wake.set()
+        ev.wait(timeout)
+
+class Summary:
+    """Zähler über mehrere Zyklen sammeln und höchstens alle every Sekunden als eine Zeile ausgeben.
+
+    every=0: jede emit()-Runde eine Zeile. Summen der Felder seit der letzten Zeile, plus cycles.
+    """
+
+    def __init__(self, logger: Logger, tag: str, msg: str, every: float = 0.0) -> None:
+        self.logger = logger
+        self.tag = tag
+        self.msg = msg
+        self.every = every
+        self._sums: Dict[str, float] = {}
+        self._cycles = 0
+        self._last = time.monotonic()
+
+    def add(self, **counts: float) -> None:
+        for k, v in counts.items():
+            self._sums[k] = self._sums.get(k, 0) + v
+        self._cycles += 1
+
+    def emit(self, level: str = "info", **extra: Any) -> bool:
+        """Zeile schreiben, falls fällig. Rückgabe: ob geschrieben wurde."""
+        now = time.monotonic()
+        if not self._cycles or (self.every > 0 and now - self._last < self.every):
+            return False
+        fields: Dict[str, Any] = {k: (round(v, 1) if isinstance(v, float) else v) for k, v in self._sums.items()}
+        if self._cycles > 1:
+            fields["cycles"] = self._cycles
+        fields.update(extra)
+        self.logger.log(level, self.tag, self.msg, **fields)
+        self._sums.clear()
+        self._cycles = 0
+        self._last = now
+        return True
+
+LOG = Logger()
+atexit.register(LOG.flush)
+
+REGISTRY.callback("wien_log_dropped_total", "Log lines dropped because the log queue was full",
+                  lambda: LOG.dropped, kind="counter")
@@ -0,0 +1,201 @@
+# wien_api/metrics.py
+"""Prometheus-Metriken (Textformat 0.0.4) ohne externe Abhängigkeit, für GET /metrics.
+
+Zähler/Histogramme mit festen Labels; eine Beobachtung kostet ein Lock und ein bisect –
+billig genug, um immer aktiv zu sein. Werte, die ohnehin irgendwo gezählt werden (SSE-Hub,
+Caches), werden erst beim Abruf über Callbacks gelesen.
+"""
+from __future__ import annotations
+import threading, time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Sekunden: von Millisekunden (Board bauen, Parsen) bis zu HTTP-Timeouts (Fetch)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, values: Tuple[str, ...]) -> LabelValues:
+        if len(values) != len(self.labels):
+            raise ValueError(f"{self.name}: expected labels {self.labels}, got {values}")
+        return tuple(str(v) for v in values)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labels, k)} {_fmt_value(v)}" for k, v in items]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels: str, value: float) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._data: Dict[LabelValues, List[float]] = {}  # [count je Bucket..., +Inf-Count, Summe]
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            d = self._data.get(key)
+            if d is None:
+                d = self._data[key] = [0.0] * (len(self.buckets) + 2)
+            d[i] += 1
+            d[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(d)) for k, d in self._data.items()]
+        out: List[str] = []
+        for key, d in items:
+            cum = 0.0
+            for b, n in zip(self.buckets + (float("inf"),), d[:-1]):
+                cum += n
+                le = 'le="%s"' % _fmt_value(b)
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {_fmt_value(cum)}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {_fmt_value(cum)}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {_fmt_value(d[-1])}")
+        return out
+
+class CallbackMetric(_Metric):
+    """Wert wird erst beim Rendern gelesen (fn() -> Zahl oder {Labelwert(e): Zahl})."""
+
+    def __init__(self, name: str, help: str, fn: Callable[[], object], kind: str = "gauge",
+                 labels: Tuple[str, ...] = ()) -> None:
+        super().__init__(name, help, labels)
+        self.kind = kind
+        self._fn = fn
+
+    def samples(self) -> List[str]:
+        try:
+            v = self._fn()
+        except Exception:
+            return []
+        if not isinstance(v, dict):
+            return [f"{self.name} {_fmt_value(v)}"]
+        out = []
+        for k, n in v.items():
+            key = k if isinstance(k, tuple) else (k,)
+            out.append(f"{self.name}{_fmt_labels(self.labels, tuple(map(str, key)))} {_fmt_value(n)}")
+        return out
+
+class Registry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing  # z.B. mehrfaches create_app im selben Prozess
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))  # type: ignore[return-value]
+
+    def gauge(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labels))  # type: ignore[return-value]
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))  # type: ignore[return-value]
+
+    def callback(self, name: str, help: str, fn: Callable[[], object], kind: str = "gauge",
+                 labels: Tuple[str, ...] = ()) -> CallbackMetric:
+        return self.register(CallbackMetric(name, help, fn, kind, labels))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+REGISTRY = Registry()
+
+# ---------- Hot-Path-Metriken ----------
+
+FETCH_SECONDS = REGISTRY.histogram(
+    "wien_fetch_seconds", "Latency of monitor requests to Wiener Linien, per requested ident", ("ident",))
+FETCH_TOTAL = REGISTRY.counter(
+    "wien_fetch_total", "Monitor request results per ident (HTTP status, 'error' or 'deadline')",
+    ("ident", "status"))
+FETCH_BYTES = REGISTRY.counter(
+    "wien_fetch_bytes_total", "Response body bytes per ident (batched responses split evenly)", ("ident",))
+PARSE_SECONDS = REGISTRY.histogram("wien_parse_seconds", "JSON parse time per monitor response")
+BOARD_BUILD_SECONDS = REGISTRY.histogram(
+    "wien_board_build_seconds", "Time to (re)build a board after its inputs changed", ("board",))
+MQTT_PUBLISH_TOTAL = REGISTRY.counter(
+    "wien_mqtt_publish_total", "MQTT publishes by kind (departures, traffic, state, attributes, board_state, "
+    "discovery, availability)", ("kind",))
+MQTT_PUBLISH_ERRORS = REGISTRY.counter(
+    "wien_mqtt_publish_errors_total", "MQTT publishes with rc != 0, by kind and rc", ("kind", "rc"))
+HTTP_SECONDS = REGISTRY.histogram(
+    "wien_http_request_seconds", "HTTP request latency per route (until the response is returned)",
+    ("route", "method", "status"))
+
+def mqtt_published(kind: str, rc: int) -> None:
+    MQTT_PUBLISH_TOTAL.inc(kind)
+    if rc != 0:
+        MQTT_PUBLISH_ERRORS.inc(kind, str(rc))
@@ -0,0 +1,297 @@
+# wien_api/model.py
+"""Kompaktes internes Datenmodell für Monitore (statt verschachtelter dicts).
+
+Item (ein Eintrag in LAST_DATA) -> Monitor -> Stop + Line. Die Abfahrten einer Line liegen
+spaltenweise in arrays (countdown, timePlanned/timeReal als Epoch-Sekunden, UTC-Offset);
+Linienname/Richtung/Typ und Stop-Felder sind interniert. Das JSON-Format der API
+(to_json/from_json) entsteht nur an den Rändern: HTTP, SSE, MQTT, Snapshot-Datei.
+
+Der countdown der WL-Antwort gilt für deren serverTime. Mit CLOCK.live rechnen die
+Auslieferungswege (to_json(now=...), Boards) ihn aus timeReal/timePlanned neu und lassen
+abgefahrene Abfahrten weg; gespeichert bleibt immer der Stand der Antwort.
+"""
+from __future__ import annotations
+import hashlib, sys, time
+from array import array
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+from .traffic import NO_REFS, TRAFFIC, Refs
+
+NO_COUNTDOWN = -(2 ** 31)  # countdown fehlt/nicht numerisch
+NO_TIME = 0                # timePlanned/timeReal fehlt
+MAX_DEPARTURES = 8         # Abfahrten pro Linie, die aus der WL-Antwort übernommen werden
+DEPARTED_GRACE = 30        # Sekunden nach der Abfahrtszeit, in denen sie noch als "0" gilt
+
+Departure = Tuple[int, int, int, int]  # (countdown, timePlanned, timeReal, tz-Offset in Minuten)
+
+def _intern(s: Any) -> Any:
+    return sys.intern(s) if isinstance(s, str) else s
+
+# Dieselben Minuten-Zeitstempel kommen in vielen Linien/Stops vor -> Ergebnisse merken
+_PARSED: Dict[str, Tuple[int, int]] = {}
+_FORMATTED: Dict[int, str] = {}  # key: epoch * 4096 + tz
+_TIME_CACHE_MAX = 8192
+
+def parse_time(s: Any) -> Tuple[int, int]:
+    """WL-Zeitstempel ("2025-10-17T17:40:00.000+0200") -> (epoch, UTC-Offset in Minuten)."""
+    if not s or not isinstance(s, str):
+        return NO_TIME, 0
+    hit = _PARSED.get(s)
+    if hit is not None:
+        return hit
+    try:
+        dt = datetime.fromisoformat(s)
+    except ValueError:
+        return NO_TIME, 0
+    off = dt.utcoffset()
+    res = int(dt.timestamp()), (int(off.total_seconds()) // 60 if off is not None else 0)
+    if len(_PARSED) >= _TIME_CACHE_MAX:
+        _PARSED.clear()
+    _PARSED[s] = res
+    return res
+
+def format_time(epoch: int, tz: int) -> str | None:
+    """Gegenstück zu parse_time (WL-Format, Millisekunden immer .000)."""
+    if epoch == NO_TIME:
+        return None
+    key = epoch * 4096 + tz
+    s = _FORMATTED.get(key)
+    if s is None:
+        g = time.gmtime(epoch + tz * 60)
+        a = abs(tz)
+        s = "%04d-%02d-%02dT%02d:%02d:%02d.000%s%02d%02d" % (
+            g[0], g[1], g[2], g[3], g[4], g[5], "+" if tz >= 0 else "-", a // 60, a % 60)
+        if len(_FORMATTED) >= _TIME_CACHE_MAX:
+            _FORMATTED.clear()
+        _FORMATTED[key] = s
+    return s
+
+def _countdown(cd: Any) -> int:
+    if isinstance(cd, bool) or not isinstance(cd, (int, float)):
+        return NO_COUNTDOWN
+    return int(cd)
+
+class CountdownClock:
+    """Uhr für die Countdown-Projektion (countdown.live), auf tick Sekunden gerundet –
+       Snapshots und Boards entstehen so höchstens einmal je tick neu."""
+
+    def __init__(self) -> None:
+        self.live = False
+        self.tick = 15
+
+    def configure(self, live: bool, tick: int = 15) -> None:
+        self.live = bool(live)
+        self.tick = max(int(tick), 1)
+
+    def now(self) -> int | None:
+        """Projektionszeitpunkt (Epoch) oder None, wenn Countdowns nicht neu berechnet werden."""
+        if not self.live:
+            return None
+        t = int(time.time())
+        return t - t % self.tick
+
+CLOCK = CountdownClock()
+
+def project(cd: int, tp: int, tr: int, now: int) -> int | None:
+    """Countdown (Minuten) zum Zeitpunkt now aus timeReal, sonst timePlanned; None = abgefahren.
+       Ohne Zeitstempel bleibt der countdown der Antwort."""
+    t = tr if tr != NO_TIME else tp
+    if t == NO_TIME:
+        return cd
+    dt = t - now
+    if dt < -DEPARTED_GRACE:
+        return None
+    return dt // 60 if dt > 0 else 0
+
+def project_departures(deps: Iterable[Departure], now: int) -> List[Departure]:
+    """Abfahrten mit Countdown zum Zeitpunkt now, ohne die abgefahrenen."""
+    out: List[Departure] = []
+    for cd, tp, tr, tz in deps:
+        c = project(cd, tp, tr, now)
+        if c is not None:
+            out.append((c, tp, tr, tz))
+    return out
+
+class Stop:
+    __slots__ = ("title", "municipality", "platform", "rbl")
+
+    def __init__(self, title: Any, municipality: Any, platform: Any, rbl: Any) -> None:
+        self.title = _intern(title)
+        self.municipality = _intern(municipality)
+        self.platform = _intern(platform)
+        self.rbl = rbl
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"title": self.title, "municipality": self.municipality,
+                "platform": self.platform, "rbl": self.rbl}
+
+class Line:
+    __slots__ = ("name", "towards", "type", "countdown", "time_planned", "time_real", "tz")
+
+    def __init__(self, name: Any, towards: Any, type_: Any, departures: Iterable[Tuple[Any, Any, Any]]) -> None:
+        """departures: (countdown, timePlanned, timeReal) wie aus dem JSON."""
+        self.name = _intern(name)
+        self.towards = _intern(towards)
+        self.type = _intern(type_)
+        cds: List[int] = []
+        planned_l: List[int] = []
+        real_l: List[int] = []
+        tzs: List[int] = []
+        for cd, planned, real in departures:
+            tp, tz_p = parse_time(planned)
+            tr, tz_r = parse_time(real)
+            cds.append(_countdown(cd))
+            planned_l.append(tp)
+            real_l.append(tr)
+            tzs.append(tz_r if tr != NO_TIME else tz_p)
+        self.countdown = array("l", cds)
+        self.time_planned = array("q", planned_l)
+        self.time_real = array("q", real_l)
+        self.tz = array("h", tzs)
+
+    def __len__(self) -> int:
+        return len(self.countdown)
+
+    def departures(self) -> Iterator[Departure]:
+        return zip(self.countdown, self.time_planned, self.time_real, self.tz)
+
+    def to_json(self, now: int | None = None) -> Dict[str, Any]:
+        """now: Countdowns auf diesen Zeitpunkt umrechnen, abgefahrene weglassen (CLOCK.now())."""
+        fmt, get = format_time, _FORMATTED.get
+        src = self.departures() if now is None else project_departures(self.departures(), now)
+        deps = [{"countdown": None if cd == NO_COUNTDOWN else cd,
+                 "timePlanned": get(tp * 4096 + tz) or fmt(tp, tz),
+                 "timeReal": get(tr * 4096 + tz) or fmt(tr, tz)}
+                for cd, tp, tr, tz in src]
+        return {"name": self.name, "towards": self.towards, "type": self.type, "departures": deps}
+
+    def digest_into(self, h: Any) -> None:
+        h.update(f"{self.name}\x1f{self.towards}\x1f{self.type}\x1e".encode("utf-8"))
+        for a in (self.countdown, self.time_planned, self.time_real, self.tz):
+            h.update(a.tobytes())
+
+def departure_json(d: Departure) -> Dict[str, Any]:
+    cd, tp, tr, tz = d
+    return {"countdown": None if cd == NO_COUNTDOWN else cd,
+            "timePlanned": format_time(tp, tz), "timeReal": format_time(tr, tz)}
+
+class Monitor:
+    __slots__ = ("stop", "lines", "traffic")
+
+    def __init__(self, stop: Stop, lines: Tuple[Line, ...], traffic: Refs = NO_REFS) -> None:
+        self.stop = stop
+        self.lines = lines
+        self.traffic = traffic  # IDs in TRAFFIC (trafficInfos, trafficInfoCategories)
+
+    @classmethod
+    def from_wl(cls, mon: Dict[str, Any], data: Dict[str, Any], max_departures: int = MAX_DEPARTURES,
+                traffic: Refs | None = None) -> "Monitor":
+        """Monitor aus der Wiener-Linien-Antwort (data.monitors[i]); nur die ersten max_departures Abfahrten.
+           traffic: bereits übernommene Störungsinfos der Antwort (sonst aus data).
+        """
+        props = (mon.get("locationStop", {}) or {}).get("properties", {}) or {}
+        lines = []
+        for ln in mon.get("lines", []) or []:
+            deps = (ln.get("departures", {}) or {}).get("departure", []) or []
+            lines.append(Line(ln.get("name"), ln.get("towards"), ln.get("type"), (
+                (t.get("countdown"), t.get("timePlanned"), t.get("timeReal"))
+                for t in ((d.get("departureTime", {}) or {}) for d in deps[:max_departures]))))
+        return cls(
+            Stop(props.get("title"), props.get("municipality"), props.get("platform") or props.get("gate"),
+                 (props.get("attributes", {}) or {}).get("rbl")),
+            tuple(lines),
+            traffic if traffic is not None else traffic_refs(data),
+        )
+
+    @classmethod
+    def from_json(cls, d: Dict[str, Any]) -> "Monitor":
+        s = d.get("stop") or {}
+        lines = tuple(
+            Line(ln.get("name"), ln.get("towards"), ln.get("type"),
+                 ((x.get("countdown"), x.get("timePlanned"), x.get("timeReal"))
+                  for x in (ln.get("departures") or []) if isinstance(x, dict)))
+            for ln in (d.get("lines") or []) if isinstance(ln, dict))
+        if "trafficInfoIds" in d:
+            traffic = (tuple(d.get("trafficInfoIds") or ()), tuple(d.get("trafficInfoCategoryIds") or ()))
+        else:
+            traffic = TRAFFIC.intern(d.get("trafficInfos"), d.get("trafficInfoCategories"))
+        return cls(Stop(s.get("title"), s.get("municipality"), s.get("platform"), s.get("rbl")), lines, traffic)
+
+    def to_json(self, inline: bool | None = None, now: int | None = None) -> Dict[str, Any]:
+        out = {"stop": self.stop.to_json(), "lines": [ln.to_json(now) for ln in self.lines]}
+        out.update(traffic_json(self.traffic, inline))
+        return out
+
+def traffic_refs(data: Dict[str, Any]) -> Refs:
+    """Störungsinfos einer WL-Antwort (data) in TRAFFIC übernehmen."""
+    return TRAFFIC.intern(data.get("trafficInfos") or data.get("trafficInfo"), data.get("trafficInfoCategories"))
+
+def traffic_json(refs: Refs, inline: bool | None = None) -> Dict[str, Any]:
+    """Felder für Monitor/Board-Eintrag: Infos eingesetzt (inline) oder nur die IDs."""
+    if TRAFFIC.inline if inline is None else inline:
+        return {"trafficInfoCategories": TRAFFIC.categories(refs[1]), "trafficInfos": TRAFFIC.infos(refs[0]) or {}}
+    return {"trafficInfoIds": list(refs[0]), "trafficInfoCategoryIds": list(refs[1])}
+
+class Item:
+    """Ergebnis für eine stopId/DIVA (= ein LAST_DATA-Eintrag)."""
+    __slots__ = ("query", "ok", "monitors", "status", "error", "ident", "ts", "stale", "not_modified")
+
+    def __init__(self, query: str, ok: bool, monitors: Tuple[Monitor, ...] = (), status: int | None = None,
+                 error: str | None = None, ident: str | None = None, ts: int | None = None,
+                 stale: bool = False, not_modified: bool = False) -> None:
+        self.query = query
+        self.ok = ok
+        self.monitors = monitors
+        self.status = status
+        self.error = error
+        self.ident = ident
+        self.ts = ts
+        self.stale = stale
+        self.not_modified = not_modified  # Upstream-Antwort wie beim letzten Fetch (nicht serialisiert)
+
+    @classmethod
+    def failed(cls, query: str, status: int | None = None, error: str | None = None) -> "Item":
+        return cls(query, False, (), status=status, error=error)
+
+    @classmethod
+    def from_json(cls, d: Dict[str, Any]) -> "Item":
+        return cls(d.get("query", ""), bool(d.get("ok")),
+                   tuple(Monitor.from_json(m) for m in (d.get("items") or []) if isinstance(m, dict)),
+                   status=d.get("status"), error=d.get("error"), ident=d.get("ident"), ts=d.get("ts"),
+                   stale=bool(d.get("stale")))
+
+    def to_json(self, with_ts: bool = True, inline: bool | None = None, now: int | None = None) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"query": self.query, "ok": self.ok}
+        if self.status is not None:
+            out["status"] = self.status
+        if self.error is not None:
+            out["error"] = self.error
+        out["items"] = [m.to_json(inline, now) for m in self.monitors]
+        if self.ok:
+            out["raw"] = None
+        if self.ident is not None:
+            out["ident"] = self.ident
+        if with_ts and self.ts is not None:
+            out["ts"] = self.ts
+        if self.stale:
+            out["stale"] = True
+        return out
+
+    def digest(self) -> bytes:
+        """Inhalts-Hash ohne ts/ident (für Change-Detection, ohne JSON zu erzeugen)."""
+        h = hashlib.blake2b(digest_size=12)
+        h.update(f"{self.ok}\x1f{self.status}\x1f{self.error}\x1e".encode("utf-8"))
+        for m in self.monitors:
+            s = m.stop
+            h.update(f"{s.title}\x1f{s.municipality}\x1f{s.platform}\x1f{s.rbl}\x1d".encode("utf-8"))
+            for ln in m.lines:
+                ln.digest_into(h)
+            h.update(repr((m.traffic, TRAFFIC.revisions(m.traffic))).encode("utf-8"))
+        return h.digest()
+
+    def with_meta(self, ident: str, ts: int | None, stale: bool = False) -> "Item":
+        """Kopie mit ident/ts/stale (Monitore werden geteilt, nicht kopiert)."""
+        return Item(self.query, self.ok, self.monitors, self.status, self.error, ident, ts, stale)
+
+def items_json(items: Iterable[Item], inline: bool | None = None, now: int | None = None) -> List[Dict[str, Any]]:
+    return [it.to_json(inline=inline, now=now) for it in items]
@@ -0,0 +1,92 @@
+# wien_api/mqtt_flow.py
+"""Flusskontrolle für MQTT-Publishes: höchstens window Nachrichten unterwegs.
+
+paho puffert ausgehende Nachrichten unbegrenzt; ein Burst (Reconnect: Discovery für alle
+Boards, erster Zyklus: alle idents) landet komplett im Speicher und verzögert alles danach.
+FlowControl zählt Publishes bis zum on_publish-Callback – bei QoS 0 heißt das „auf den
+Socket geschrieben", bei QoS 1 „vom Broker bestätigt" – und lässt den Aufrufer warten, wenn
+das Fenster voll ist. Nach timeout wird die Nachricht verworfen (rc=MQTT_ERR_QUEUE_SIZE);
+die Aufrufer vergessen dann den Hash und senden beim nächsten Mal erneut.
+Aus pahos Netzwerk-Thread (on_connect: Availability, Discovery) wird nie gewartet – dort
+kämen die Bestätigungen sonst nie an. Welcher Thread das ist, merkt sich FlowControl selbst:
+on_connect/on_disconnect rufen connection_changed() auf, loop_start/loop_stop setzen ihn zurück.
+"""
+from __future__ import annotations
+import threading
+from typing import Any
+import paho.mqtt.client as mqtt
+from .log import LOG
+
+class _Rejected:
+    """Wie MQTTMessageInfo, für nicht gesendete Nachrichten."""
+    __slots__ = ("rc", "mid")
+
+    def __init__(self, rc: int) -> None:
+        self.rc = rc
+        self.mid = 0
+
+class FlowControl:
+    """Hüllt einen paho-Client; publish() mit Fenster, alles andere wird durchgereicht."""
+
+    def __init__(self, client: Any, window: int = 100, timeout: float = 5.0) -> None:
+        self.client = client
+        self.window = max(int(window), 1)
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._inflight = 0
+        self.waited = 0    # Publishes, die auf ein freies Fenster warten mussten
+        self.rejected = 0  # nach timeout verworfen
+        self._network: threading.Thread | None = None  # pahos Netzwerk-Thread (ruft die Callbacks)
+        if hasattr(client, "max_inflight_messages_set"):
+            client.max_inflight_messages_set(self.window)  # QoS>0: pahos eigenes Fenster gleich groß
+        client.on_publish = self._on_publish
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def _on_publish(self, client, userdata, mid, reason_code=None, properties=None) -> None:
+        with self._cond:
+            self._inflight = max(self._inflight - 1, 0)
+            self._cond.notify()
+
+    def reset(self) -> None:
+        """Nach (Re)Connect/Disconnect: ausstehende Bestätigungen kommen nicht mehr."""
+        with self._cond:
+            self._inflight = 0
+            self._cond.notify_all()
+
+    def connection_changed(self) -> None:
+        """Aus on_connect/on_disconnect: Fenster zurücksetzen und den aufrufenden Thread als
+           Netzwerk-Thread merken (loop_start: pahos Thread, loop_forever: der Aufrufer).
+        """
+        self._network = threading.current_thread()
+        self.reset()
+
+    def loop_start(self) -> Any:
+        self._network = None  # neuer Thread; bekannt ab dem ersten Callback
+        return self.client.loop_start()
+
+    def loop_stop(self) -> Any:
+        r = self.client.loop_stop()
+        self._network = None
+        self.reset()
+        return r
+
+    def publish(self, topic: str, payload: Any = None, qos: int = 0, retain: bool = False) -> Any:
+        with self._cond:
+            if self._inflight >= self.window and threading.current_thread() is not self._network:
+                self.waited += 1
+                if not self._cond.wait_for(lambda: self._inflight < self.window, self.timeout):
+                    self.rejected += 1
+                    LOG.warning("mqtt", "publish window full; dropped", topic=topic, inflight=self._inflight,
+                                key="flow", every=10.0)
+                    return _Rejected(mqtt.MQTT_ERR_QUEUE_SIZE)
+            self._inflight += 1
+        r = self.client.publish(topic, payload, qos=qos, retain=retain)
+        if r.rc != mqtt.MQTT_ERR_SUCCESS:
+            self._on_publish(self.client, None, r.mid)  # kommt nicht mehr (bzw. erst nach Reconnect)
+        return r
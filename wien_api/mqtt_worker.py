@@ -1,17 +1,106 @@
 # wien_api/mqtt_worker.py
 import json, os, time, threading, fcntl
-import requests
+from typing import Any, Dict, List, Tuple
 import paho.mqtt.client as mqtt
-from .state import LAST_DATA, HUB
-from .utils import safe_topic_fragment
-from .fetcher import fetch_all
+from .pipeline import CacheSink, Sink, dispatch, end_cycle, ingest, publish_traffic
+from .persist import SnapshotSink
+from .utils import PublishCache, safe_topic_fragment
+from .fetcher import ResponseCache, fetch_all, make_session, param_ident
+from .scheduler import Param, PollScheduler
+from .model import CLOCK, Item
+from .traffic import TRAFFIC
+from .metrics import REGISTRY, mqtt_published
+from .log import LOG, Summary
+from .refresh import REFRESH
+from .delta import MQTT_DELTA, apply_patch
+from .mqtt_flow import FlowControl
 from .config import AppConfig
-from .ha_discovery import publish_discovery_for_board, publish_availability, publish_board_states
+from .boards import get_boards
+from .ha_discovery import DISCOVERY, publish_availability, publish_board_states
 
 _started = False
 _started_lock = threading.Lock()
 _filelock_fp = None
 
+# Change-Detection: Hash je Topic (ident + HA-Sensoren), Zähler gesendet/übersprungen
+_PUBLISHED = PublishCache()
+_INGESTED = PublishCache()         # ident -> Hash des zuletzt in die Pipeline gegebenen Items
+_BOARDS_SENT: Dict[str, Any] = {}  # board_id -> zuletzt publiziertes get_board-Objekt
+_RESPONSES = ResponseCache()       # URL -> ETag/Last-Modified/Body-Hash der letzten Antwort
+_KEYFRAMES: Dict[str, List[Any]] = {}  # Read-Replica, delta.mqtt: ident -> [Keyframe-seq, Item-JSON, letzte seq]
+
+_SCHEDULER: PollScheduler | None = None
+_FLOW: FlowControl | None = None   # Publish-Fenster des Fetch-Clients
+_SINK: "MQTTSink | None" = None
+_CFG: AppConfig | None = None      # aktuelle Konfiguration; set_config() tauscht sie zur Laufzeit
+_HA_LOCK = threading.Lock()        # HA-States: Zyklusende (Fetch-Thread) vs. _ha_ticks
+_DISPATCH_LOCK = threading.Lock()  # Sinks: Fetch-Loop vs. On-Demand-Refresh (refresh.py)
+
+def scheduler_stats() -> Dict[str, Any]:
+    """Geplante vs. tatsächlich erreichte Abfrageintervalle je ident."""
+    return _SCHEDULER.stats() if _SCHEDULER is not None else {}
+
+REGISTRY.callback("wien_mqtt_publish_skipped_total", "MQTT publishes skipped because the content was unchanged",
+                  lambda: _PUBLISHED.skipped, kind="counter")
+REGISTRY.callback("wien_items_unchanged_total", "Fetched items whose content had not changed (not dispatched)",
+                  lambda: _INGESTED.skipped, kind="counter")
+REGISTRY.callback("wien_fetch_not_modified_total", "Upstream responses not parsed (304 or same body), per ident",
+                  lambda: {i: c["not_modified"] + c["same_body"] for i, c in _RESPONSES.stats().items()},
+                  kind="counter", labels=("ident",))
+REGISTRY.callback("wien_mqtt_inflight", "MQTT publishes not yet confirmed by on_publish",
+                  lambda: _FLOW.inflight if _FLOW is not None else 0)
+REGISTRY.callback("wien_mqtt_flow_waits_total", "MQTT publishes that waited for a free in-flight slot",
+                  lambda: _FLOW.waited if _FLOW is not None else 0, kind="counter")
+REGISTRY.callback("wien_mqtt_flow_dropped_total", "MQTT publishes dropped after waiting publish_timeout",
+                  lambda: _FLOW.rejected if _FLOW is not None else 0, kind="counter")
+REGISTRY.callback("wien_poll_interval_seconds", "Currently planned poll interval per ident",
+                  lambda: {i: s["interval"] for i, s in scheduler_stats().get("idents", {}).items()},
+                  labels=("ident",))
+REGISTRY.callback("wien_poll_achieved_interval_seconds",
+                  "Achieved time between two fetches per ident (last, avg, min, max since start)",
+                  lambda: {(i, k): s[f"achieved_{k}"] for i, s in scheduler_stats().get("idents", {}).items()
+                           for k in ("last", "avg", "min", "max") if s[f"achieved_{k}"] is not None},
+                  labels=("ident", "stat"))
+
+def announce(cfg: AppConfig, force: bool = False) -> Dict[str, Any] | None:
+    """HA-Discovery über den laufenden Worker-Client abgleichen (POST /api/ha/announce).
+       None, wenn in diesem Prozess kein verbundener Worker-Client läuft.
+    """
+    flow = _FLOW
+    if flow is None or not flow.is_connected():
+        return None
+    return _sync_discovery(flow, cfg, force)
+
+def _sync_discovery(flow: FlowControl, cfg: AppConfig, force: bool) -> Dict[str, Any]:
+    boards = list((cfg.boards or {}).keys())
+    built = get_boards(boards)  # ein Durchlauf für alle Boards
+    totals: Dict[str, int] = {}
+    for board_id in boards:
+        for k, v in DISCOVERY.sync(flow, cfg, board_id, force=force, cache=_PUBLISHED,
+                                   board=built.get(board_id)).items():
+            totals[k] = totals.get(k, 0) + v
+    totals["removed"] = totals.get("removed", 0) + DISCOVERY.prune_boards(flow, cfg, boards, _PUBLISHED)
+    return {"boards": boards, **totals}
+
+def set_config(cfg: AppConfig) -> Tuple[List[Param], List[Param]]:
+    """Neue Konfiguration (Reload) übernehmen: Fetch-Loop, MQTT-Sink und Callbacks lesen ab
+       dem nächsten Zyklus cfg; der Scheduler plant nur hinzugekommene IDs neu ein und fragt
+       entfernte nicht mehr ab. Rückgabe: (hinzugekommene, entfernte) Parameter.
+    """
+    global _CFG
+    _CFG = cfg
+    if _SINK is not None:
+        _SINK.cfg = cfg
+    if _SCHEDULER is None:
+        return [], []
+    added, removed = _SCHEDULER.update(cfg.wien)
+    for p in removed:
+        ident = param_ident(p)
+        _INGESTED.forget(ident)  # bei erneutem Hinzufügen wieder verteilen
+        if _SINK is not None:
+            _SINK.drop(ident)
+    return added, removed
+
 def _file_lock(path: str) -> bool:
     global _filelock_fp
     if _filelock_fp is not None: return True
@@ -27,22 +116,136 @@ def _extract_ident_from_query(q: str) -> str:
 def start_background(cfg: AppConfig) -> None:
     global _started
     with _started_lock:
-        if _started: print("[mqtt] already started (flag); skipping"); return
+        if _started: LOG.info("mqtt", "already started (flag); skipping"); return
         # Lockdatei an config.json koppeln (einzig pro Prozess)
         lock_path = "/tmp/wien_mqtt.lock"
-        if not _file_lock(lock_path): print("[mqtt] already started (file lock); skipping"); _started = True; return
+        if not _file_lock(lock_path): LOG.info("mqtt", "already started (file lock); skipping"); _started = True; return
         t = threading.Thread(target=_run, name="mqtt_worker", args=(cfg,), daemon=True)
-        t.start(); _started = True; print(f"[mqtt] loop thread started (pid={os.getpid()})")
+        t.start(); _started = True; LOG.info("mqtt", "loop thread started", pid=os.getpid())
 
-def _run(cfg: AppConfig) -> None:
-    session = requests.Session()
+class MQTTSink(Sink):
+    """Veröffentlicht geänderte Items auf {base}/<ident> und (einmal pro Zyklus) HA-Board-States."""
+    name = "mqtt"
+
+    def __init__(self, client: FlowControl, cfg: AppConfig) -> None:
+        self.client = client
+        self.cfg = cfg
+        self.base = cfg.mqtt.base_topic.rstrip("/")
+        self.bytes = 0  # Payload-Bytes seit dem letzten take_bytes() (Zyklus-Log)
+
+    def drop(self, ident: str) -> None:
+        """ident nicht mehr konfiguriert: retained Abfahrten vom Broker löschen."""
+        topic = f"{self.base}/{ident}"
+        _PUBLISHED.forget(topic)
+        MQTT_DELTA.forget(ident)
+        if self.cfg.mqtt.retain:
+            r = self.client.publish(topic, b"", qos=self.cfg.mqtt.qos, retain=True)
+            mqtt_published("departures", r.rc)
+
+    def take_bytes(self) -> int:
+        n, self.bytes = self.bytes, 0
+        return n
+
+    def emit(self, ident: str, item: Item, obj: Dict[str, Any]) -> None:
+        topic = f"{self.base}/{ident}"
+        if not _PUBLISHED.changed(topic, obj):
+            return  # nach Reconnect bereits gesendet o.ä.
+        retain = self.cfg.mqtt.retain
+        if MQTT_DELTA.enabled:
+            # Keyframe (mit seq) retained auf topic, sonst Delta gegen ihn auf topic/delta
+            seq, base, ops = MQTT_DELTA.encode(ident, obj)
+            if ops is None:
+                payload = json.dumps({**obj, "seq": seq}, ensure_ascii=False)
+            else:
+                topic, retain = f"{topic}/delta", False
+                payload = json.dumps({"ident": ident, "seq": seq, "base": base, "ops": ops},
+                                     ensure_ascii=False, separators=(",", ":"))
+        else:
+            payload = json.dumps(obj, ensure_ascii=False)
+        r = self.client.publish(topic, payload, qos=self.cfg.mqtt.qos, retain=retain)
+        mqtt_published("departures", r.rc)
+        self.bytes += len(payload)
+        if self.cfg.mqtt.log_publish:
+            LOG.info("mqtt", "published", sample=True, topic=topic, rc=r.rc, bytes=len(payload))
+        if r.rc != mqtt.MQTT_ERR_SUCCESS:
+            _PUBLISHED.forget(f"{self.base}/{ident}")
+            MQTT_DELTA.forget(ident)  # nächstes Update wieder als Keyframe
+            LOG.warning("mqtt", "publish failed", rc=r.rc, topic=topic, key=f"rc:{r.rc}", every=10.0)
+
+    def end_cycle(self) -> None:
+        # Störungsinfos (retained wie die Abfahrten), nur bei Änderung
+        topic = f"{self.base}/traffic"
+        traffic = TRAFFIC.to_json()
+        if _PUBLISHED.changed(topic, traffic):
+            r = self.client.publish(topic, json.dumps(traffic, ensure_ascii=False), qos=self.cfg.mqtt.qos,
+                                    retain=self.cfg.mqtt.retain)
+            mqtt_published("traffic", r.rc)
+            if r.rc != mqtt.MQTT_ERR_SUCCESS:
+                _PUBLISHED.forget(topic)
+                LOG.warning("mqtt", "publish failed", rc=r.rc, topic=topic, key=f"rc:{r.rc}", every=10.0)
+
+        # HA-States einmal pro Zyklus, nur für Boards, deren Inhalt sich geändert hat
+        cfg = self.cfg
+        if not (cfg.mqtt.discovery and cfg.mqtt.discovery.enabled and cfg.boards):
+            return
+        with _HA_LOCK:
+            self._board_states(cfg)
+
+    def _board_states(self, cfg: AppConfig) -> None:
+        remove_after = cfg.mqtt.discovery.remove_after or None
+        built = get_boards(cfg.boards.keys())  # alle geänderten Boards in einem Durchlauf
+        for board_id in cfg.boards.keys():
+            board = built.get(board_id)
+            if board is not None and _BOARDS_SENT.get(board_id) is board:
+                continue
+            try:
+                # neue Linien/Richtungen im Board -> Discovery nachziehen (nur Differenzen)
+                DISCOVERY.sync(self.client, cfg, board_id, remove_after=remove_after, cache=_PUBLISHED,
+                               board=board)
+                publish_board_states(self.client, cfg, board_id, _PUBLISHED, board=board)
+                _BOARDS_SENT[board_id] = board
+                if cfg.mqtt.log_publish:
+                    LOG.info("mqtt", "ha states published", sample=True, board=board_id)
+            except Exception as e:
+                LOG.error("mqtt", "ha state publish error", board=board_id, error=e,
+                          key=f"ha:{board_id}", every=60.0)
+
+def _ha_ticks() -> None:
+    """countdown.ha_tick: HA-States aller Boards alle ha_tick Sekunden mit neu berechneten
+       Countdowns senden, ohne Upstream-Fetch. Unveränderte Payloads überspringt _PUBLISHED.
+    """
+    while True:
+        cfg = _CFG
+        every = cfg.countdown.ha_tick if cfg is not None else 0
+        time.sleep(every or 30)  # 0: nur prüfen, ob ein Reload es eingeschaltet hat
+        flow = _FLOW
+        if not every or not CLOCK.live or flow is None or not flow.is_connected():
+            continue
+        if not (cfg.mqtt.discovery and cfg.mqtt.discovery.enabled and cfg.boards):
+            continue
+        sent0 = _PUBLISHED.sent
+        with _HA_LOCK:
+            built = get_boards(cfg.boards.keys())
+            for board_id in cfg.boards.keys():
+                try:
+                    publish_board_states(flow, cfg, board_id, _PUBLISHED, board=built.get(board_id))
+                except Exception as e:
+                    LOG.error("mqtt", "ha tick error", board=board_id, error=e, key=f"ha:{board_id}", every=60.0)
+        if cfg.mqtt.log_publish:
+            LOG.info("mqtt", "ha tick", boards=len(cfg.boards), sent=_PUBLISHED.sent - sent0)
 
-    client = mqtt.Client(client_id="wien_api", protocol=mqtt.MQTTv5,
+def _make_client(cfg: AppConfig, replica: bool) -> FlowControl:
+    global _FLOW
+    client = mqtt.Client(client_id="wien_api_replica" if replica else "wien_api", protocol=mqtt.MQTTv5,
                          callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+    flow = FlowControl(client, cfg.mqtt.max_inflight, cfg.mqtt.publish_timeout)
+    if not replica:
+        _FLOW = flow
     if cfg.mqtt.username and cfg.mqtt.password:
         client.username_pw_set(cfg.mqtt.username, cfg.mqtt.password)
-    avail_topic = f"{cfg.mqtt.base_topic.rstrip('/')}/availability"
-    client.will_set(avail_topic, payload="offline", qos=0, retain=True)
+    if not replica:
+        avail_topic = f"{cfg.mqtt.base_topic.rstrip('/')}/availability"
+        client.will_set(avail_topic, payload="offline", qos=0, retain=True)
     client.user_data_set({"connected_once": False})
     client.reconnect_delay_set(min_delay=cfg.mqtt.reconnect_min, max_delay=cfg.mqtt.reconnect_max)
 
@@ -52,20 +255,35 @@ def _run(cfg: AppConfig) -> None:
         first = not userdata.get("connected_once", False); userdata["connected_once"] = True
         tag = "connect" if first else "reconnect"
         ok = getattr(reason_code, "is_success", lambda: reason_code == 0)()
-        print(f"[mqtt] {tag} rc={reason_code} ok={ok}")
-        client.subscribe(f"{base}/+", qos=0)
+        LOG.info("mqtt", tag, rc=reason_code, ok=ok)
+        if replica:
+            # Read-Replica: Cache aus den Topics einer anderen Instanz füllen
+            client.subscribe(f"{base}/+", qos=0)
+            client.subscribe(f"{base}/+/delta", qos=0)  # delta.mqtt der anderen Instanz
+            return
+
+        # Broker evtl. ohne retained Messages (Neustart) -> beim nächsten Zyklus alles senden
+        # (_INGESTED/_RESPONSES mit, sonst erreicht ein unverändertes Item den MQTT-Sink nicht)
+        _PUBLISHED.clear(); _BOARDS_SENT.clear(); _INGESTED.clear(); _RESPONSES.clear()
+        MQTT_DELTA.clear()  # retained Keyframes evtl. weg -> je ident zuerst wieder ein Keyframe
+        flow.connection_changed()
 
         # HA availability -> online
-        publish_availability(client, cfg, True)
+        publish_availability(flow, cfg, True)
 
-        # HA discovery für alle Boards (falls aktiviert)
-        if cfg.mqtt.discovery and cfg.mqtt.discovery.enabled:
-            for board_id in (cfg.boards or {}).keys():
-                publish_discovery_for_board(client, cfg, board_id)
+        # HA discovery für alle Boards (falls aktiviert); immer alles – retained Configs
+        # sind nach einem Broker-Neustart evtl. weg (die Registry merkt sich nur, was weg soll)
+        now = _CFG or cfg  # Boards evtl. per Reload geändert
+        if now.mqtt.discovery and now.mqtt.discovery.enabled:
+            # HA-Neustart: Birth-Message "online" auf <prefix>/status -> Configs erneut senden
+            client.subscribe(f"{now.mqtt.discovery.prefix}/status", qos=0)
+            _sync_discovery(flow, now, force=True)
 
     def on_disconnect(client, userdata, disconnect_flags, reason_code, properties):
-        publish_availability(client, cfg, False)
-        print(f"[mqtt] disconnected rc={reason_code}")
+        flow.connection_changed()
+        if not replica:
+            publish_availability(flow, cfg, False)
+        LOG.warning("mqtt", "disconnected", rc=reason_code)
 
     def on_message(client, userdata, msg):
         try:
@@ -75,7 +293,10 @@ def _run(cfg: AppConfig) -> None:
                 return
 
             rest = topic[len(base_prefix):]  # z.B. "diva_60200607"
-            if "/" in rest:
+            delta = rest.endswith("/delta")
+            if delta:
+                rest = rest[:-len("/delta")]
+            if "/" in rest or rest == "availability":
                 # z.B. boards/<...>/state -> ignorieren
                 return
 
@@ -83,49 +304,140 @@ def _run(cfg: AppConfig) -> None:
             data = json.loads(payload)
             if not isinstance(data, dict):
                 return
+            if rest == "traffic":
+                TRAFFIC.load_json(data)
+                publish_traffic()
+                return
+            if delta:
+                _apply_delta(rest, data)
+                return
 
             ident = data.get("ident") or rest
-            LAST_DATA[ident] = data
-            HUB.publish(json.dumps({
-                "type": "update", "ts": int(time.time()),
-                "ident": ident, "item": data
-            }, ensure_ascii=False))
+            seq = data.pop("seq", None)  # delta.mqtt: Keyframe, Bezug für die folgenden Deltas
+            if isinstance(seq, int):
+                _KEYFRAMES[ident] = [seq, data, seq]
+            else:
+                _KEYFRAMES.pop(ident, None)
+            ingest(ident, Item.from_json(data), data)
         except json.JSONDecodeError:
             return
         except Exception as e:
-            print(f"[mqtt] on_message error: {e}")
+            LOG.error("mqtt", "on_message error", topic=msg.topic, error=e, key="on_message", every=10.0)
+
+    def on_ha_status(client, userdata, msg):
+        now = _CFG or cfg
+        if msg.payload.strip() != b"online" or not (now.mqtt.discovery and now.mqtt.discovery.enabled):
+            return
+        LOG.info("mqtt", "home assistant online; re-sending discovery")
+        try:
+            _sync_discovery(flow, now, force=True)
+        except Exception as e:
+            LOG.error("mqtt", "discovery resync failed", error=e, key="ha_status", every=10.0)
 
-    client.on_connect = on_connect; client.on_disconnect = on_disconnect; client.on_message = on_message
+    client.on_connect = on_connect; client.on_disconnect = on_disconnect
+    if replica:
+        client.on_message = on_message
+    elif cfg.mqtt.discovery:  # prefix ändert sich erst mit einem Neustart
+        client.message_callback_add(f"{cfg.mqtt.discovery.prefix}/status", on_ha_status)
 
     try:
         client.connect(cfg.mqtt.host, cfg.mqtt.port, keepalive=60)
     except Exception as e:
-        print(f"[mqtt] initial connect failed: {e}")
-    client.loop_start()
+        LOG.error("mqtt", "initial connect failed", error=e)
+    flow.loop_start()
+    return flow
 
+def _apply_delta(ident: str, msg: Dict[str, Any]) -> None:
+    """Read-Replica: Delta (delta.mqtt) auf den letzten Keyframe des ident anwenden."""
+    ident = msg.get("ident") or ident
+    key = _KEYFRAMES.get(ident)
+    seq = msg.get("seq")
+    if key is None or msg.get("base") != key[0] or not isinstance(seq, int) or seq <= key[2]:
+        return  # Keyframe fehlt/passt nicht oder Delta überholt: auf den nächsten Keyframe warten
+    data = apply_patch(key[1], msg.get("ops") or [])
+    key[2] = seq
+    ingest(ident, Item.from_json(data), data)
+
+def _distribute(sinks: List[Sink], items: List[Item]) -> int:
+    """Inhaltlich geänderte Items an die Sinks geben (unter _DISPATCH_LOCK), danach end_cycle.
+       Rückgabe: Anzahl unveränderter Upstream-Antworten (304/gleicher Body).
+    """
+    not_modified = 0
+    for item in items:
+        if item.not_modified:
+            not_modified += 1
+            continue  # Upstream-Antwort unverändert: nicht geparst, nichts zu verteilen
+        ident_raw = _extract_ident_from_query(item.query)
+        ident = safe_topic_fragment(ident_raw)
+        if not _INGESTED.changed_digest(ident, item.digest()):
+            continue  # inhaltlich unverändert (ts zählt nicht)
+        item.ident = ident
+        item.ts = int(time.time())
+        dispatch(sinks, ident, item, item.to_json())  # JSON-Form einmal für alle Sinks
+    end_cycle(sinks)
+    return not_modified
+
+def _run(cfg: AppConfig) -> None:
+    global _CFG, _SINK, _SCHEDULER
+    if _CFG is None:
+        _CFG = cfg
+    if cfg.mqtt.enabled and cfg.mqtt.subscribe:
+        # Read-Replica: kein eigener Fetch, Daten kommen per MQTT von der Fetch-Instanz
+        _make_client(cfg, replica=True)
+        LOG.info("mqtt", "read replica: feeding cache from MQTT")
+        threading.Event().wait()
+        return
+
+    session = make_session(cfg.wien)
+    sinks: List[Sink] = [CacheSink()]
+    if cfg.cache.snapshot_path:
+        sinks.append(SnapshotSink(cfg.cache.snapshot_path))
+    mqtt_sink = None
+    if cfg.mqtt.enabled:
+        mqtt_sink = _SINK = MQTTSink(_make_client(cfg, replica=False), cfg)
+        sinks.append(mqtt_sink)
+        threading.Thread(target=_ha_ticks, name="ha_ticks", daemon=True).start()
+    # eine Zeile pro Zyklus (bzw. je summary_interval) statt einer je Nachricht
+    summary = Summary(LOG, "mqtt", "cycle", every=cfg.log.summary_interval)
+
+    sched = _SCHEDULER = PollScheduler(_CFG.wien)
+
+    def fetch_now(params: List[Param]) -> None:
+        """On-Demand-Refresh (GET /api/board bei veralteten idents): außerhalb des Plans holen."""
+        started = time.monotonic()
+        items = fetch_all(cfg.wien, session, params, _RESPONSES)
+        sched.record_refresh(list(zip(params, items)), started)  # nächste geplante Abfrage später
+        with _DISPATCH_LOCK:
+            _distribute(sinks, items)
+
+    REFRESH.attach(fetch_now, sched.last_fetch, sched.acquire, sched.requests_for)
     while True:
+        params = sched.wait_due()
+        if _CFG is not cfg:  # Reload: neue Werte ab diesem Zyklus
+            old, cfg = cfg.wien, _CFG
+            if old.max_concurrency != cfg.wien.max_concurrency:
+                stale, session = session, make_session(cfg.wien)  # Pool-Größe
+                stale.close()  # Thread-Pool der alten Session beenden
+            summary.every = cfg.log.summary_interval
+        started = time.monotonic()
+        pending = list(params)
         try:
-            items = fetch_all(cfg.wien, session)
-            for item in items:
-                ident_raw = _extract_ident_from_query(item.get("query", ""))
-                ident = safe_topic_fragment(ident_raw)
-                topic = f"{base}/{ident}"
-                obj = dict(item); obj["ident"] = ident; obj["ts"] = int(time.time())
-                payload = json.dumps(obj, ensure_ascii=False)
-                r = client.publish(topic, payload, qos=0, retain=cfg.mqtt.retain)
-                if cfg.mqtt.log_publish:
-                    print(f"[mqtt] published topic={topic} rc={r.rc} bytes={len(payload)}")
-                if r.rc != mqtt.MQTT_ERR_SUCCESS:
-                    print(f"[mqtt] publish rc={r.rc} topic={topic}")
-                if cfg.mqtt.discovery and cfg.mqtt.discovery.enabled and cfg.boards:
-                    for board_id in cfg.boards.keys():
-                        try:
-                            publish_board_states(client, cfg, board_id)
-                            if cfg.mqtt.log_publish:
-                                print(f"[mqtt][ha] publish for board {board_id}")
-                        except Exception as e:
-                            print(f"[mqtt][ha] state publish error for board {board_id}: {e}")
+            items = fetch_all(cfg.wien, session, params, _RESPONSES)
+            fetched = time.monotonic()
+            sent0, skipped0 = _PUBLISHED.sent, _PUBLISHED.skipped
+            for p, item in zip(params, items):
+                sched.record(p, item, started); pending.remove(p)
+            with _DISPATCH_LOCK:
+                not_modified = _distribute(sinks, items)
+            if cfg.mqtt.log_publish:
+                done = time.monotonic()
+                summary.add(ids=len(params), not_modified=not_modified, sent=_PUBLISHED.sent - sent0,
+                            skipped=_PUBLISHED.skipped - skipped0,
+                            bytes=mqtt_sink.take_bytes() if mqtt_sink is not None else 0,
+                            fetch_ms=(fetched - started) * 1e3, publish_ms=(done - fetched) * 1e3)
+                summary.emit(next_in_s=round(max(sched.next_wakeup() - done, 0), 1))
         except Exception as e:
-            print(f"[mqtt] publish loop error: {e}")
-        time.sleep(cfg.wien.interval_seconds)
-
+            LOG.error("mqtt", "publish loop error", error=e, key="loop", every=30.0)
+        finally:
+            for p in pending:  # nie eine ID aus dem Plan verlieren
+                sched.record(p, Item.failed(""), started)
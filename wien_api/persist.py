@@ -0,0 +1,81 @@
+# wien_api/persist.py
+"""Warmstart: LAST_DATA als JSON-Lines-Datei sichern und beim Start wieder laden.
+
+Format: Kopfzeile {"v": 1, "savedAt": <epoch>}, danach eine Zeile {"ident", "item"} pro Eintrag.
+Geschrieben wird atomar (temp-Datei + os.replace), damit ein Absturz keine halbe Datei hinterlässt.
+"""
+from __future__ import annotations
+import json, os, time
+from typing import Any, Dict
+from .state import snapshot, update_items
+from .pipeline import Sink
+from .model import Item
+from .log import LOG
+
+_FORMAT = 1
+
+def save_snapshot(path: str) -> int:
+    """Schreibt den aktuellen Cache nach path. Rückgabe: Anzahl Einträge."""
+    items = snapshot().items()
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"v": _FORMAT, "savedAt": int(time.time())}) + "\n")
+        for ident, item in items:
+            f.write(json.dumps({"ident": ident, "item": item.to_json(inline=True)},
+                               ensure_ascii=False, separators=(",", ":")) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(items)
+
+def load_snapshot(path: str, max_age: int = 0) -> int:
+    """Lädt einen gespeicherten Cache; Einträge werden mit "stale": true markiert.
+       Dateien älter als max_age Sekunden (0 = egal) werden ignoriert. Rückgabe: Anzahl Einträge.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            head = json.loads(f.readline() or "{}")
+            if head.get("v") != _FORMAT:
+                return 0
+            age = int(time.time()) - int(head.get("savedAt") or 0)
+            if max_age > 0 and age > max_age:
+                LOG.info("persist", "snapshot too old; ignoring", path=path, age_s=age)
+                return 0
+            current = snapshot()
+            restored: Dict[str, Item] = {}
+            for line in f:
+                try:
+                    rec: Dict[str, Any] = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # abgeschnittene letzte Zeile
+                ident, item = rec.get("ident"), rec.get("item")
+                if ident and isinstance(item, dict) and ident not in current:
+                    it = Item.from_json(item)
+                    it.stale = True
+                    restored[ident] = it
+            n = len(restored)
+            if n:
+                update_items(restored.items())  # ein neuer Snapshot für alle
+    except FileNotFoundError:
+        return 0
+    except (OSError, ValueError) as e:
+        LOG.error("persist", "cannot load snapshot", path=path, error=e)
+        return 0
+    LOG.info("persist", "warm start", items=n, path=path, age_s=age)
+    return n
+
+class SnapshotSink(Sink):
+    """Schreibt die Snapshot-Datei am Zyklusende, wenn sich im Zyklus etwas geändert hat."""
+    name = "snapshot"
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._dirty = False
+
+    def emit(self, ident: str, item: Item, obj: Dict[str, Any]) -> None:
+        self._dirty = True
+
+    def end_cycle(self) -> None:
+        if self._dirty:
+            save_snapshot(self.path)
+            self._dirty = False
@@ -0,0 +1,101 @@
+# wien_api/pipeline.py
+"""In-Process-Pipeline: Fetch-Loop -> Sinks (Cache/SSE, MQTT, ...).
+
+Der Fetch-Loop reicht jedes inhaltlich geänderte Item an alle Sinks weiter.
+CacheSink schreibt direkt in LAST_DATA und den SSE-HUB – ohne Umweg über den Broker
+(mit delta.sse als Deltas, siehe delta.py); die Items eines Zyklus gehen am Zyklusende
+gesammelt in einen neuen Snapshot (eine Kopie von LAST_DATA statt einer je Item).
+"""
+from __future__ import annotations
+import json, time
+from typing import Any, Dict, List, Tuple
+from .state import HUB, snapshot, update_items
+from .boards import boards_for_ident
+from .delta import SSE_DELTA
+from .model import Item
+from .log import LOG
+from .traffic import TRAFFIC
+
+def ingest(ident: str, item: Item, item_json: Dict[str, Any] | None = None) -> None:
+    """Item in den HTTP-Cache übernehmen und als SSE-Update (ident-/board-getaggt) verteilen.
+       Mit delta.sse als Delta gegen die vorige seq des ident (siehe delta.py).
+    """
+    ingest_many([(ident, item, item_json if item_json is not None else item.to_json())])
+
+def ingest_many(entries: List[Tuple[str, Item, Dict[str, Any]]]) -> None:
+    """Wie ingest für (ident, Item, Item-JSON) eines ganzen Zyklus: ein neuer Snapshot für alle."""
+    if not entries:
+        return
+    with SSE_DELTA.lock:  # Cache-Stand und seq gemeinsam ändern (Snapshot-Frames lesen beides)
+        update_items((ident, item) for ident, item, _ in entries)
+        ts = int(time.time())
+        for ident, _, obj in entries:
+            tags = [f"ident:{ident}"] + [f"board:{b}" for b in boards_for_ident(ident)]
+            if SSE_DELTA.enabled:
+                msg = SSE_DELTA.frame(ident, obj, ts)
+            else:
+                msg = {"type": "update", "ts": ts, "ident": ident, "item": obj}
+            HUB.publish(json.dumps(msg, ensure_ascii=False), tags=tags)
+
+def publish_traffic() -> None:
+    """Störungsinfos als SSE-Event an alle Streams (nur ohne inline nötig)."""
+    if not TRAFFIC.inline:
+        HUB.publish(json.dumps({"type": "traffic", "ts": int(time.time()), **TRAFFIC.to_json()},
+                               ensure_ascii=False))
+
+def prune_traffic() -> int:
+    """Störungsinfos entfernen, die kein Monitor in LAST_DATA mehr referenziert."""
+    ids: set = set()
+    cat_ids: set = set()
+    for item in snapshot().values():
+        for mon in item.monitors:
+            ids.update(mon.traffic[0])
+            cat_ids.update(mon.traffic[1])
+    return TRAFFIC.prune((tuple(ids), tuple(cat_ids)))
+
+class Sink:
+    """Ziel für Items aus dem Fetch-Loop. emit() pro geändertem Item, end_cycle() einmal pro Zyklus.
+       obj ist die JSON-Form von item (einmal erzeugt, von allen Sinks geteilt; nicht verändern).
+    """
+    name = "sink"
+
+    def emit(self, ident: str, item: Item, obj: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def end_cycle(self) -> None:
+        pass
+
+class CacheSink(Sink):
+    """Sammelt die Items eines Zyklus und übernimmt sie in end_cycle gemeinsam (ingest_many)."""
+    name = "cache"
+
+    def __init__(self) -> None:
+        self._traffic_version = -1
+        self._pending: List[Tuple[str, Item, Dict[str, Any]]] = []
+
+    def emit(self, ident: str, item: Item, obj: Dict[str, Any]) -> None:
+        self._pending.append((ident, item, obj))
+
+    def end_cycle(self) -> None:
+        pending, self._pending = self._pending, []
+        ingest_many(pending)
+        prune_traffic()
+        if TRAFFIC.version != self._traffic_version:
+            self._traffic_version = TRAFFIC.version
+            publish_traffic()
+
+def dispatch(sinks: List[Sink], ident: str, item: Item, obj: Dict[str, Any]) -> None:
+    """Ein Fehler in einem Sink hält die übrigen nicht auf."""
+    for sink in sinks:
+        try:
+            sink.emit(ident, item, obj)
+        except Exception as e:
+            LOG.error("pipeline", "sink error", sink=sink.name, ident=ident, error=e,
+                      key=f"pipeline:{sink.name}", every=10.0)
+
+def end_cycle(sinks: List[Sink]) -> None:
+    for sink in sinks:
+        try:
+            sink.end_cycle()
+        except Exception as e:
+            LOG.error("pipeline", "end_cycle error", sink=sink.name, error=e)
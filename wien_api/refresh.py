@@ -0,0 +1,148 @@
+# wien_api/refresh.py
+"""On-Demand-Refresh für Board-Abrufe (singleflight).
+
+Sind die idents eines Boards älter als wien.stale_after, holt GET /api/board/<id> sie
+außerplanmäßig neu – aber nur einmal: gleichzeitige Abrufe (auch anderer Boards mit
+denselben idents) hängen sich an den laufenden Fetch an. Jeder neue Fetch braucht je
+Upstream-Request (Batch) ein Token aus refresh_per_minute und Budget im Scheduler
+(max_requests_per_minute); ohne Budget wird der Cache ausgeliefert. stale_after ist wie
+interval_seconds mindestens 15 s (Fair-Use der Wiener Linien). Der Aufrufer wartet höchstens refresh_deadline
+Sekunden; ein länger laufender Fetch landet trotzdem im Cache (für die nächsten Abrufe).
+"""
+from __future__ import annotations
+import threading, time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Tuple
+from .boards import idents_for_board
+from .fetcher import ident_param
+from .log import LOG
+from .metrics import REGISTRY
+
+Param = Tuple[str, str]
+
+REFRESH_TOTAL = REGISTRY.counter(
+    "wien_board_refresh_total",
+    "Board reads by refresh result (fresh, refreshed, timeout, throttled, error)", ("result",))
+
+class OnDemandRefresh:
+    def __init__(self) -> None:
+        self.stale_after = 0.0   # Sekunden; 0 = aus
+        self.deadline = 1.5      # Sekunden, die ein Abruf höchstens auf den Fetch wartet
+        self._rate = 20.0        # eigene Upstream-Requests pro Minute
+        self._tokens = self._rate
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+        self._inflight: Dict[Param, Future] = {}
+        self._fetched: Dict[Param, float] = {}  # param -> monotone Startzeit des letzten On-Demand-Fetches
+        self._fetch: Callable[[List[Param]], None] | None = None
+        self._last_fetch: Callable[[Param], float | None] | None = None
+        self._acquire: Callable[[List[Param]], bool] | None = None
+        self._cost: Callable[[List[Param]], int] | None = None
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="refresh")
+        self.fetches = 0
+        self.coalesced = 0  # Abrufe, die sich an einen laufenden Fetch angehängt haben
+
+    def configure(self, stale_after: float, deadline: float, per_minute: float) -> None:
+        with self._lock:
+            self.stale_after = max(float(stale_after), 15.0) if stale_after > 0 else 0.0
+            self.deadline = max(float(deadline), 0.0)
+            self._rate = max(float(per_minute), 0.0)
+            self._tokens = min(self._tokens, self._rate)
+
+    def attach(self, fetch: Callable[[List[Param]], None], last_fetch: Callable[[Param], float | None],
+               acquire: Callable[[List[Param]], bool], cost: Callable[[List[Param]], int]) -> None:
+        """Vom Fetch-Loop: fetch(params) holt und verteilt Items; last_fetch/acquire/cost
+           (Anzahl Upstream-Requests für params) vom Scheduler.
+        """
+        self._fetch, self._last_fetch, self._acquire, self._cost = fetch, last_fetch, acquire, cost
+
+    @property
+    def enabled(self) -> bool:
+        return self.stale_after > 0 and self._fetch is not None
+
+    def _age(self, p: Param, now: float) -> float | None:
+        """Sekunden seit dem letzten Fetch; None für idents, die nicht (mehr) abgefragt werden."""
+        last = self._last_fetch(p)
+        if last is None:
+            return None  # nicht konfiguriert oder noch nie abgefragt (der Loop holt es gleich)
+        return now - max(last, self._fetched.get(p, last))
+
+    def _has_tokens(self, now: float, n: int) -> bool:
+        self._tokens = min(self._rate, self._tokens + (now - self._refilled) * self._rate / 60.0)
+        self._refilled = now
+        return self._tokens >= n
+
+    def for_board(self, board_id: str) -> str:
+        """Veraltete idents des Boards auffrischen (höchstens deadline Sekunden warten).
+           Rückgabe: "off", "fresh", "refreshed", "timeout", "throttled" oder "error".
+        """
+        return self.for_boards((board_id,))
+
+    def for_boards(self, board_ids: Iterable[str]) -> str:
+        """Wie for_board für mehrere Boards; gemeinsame idents werden einmal geholt."""
+        if not self.enabled:
+            return "off"
+        idents = dict.fromkeys(i for b in board_ids for i in idents_for_board(b))
+        res = self.ensure([ident_param(i) for i in idents])
+        REFRESH_TOTAL.inc(res)
+        return res
+
+    def ensure(self, params: List[Param]) -> str:
+        now = time.monotonic()
+        futures: List[Future] = []
+        with self._lock:
+            stale = []
+            for p in params:
+                age = self._age(p, now)
+                if age is not None and age > self.stale_after:
+                    stale.append(p)
+            if not stale:
+                return "fresh"
+            new = []
+            for p in stale:
+                f = self._inflight.get(p)
+                if f is not None:
+                    if f not in futures:
+                        futures.append(f)
+                    self.coalesced += 1
+                else:
+                    new.append(p)
+            cost = self._cost(new) if new else 0
+            if new and self._has_tokens(now, cost) and self._acquire(new):
+                self._tokens -= cost
+                fut: Future = Future()
+                for p in new:
+                    self._inflight[p] = fut
+                futures.append(fut)
+                self.fetches += 1
+                self._pool.submit(self._run, new, fut)
+        if not futures:
+            return "throttled"
+        done, _ = wait(futures, timeout=self.deadline)
+        if len(done) < len(futures):
+            return "timeout"
+        return "refreshed" if all(f.result() for f in done) else "error"
+
+    def _run(self, params: List[Param], fut: Future) -> None:
+        started = time.monotonic()
+        ok = False
+        try:
+            self._fetch(params)
+            ok = True
+        except Exception as e:
+            LOG.error("refresh", "on-demand fetch failed", error=e, key="refresh", every=30.0)
+        finally:
+            with self._lock:
+                for p in params:
+                    if ok:
+                        self._fetched[p] = started
+                    if self._inflight.get(p) is fut:
+                        del self._inflight[p]
+            fut.set_result(ok)
+
+REFRESH = OnDemandRefresh()
+
+REGISTRY.callback("wien_board_refresh_fetches_total", "On-demand upstream fetches for stale boards",
+                  lambda: REFRESH.fetches, kind="counter")
+REGISTRY.callback("wien_board_refresh_coalesced_total", "Board reads that joined an on-demand fetch already in flight",
+                  lambda: REFRESH.coalesced, kind="counter")
@@ -0,0 +1,178 @@
+# wien_api/reload.py
+"""config.yaml zur Laufzeit neu laden (SIGHUP oder Dateiänderung), ohne Neustart.
+
+Die neue Datei wird geparst und geprüft (Boards/Regeln kompiliert), bevor irgendetwas
+übernommen wird; bei Fehlern bleibt die laufende Konfiguration aktiv. Danach werden die
+Boards in einem Schritt getauscht, der Scheduler fragt nur hinzugekommene IDs neu ab und
+entfernte nicht mehr, LAST_DATA bleibt warm (nur entfernte IDs fallen heraus).
+Einstellungen, die an Verbindungen/Sockets hängen (MQTT-Broker, HTTP-Server, Cache-Datei),
+behalten ihren alten Wert und werden als restart_required gemeldet.
+"""
+from __future__ import annotations
+import os, signal, threading, time
+from dataclasses import replace
+from typing import Any, Dict, List, Tuple
+from .config import AppConfig, load_config
+from .boards import compile_boards, set_boards
+from .fetcher import ident_params, param_ident
+from .log import LOG
+from .metrics import REGISTRY
+from .model import CLOCK
+from .refresh import REFRESH
+from .routes import clear_snapshot_frames
+from .delta import MQTT_DELTA, SSE_DELTA
+from .state import HUB, remove_items
+
+# nur per Neustart änderbar: (Abschnitt, Felder)
+_RESTART_ONLY: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("mqtt", ("enabled", "subscribe", "host", "port", "username", "password", "base_topic",
+              "reconnect_min", "reconnect_max", "max_inflight", "publish_timeout")),
+    ("http", ("bind", "port", "server", "waitress_threads", "compress")),
+    ("cache", ("snapshot_path", "snapshot_max_age")),
+    ("traffic", ("inline",)),
+    ("reload", ("watch_interval",)),
+)
+
+RELOADS = REGISTRY.counter("wien_config_reloads_total", "Config reloads by result", ("result",))
+RELOAD_SECONDS = REGISTRY.gauge("wien_config_reload_seconds", "Duration of the last successful config reload")
+
+_lock = threading.Lock()
+
+def _keep(old: Any, new: Any, fields: Tuple[str, ...], prefix: str, changed: List[str]) -> Any:
+    """new mit den alten Werten der Felder, die sich nicht ohne Neustart ändern lassen."""
+    kept = {f: getattr(old, f) for f in fields if getattr(old, f) != getattr(new, f)}
+    changed.extend(f"{prefix}.{f}" for f in kept)
+    return replace(new, **kept) if kept else new
+
+def effective_config(old: AppConfig, new: AppConfig) -> Tuple[AppConfig, List[str]]:
+    """Neue Konfiguration ohne die nur per Neustart änderbaren Felder. Rückgabe: (cfg, geänderte Felder)."""
+    changed: List[str] = []
+    parts = {sec: _keep(getattr(old, sec), getattr(new, sec), fields, sec, changed)
+             for sec, fields in _RESTART_ONLY}
+    od, nd = old.mqtt.discovery, parts["mqtt"].discovery
+    if od is not None and nd is not None:
+        parts["mqtt"] = replace(parts["mqtt"], discovery=_keep(od, nd, ("prefix",), "mqtt.discovery", changed))
+    return replace(new, **parts), changed
+
+def _diff_boards(old: Dict[str, Any], new: Dict[str, Any]) -> Tuple[List[str], List[str], List[str]]:
+    added = [b for b in new if b not in old]
+    removed = [b for b in old if b not in new]
+    changed = [b for b in new if b in old and new[b] != old[b]]
+    return added, removed, changed
+
+def reload_config(app: Any, path: str) -> Dict[str, Any]:
+    """path neu laden und übernehmen. Rückgabe: Bericht mit Dauer je Phase und Änderungen."""
+    with _lock:
+        t0 = time.perf_counter()
+        old: AppConfig = app.config["CFG"]
+        try:
+            new = load_config(path)
+        except Exception as e:
+            return _rejected(t0, [str(e)])
+        t1 = time.perf_counter()
+        compiled = compile_boards(new.boards)
+        if compiled.errors:
+            return _rejected(t0, compiled.errors)
+        cfg, restart_required = effective_config(old, new)
+        t2 = time.perf_counter()
+
+        b_added, b_removed, b_changed = _diff_boards(old.boards or {}, cfg.boards or {})
+        old_params, new_params = ident_params(old.wien), ident_params(cfg.wien)
+        old_set, new_set = set(old_params), set(new_params)
+        p_added = [p for p in new_params if p not in old_set]
+        p_removed = [p for p in old_params if p not in new_set]
+
+        LOG.configure(cfg.log.level, cfg.log.format, cfg.log.sample_rate)
+        HUB.set_replay_size(cfg.http.sse_replay)
+        CLOCK.configure(cfg.countdown.live, cfg.countdown.tick)
+        REFRESH.configure(cfg.wien.stale_after, cfg.wien.refresh_deadline, cfg.wien.refresh_per_minute)
+        SSE_DELTA.configure(cfg.delta.sse, cfg.delta.keyframe_every, cfg.delta.max_ratio)
+        MQTT_DELTA.configure(cfg.delta.mqtt, cfg.delta.keyframe_every, cfg.delta.max_ratio)
+        if b_added or b_removed or b_changed or cfg.countdown.live != old.countdown.live:
+            set_boards(compiled)  # Regel-Index atomar tauschen; Boards werden beim nächsten Zugriff neu gebaut
+            clear_snapshot_frames()  # Board-Filter der SSE-Snapshots
+        if cfg.delta.sse != old.delta.sse:
+            clear_snapshot_frames()  # mit/ohne seqs
+        if not cfg.mqtt.subscribe:  # Read-Replica: LAST_DATA kommt von der anderen Instanz
+            remove_items(param_ident(p) for p in p_removed)
+            for p in p_removed:
+                SSE_DELTA.forget(param_ident(p))
+        app.config["CFG"] = cfg
+
+        from . import mqtt_worker
+        mqtt_worker.set_config(cfg)
+        announced = None
+        if cfg.mqtt.discovery and cfg.mqtt.discovery.enabled and (b_added or b_removed or b_changed):
+            announced = mqtt_worker.announce(cfg)  # neue/geänderte Sensoren melden, entfernte Boards löschen
+        t3 = time.perf_counter()
+
+        report = {
+            "ok": True,
+            "parse_ms": round((t1 - t0) * 1e3, 2),
+            "validate_ms": round((t2 - t1) * 1e3, 2),
+            "apply_ms": round((t3 - t2) * 1e3, 2),
+            "total_ms": round((t3 - t0) * 1e3, 2),
+            "idents_added": [param_ident(p) for p in p_added],
+            "idents_removed": [param_ident(p) for p in p_removed],
+            "boards_added": b_added, "boards_removed": b_removed, "boards_changed": b_changed,
+            "restart_required": restart_required,
+        }
+        if announced is not None:
+            report["discovery"] = announced
+        RELOADS.inc("ok")
+        RELOAD_SECONDS.set(value=t3 - t0)
+        LOG.info("config", "reloaded", **{k: (",".join(v) if isinstance(v, list) else v)
+                                          for k, v in report.items() if k not in ("ok", "discovery") and v != []})
+        for field in restart_required:
+            LOG.warning("config", "change needs a restart", field=field)
+        return report
+
+def _rejected(t0: float, errors: List[str]) -> Dict[str, Any]:
+    RELOADS.inc("error")
+    for err in errors:
+        LOG.error("config", "reload rejected; keeping current config", error=err)
+    return {"ok": False, "errors": errors, "total_ms": round((time.perf_counter() - t0) * 1e3, 2)}
+
+def _stamp(path: str) -> Tuple[int, int] | None:
+    for p in (path, os.path.splitext(path)[0] + ".yml"):  # wie load_config
+        try:
+            st = os.stat(p)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            continue
+    return None
+
+def start_reloader(app: Any, path: str) -> None:
+    """SIGHUP-Handler installieren (nur aus dem Haupt-Thread möglich) und, mit
+       reload.watch_interval > 0, einen Thread, der die Datei auf Änderungen prüft.
+    """
+    def run() -> None:
+        try:
+            reload_config(app, path)
+        except Exception as e:
+            RELOADS.inc("error")
+            LOG.error("config", "reload failed", error=e)
+
+    if hasattr(signal, "SIGHUP"):
+        try:
+            # im Handler nur einen Thread starten: reload_config nimmt Locks
+            signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(
+                target=run, name="config_reload", daemon=True).start())
+        except ValueError:
+            LOG.warning("config", "SIGHUP reload unavailable (not the main thread)")
+
+    interval = app.config["CFG"].reload.watch_interval
+    if interval <= 0:
+        return
+
+    def watch() -> None:
+        last = _stamp(path)
+        while True:
+            time.sleep(interval)
+            cur = _stamp(path)
+            if cur is not None and cur != last:
+                last = cur
+                run()
+
+    threading.Thread(target=watch, name="config_watch", daemon=True).start()
+    LOG.info("config", "watching for changes", path=path, interval_s=interval)
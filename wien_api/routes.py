@@ -1,52 +1,178 @@
 # wien_api/routes.py
+from __future__ import annotations
 import json, time
-from queue import Empty
-from flask import Blueprint, jsonify, Response, send_from_directory, stream_with_context, current_app
+from typing import Any, Dict, List, Tuple
+from flask import Blueprint, jsonify, Response, request, send_from_directory, stream_with_context, current_app
 from .ha_discovery import publish_discovery_for_board
 import paho.mqtt.client as mqtt
-from .state import LAST_DATA, HUB
-from .boards import build_board
+from .state import HUB, DataSnapshot, snapshot
+from .boards import board_ids, build_board, build_boards, get_board, get_boards, idents_for_board
+from .snapshots import SnapshotCache, respond
+from .model import CLOCK, items_json
+from .traffic import TRAFFIC
+from .metrics import REGISTRY
+from .refresh import REFRESH
+from .delta import SSE_DELTA
 
-def create_blueprint(web_dir: str, sse_snapshot_on_connect: bool) -> Blueprint:
+# ---------- SSE helpers (auch vom async-Server genutzt) ----------
+
+def stream_request(args, headers) -> Tuple[List[str], List[str], List[str], int | None]:
+    """/api/stream-Parameter: ?board=<id> / ?ident=<ident> (mehrfach/kommagetrennt), Last-Event-ID.
+       Rückgabe: (hub tags, boards, idents, last_event_id).
+    """
+    boards = [b for v in args.getlist("board") for b in v.split(",") if b]
+    idents = [i for v in args.getlist("ident") for i in v.split(",") if i]
+    tags = [f"board:{b}" for b in boards] + [f"ident:{i}" for i in idents]
+    raw = headers.get("Last-Event-ID") or args.get("lastEventId")
+    try:
+        last_id = int(raw) if raw else None
+    except ValueError:
+        last_id = None
+    return tags, boards, idents, last_id
+
+def _snapshot_items(snap: DataSnapshot, boards: List[str], idents: List[str], now: int | None = None,
+                    seqs: Dict[str, Tuple[int, Dict[str, Any]]] | None = None) -> List[Tuple[str, Dict[str, Any]]]:
+    """(ident, Item-JSON) gefiltert. seqs (delta.sse): für diese idents genau der Stand, auf den
+       sich die folgenden Deltas beziehen.
+    """
+    if not boards and not idents:
+        selected = snap.items()
+    else:
+        wanted = set(idents)
+        for b in boards:
+            wanted.update(idents_for_board(b))
+        selected = [(k, v) for k, v in snap.items() if k in wanted]
+    if seqs is None:
+        return [(k, v.to_json(now=now)) for k, v in selected]
+    return [(k, seqs[k][1] if k in seqs else v.to_json(now=now)) for k, v in selected]
+
+_SNAP_CACHE: Dict[Tuple[int, int | None, Tuple[str, ...], Tuple[str, ...]], str] = {}
+
+def snapshot_frame(cursor: int, boards: List[str], idents: List[str]) -> bytes | None:
+    """SSE-Snapshot-Frame (gefiltert wie der Stream); None, wenn nichts im Cache ist.
+       Das JSON wird pro Datenversion und Filter nur einmal erzeugt (Reconnect-Wellen).
+    """
+    with SSE_DELTA.lock:  # Cache-Stand und seqs aus demselben Moment
+        data = snapshot()
+        seqs = SSE_DELTA.states() if SSE_DELTA.enabled else None
+    now = CLOCK.now()
+    key = (data.version, now, tuple(boards), tuple(idents))
+    snap = _SNAP_CACHE.get(key)
+    if snap is None:
+        items = _snapshot_items(data, boards, idents, now, seqs)
+        if not items:
+            return None
+        msg = {
+            "type": "snapshot",
+            "ts": int(time.time()),
+            "items": [obj for _, obj in items]
+        }
+        if seqs is not None:  # delta.sse: ident -> seq des mitgeschickten Stands
+            msg["seqs"] = {k: seqs[k][0] for k, _ in items if k in seqs}
+        snap = json.dumps(msg, ensure_ascii=False)
+        if len(_SNAP_CACHE) >= 64:
+            _SNAP_CACHE.clear()
+        _SNAP_CACHE[key] = snap
+    return f"id: {cursor}\ndata: {snap}\n\n".encode("utf-8")
+
+def clear_snapshot_frames() -> None:
+    """Zwischengespeicherte Snapshot-Frames verwerfen (Reload: Board-Filter oder seqs geändert)."""
+    _SNAP_CACHE.clear()
+
+def create_blueprint(web_dir: str, sse_snapshot_on_connect: bool, compress: bool = False) -> Blueprint:
     bp = Blueprint("wien", __name__)
+    snapshots = SnapshotCache(compress=compress)
 
     @bp.get("/health")
     def health():
         return jsonify({"status": "ok"}), 200
 
+    @bp.get("/metrics")
+    def metrics():
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
     @bp.get("/api/wien")
     def api_wien():
-        return jsonify({
-            "source": "mqtt-cache",
-            "count": len(LAST_DATA),
-            "items": list(LAST_DATA.values())
-        })
+        data = snapshot()  # ein Stand für Version (ETag) und Inhalt
+        now = CLOCK.now()  # countdown.live: Countdowns je tick neu
+        def build():
+            items = items_json(data.values(), now=now)
+            return {"source": "mqtt-cache", "count": len(items), "items": items}
+        return respond(snapshots.get("wien", data.version if now is None else (data.version, now), build))
+
+    @bp.get("/api/item/<ident>")
+    def api_item(ident: str):
+        # Resync für delta.sse: Stand und seq, auf die sich das nächste Delta bezieht
+        cur = SSE_DELTA.current(ident)
+        if cur is not None:
+            return jsonify({"ident": ident, "seq": cur[0], "item": cur[1]})
+        item = snapshot().get(ident)
+        if item is None:
+            return jsonify({"error": "unknown ident", "ident": ident}), 404
+        return jsonify({"ident": ident, "seq": None, "item": item.to_json(now=CLOCK.now())})
+
+    @bp.get("/api/traffic")
+    def api_traffic():
+        # Störungsinfos nach ID (Monitore/Boards referenzieren sie per trafficInfoIds)
+        return respond(snapshots.get("traffic", TRAFFIC.version, TRAFFIC.to_json))
 
     @bp.get("/api/board/<board_id>")
     def api_board(board_id: str):
-        return jsonify(build_board(board_id))
+        refreshed = REFRESH.for_board(board_id)  # veraltete idents: gemeinsamer Fetch, höchstens refresh_deadline
+        board = get_board(board_id)
+        if board is None:
+            return jsonify(build_board(board_id))
+        # generatedAt = Zeitpunkt der letzten Änderung (Snapshot wird nur dann neu gebaut)
+        resp = respond(snapshots.get(f"board:{board_id}", board,
+                                     lambda: {**board, "generatedAt": int(time.time())}))
+        if refreshed != "off":
+            resp.headers["X-Refresh"] = refreshed  # fresh/refreshed/timeout/throttled/error
+        return resp
+
+    @bp.get("/api/boards")
+    def api_boards():
+        # ?ids=a,b,c (mehrfach/kommagetrennt); ohne ids: alle Boards. Ein Durchlauf über den Cache.
+        ids = [b for v in request.args.getlist("ids") for b in v.split(",") if b] or None
+        refreshed = REFRESH.for_boards(ids if ids is not None else board_ids())
+        boards = get_boards(ids)
+        unknown = [b for b in ids if b not in boards] if ids else []
+        # Version: die gecachten Board-Objekte (per Identität gleich, solange sich nichts ändert)
+        source = tuple(boards.values()) + (tuple(unknown),)
+        def build():
+            now = int(time.time())
+            out = {"count": len(boards), "boards": [{**b, "generatedAt": now} for b in boards.values()]}
+            if unknown:
+                out["unknown"] = unknown
+            return out
+        resp = respond(snapshots.get("boards:" + ",".join(ids or ()), source, build))
+        if refreshed != "off":
+            resp.headers["X-Refresh"] = refreshed
+        return resp
 
     @bp.get("/api/stream")
     def api_stream():
+        tags, boards, idents, last_id = stream_request(request.args, request.headers)
+
         @stream_with_context
         def event_stream():
-            q = HUB.subscribe()
+            sub = HUB.subscribe(tags, last_id)
+            # Snapshot beim Connect (ohne Last-Event-ID) bzw. Resync, wenn Events verpasst wurden
+            need_snapshot = last_id is None or sub.missed
             try:
-                if sse_snapshot_on_connect and LAST_DATA:
-                    snap = json.dumps({
-                        "type": "snapshot",
-                        "ts": int(time.time()),
-                        "items": list(LAST_DATA.values())
-                    }, ensure_ascii=False)
-                    yield f"data: {snap}\n\n"
                 while True:
-                    try:
-                        msg = q.get(timeout=30)
-                        yield f"data: {msg}\n\n"
-                    except Empty:
-                        yield ": ping\n\n"
+                    if need_snapshot:
+                        sub.missed = False
+                        snap = snapshot_frame(sub.cursor, boards, idents) if sse_snapshot_on_connect else None
+                        if snap:
+                            yield snap
+                    frames = HUB.wait(sub, 30)
+                    need_snapshot = sub.missed
+                    if frames:
+                        yield b"".join(frames)
+                    elif not need_snapshot:
+                        yield b": ping\n\n"
             finally:
-                HUB.unsubscribe(q)
+                HUB.unsubscribe(sub)
         return Response(event_stream(), headers={"Cache-Control": "no-cache"},
                         mimetype="text/event-stream")
 
@@ -54,15 +180,20 @@ def create_blueprint(web_dir: str, sse_snapshot_on_connect: bool) -> Blueprint:
     def index():
         return send_from_directory(web_dir, "index.html")
 
-    import paho.mqtt.client as mqtt
-    from .ha_discovery import publish_discovery_for_board
-
     @bp.post("/api/ha/announce")
     def ha_announce():
+        """Discovery abgleichen (nur Differenzen; ?force=1: alles neu senden)."""
         cfg = current_app.config.get("CFG")
         if not cfg or not cfg.mqtt.discovery or not cfg.mqtt.discovery.enabled:
             return jsonify({"ok": False, "error": "discovery disabled"}), 400
 
+        from .mqtt_worker import announce
+        force = request.args.get("force", "").lower() in ("1", "true", "yes")
+        res = announce(cfg, force=force)
+        if res is not None:
+            return jsonify({"ok": True, **res})
+
+        # kein Worker-Client in diesem Prozess: einmalige Verbindung, alles senden
         c = mqtt.Client(client_id="wien_api_announce", protocol=mqtt.MQTTv5,
                         callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
         if cfg.mqtt.username and cfg.mqtt.password:
@@ -71,8 +202,9 @@ def create_blueprint(web_dir: str, sse_snapshot_on_connect: bool) -> Blueprint:
             c.connect(cfg.mqtt.host, cfg.mqtt.port, keepalive=10)
             c.loop_start()
             boards = list((cfg.boards or {}).keys())
+            built = build_boards(boards)
             for board_id in boards:
-                publish_discovery_for_board(c, cfg, board_id)
+                publish_discovery_for_board(c, cfg, board_id, built.get(board_id))
             return jsonify({"ok": True, "boards": boards})
         finally:
             try:
@@ -0,0 +1,272 @@
+# wien_api/scheduler.py
+"""Poll-Scheduler: eine Deadline pro stopId/DIVA statt eines festen sleep für alle.
+
+Fest (wien.adaptive: false): jede ID alle interval_seconds, gemessen ab dem geplanten
+Zeitpunkt (keine Drift um die Fetch-Dauer).
+Adaptiv: das Intervall richtet sich nach dem nächsten Countdown der ID, wird in den
+quiet_hours gestreckt und bei Fehlern exponentiell verlängert (min_interval..max_interval).
+Ein globales Budget (max_requests_per_minute) begrenzt die Requests an Wiener Linien.
+"""
+from __future__ import annotations
+import heapq, threading, time
+from typing import Any, Dict, List, Tuple
+from .config import WienConf
+from .fetcher import build_batches, ident_params, param_ident
+from .model import NO_COUNTDOWN, Item
+
+Param = Tuple[str, str]  # ("diva", "60200607") / ("stopId", "1234")
+
+_COALESCE = 2.0   # Sekunden: knapp danach fällige IDs gleich mitnehmen (weniger Requests)
+_MAX_BACKOFF_STEPS = 6
+
+class _IdentStats:
+    __slots__ = ("interval", "errors", "last_fetch", "fetches", "achieved_sum", "achieved_min",
+                 "achieved_max", "achieved_last")
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval      # geplantes Intervall
+        self.errors = 0               # aufeinanderfolgende Fehler
+        self.last_fetch: float | None = None
+        self.fetches = 0
+        self.achieved_sum = 0.0       # tatsächliche Abstände zwischen zwei Fetches
+        self.achieved_min = 0.0
+        self.achieved_max = 0.0
+        self.achieved_last = 0.0
+
+    def record_fetch(self, now: float) -> None:
+        if self.last_fetch is not None and now < self.last_fetch:
+            return  # von einem später gestarteten (On-Demand-)Fetch überholt
+        if self.last_fetch is not None:
+            d = now - self.last_fetch
+            self.achieved_sum += d
+            self.achieved_last = d
+            self.achieved_min = d if self.fetches == 1 else min(self.achieved_min, d)
+            self.achieved_max = max(self.achieved_max, d)
+        self.last_fetch = now
+        self.fetches += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        n = self.fetches - 1  # Anzahl gemessener Abstände
+        return {
+            "interval": round(self.interval, 1),
+            "errors": self.errors,
+            "fetches": self.fetches,
+            "achieved_avg": round(self.achieved_sum / n, 1) if n > 0 else None,
+            "achieved_min": round(self.achieved_min, 1) if n > 0 else None,
+            "achieved_max": round(self.achieved_max, 1) if n > 0 else None,
+            "achieved_last": round(self.achieved_last, 1) if n > 0 else None,
+        }
+
+def nearest_countdown(item: Item) -> int | None:
+    """Kleinster Countdown (Minuten) über alle Monitore/Linien eines fetch_all-Ergebnisses."""
+    best = None
+    for mon in item.monitors:
+        for ln in mon.lines:
+            for cd in ln.countdown:
+                if cd != NO_COUNTDOWN and (best is None or cd < best):
+                    best = cd
+    return best
+
+def _in_quiet_hours(hours: List[int], now: float) -> bool:
+    if len(hours) < 2:
+        return False
+    start, end = hours[0], hours[1]
+    h = time.localtime(now).tm_hour
+    return start <= h < end if start <= end else (h >= start or h < end)
+
+class PollScheduler:
+    """Prioritätswarteschlange (fällig ab, seq, param) + Token-Bucket für das Request-Budget."""
+
+    def __init__(self, cfg: WienConf, clock=time.monotonic, wallclock=time.time) -> None:
+        self.cfg = cfg
+        self._clock = clock
+        self._wallclock = wallclock
+        self._lock = threading.Lock()
+        now = clock()
+        base = float(cfg.interval_seconds if not cfg.adaptive else cfg.min_interval)
+        self._heap: List[Tuple[float, int, Param]] = []
+        self._stats: Dict[Param, _IdentStats] = {}
+        self._seq = 0
+        for p in ident_params(cfg):
+            self._stats[p] = _IdentStats(base)
+            self._push(now, p)
+        self._rate = float(cfg.max_requests_per_minute)
+        self._tokens = self._rate
+        self._refilled = now
+        self.requests = 0     # gesendete Requests (Batches)
+        self.throttled = 0    # wegen Budget verschobene Requests
+        self._wake = threading.Event()  # update(): wait_due neu berechnen lassen
+
+    def update(self, cfg: WienConf) -> Tuple[List[Param], List[Param]]:
+        """Neue Konfiguration übernehmen (Reload): nur hinzugekommene IDs neu einplanen (sofort fällig),
+           entfernte IDs nicht mehr abfragen; alle übrigen behalten Plan und Statistik.
+           Rückgabe: (hinzugekommen, entfernt).
+        """
+        with self._lock:
+            now = self._clock()
+            wanted = ident_params(cfg)
+            added = [p for p in wanted if p not in self._stats]
+            removed = [p for p in self._stats if p not in set(wanted)]
+            for p in removed:
+                del self._stats[p]
+            if removed:
+                gone = set(removed)
+                self._heap = [e for e in self._heap if e[2] not in gone]
+                heapq.heapify(self._heap)
+            base = float(cfg.interval_seconds if not cfg.adaptive else cfg.min_interval)
+            for p in added:
+                self._stats[p] = _IdentStats(base)
+                self._push(now, p)
+            if float(cfg.max_requests_per_minute) != self._rate:
+                self._rate = float(cfg.max_requests_per_minute)
+                self._tokens = min(self._tokens, self._rate) if self._rate > 0 else 0.0
+            self.cfg = cfg
+        self._wake.set()
+        return added, removed
+
+    def _push(self, due: float, p: Param) -> None:
+        self._seq += 1
+        heapq.heappush(self._heap, (due, self._seq, p))
+
+    def _refill(self, now: float) -> None:
+        if self._rate > 0:
+            self._tokens = min(self._rate, self._tokens + (now - self._refilled) * self._rate / 60.0)
+        self._refilled = now
+
+    def next_wakeup(self) -> float:
+        """Monotone Zeit, zu der take_due() frühestens etwas liefert."""
+        with self._lock:
+            if not self._heap:
+                return self._clock() + self.cfg.max_interval
+            due = self._heap[0][0]
+            if self._rate > 0 and self._tokens < 1:
+                due = max(due, self._refilled + (1 - self._tokens) * 60.0 / self._rate)
+            return due
+
+    def take_due(self) -> List[Param]:
+        """Fällige IDs (plus knapp danach fällige), gekürzt auf das verfügbare Request-Budget."""
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            due: List[Tuple[float, int, Param]] = []
+            while self._heap and self._heap[0][0] <= now + _COALESCE:
+                due.append(heapq.heappop(self._heap))
+            if not due or not any(d <= now for d, _, _ in due):
+                for e in due:
+                    heapq.heappush(self._heap, e)
+                return []
+            params = [p for _, _, p in due]
+            batches = build_batches(self.cfg, params)
+            if self._rate > 0 and len(batches) > int(self._tokens):
+                allowed = int(self._tokens)
+                keep = {p for _, ps in batches[:allowed] for p in ps}
+                for e in due:
+                    if e[2] not in keep:
+                        heapq.heappush(self._heap, e)  # bleibt fällig, kommt beim nächsten Token dran
+                self.throttled += len(batches) - allowed
+                params = [p for p in params if p in keep]
+                batches = batches[:allowed]
+            if self._rate > 0:
+                self._tokens -= len(batches)
+            self.requests += len(batches)
+            return params
+
+    def wait_due(self, stop: threading.Event | None = None) -> List[Param]:
+        """Blockiert bis IDs fällig sind und liefert sie."""
+        while True:
+            delay = self.next_wakeup() - self._clock()
+            if delay > 0:
+                if stop is not None:
+                    if stop.wait(delay):
+                        return []
+                elif self._wake.wait(delay):
+                    self._wake.clear()
+                    continue  # Plan geändert (update)
+            params = self.take_due()
+            if params:
+                return params
+
+    def last_fetch(self, p: Param) -> float | None:
+        """Monotone Startzeit des letzten Fetches von p; None, wenn p nicht geplant oder noch nie abgefragt."""
+        st = self._stats.get(p)
+        return st.last_fetch if st is not None else None
+
+    def requests_for(self, params: List[Param]) -> int:
+        """Anzahl Upstream-Requests (Batches), die ein Fetch von params kostet."""
+        with self._lock:
+            return len(build_batches(self.cfg, params))
+
+    def acquire(self, params: List[Param]) -> bool:
+        """Außerplanmäßiger Fetch (On-Demand-Refresh): dessen Requests aus dem Budget nehmen.
+           False, wenn das Budget (max_requests_per_minute) gerade nicht reicht.
+        """
+        with self._lock:
+            n = len(build_batches(self.cfg, params))
+            if self._rate > 0:
+                self._refill(self._clock())
+                if self._tokens < n:
+                    self.throttled += n
+                    return False
+                self._tokens -= n
+            self.requests += n
+            return True
+
+    def record(self, p: Param, item: Item, started: float) -> float:
+        """Ergebnis eines Fetches (started = monotone Startzeit) verbuchen und neu einplanen.
+           Rückgabe: nächstes Intervall.
+        """
+        with self._lock:
+            st = self._stats.get(p)
+            if st is None:
+                return 0.0  # während des Fetches per update() entfernt
+            st.record_fetch(started)
+            st.errors = 0 if item.ok else st.errors + 1
+            st.interval = self._interval(st, item)
+            # ab dem Fetch-Start einplanen -> keine Drift um die Fetch-Dauer
+            self._push(started + st.interval, p)
+            return st.interval
+
+    def record_refresh(self, results: List[Tuple[Param, Item]], started: float) -> None:
+        """Außerplanmäßigen Fetch (On-Demand-Refresh) verbuchen: die geplante Abfrage dieser IDs
+           rückt auf started + Intervall. IDs, die gerade im Fetch-Loop unterwegs sind (nicht im
+           Heap), plant dessen record() ein.
+        """
+        with self._lock:
+            queued = {e[2] for e in self._heap}
+            moved = set()
+            for p, item in results:
+                st = self._stats.get(p)
+                if st is None:
+                    continue
+                st.record_fetch(started)
+                st.errors = 0 if item.ok else st.errors + 1
+                st.interval = self._interval(st, item)
+                if p in queued:
+                    moved.add(p)
+            if not moved:
+                return
+            self._heap = [e for e in self._heap if e[2] not in moved]
+            heapq.heapify(self._heap)
+            for p in moved:
+                self._push(started + self._stats[p].interval, p)
+
+    def _interval(self, st: _IdentStats, item: Item) -> float:
+        cfg = self.cfg
+        if not cfg.adaptive:
+            return float(cfg.interval_seconds)
+        lo, hi = float(cfg.min_interval), float(cfg.max_interval)
+        if st.errors:
+            return min(hi, lo * 2 ** min(st.errors, _MAX_BACKOFF_STEPS))
+        cd = nearest_countdown(item)
+        # nächste Abfahrt in cd Minuten -> etwa zur Hälfte der Zeit erneut nachsehen
+        iv = hi if cd is None else cd * 60.0 / 2
+        if _in_quiet_hours(cfg.quiet_hours, self._wallclock()):
+            iv *= cfg.quiet_factor
+            hi *= cfg.quiet_factor
+        return max(lo, min(hi, iv))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            idents = {param_ident(p): st.as_dict() for p, st in self._stats.items()}
+            return {"adaptive": self.cfg.adaptive, "requests": self.requests, "throttled": self.throttled,
+                    "queued": len(self._heap), "idents": idents}
@@ -0,0 +1,70 @@
+# wien_api/snapshots.py
+"""Vorserialisierte, versionierte HTTP-Antworten (ETag, 304, gzip/brotli)."""
+from __future__ import annotations
+import gzip, os, threading
+from typing import Any, Callable, Dict, Tuple
+from flask import Response, current_app, request
+
+try:  # optional
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# ETags bleiben über Neustarts eindeutig (Prozess-Token + laufende Nummer)
+_BOOT = os.urandom(4).hex()
+
+class Snapshot:
+    __slots__ = ("etag", "body", "gzip", "br")
+
+    def __init__(self, etag: str, body: bytes, compress: bool) -> None:
+        self.etag = etag
+        self.body = body
+        self.gzip = gzip.compress(body, compresslevel=6) if compress else None
+        self.br = brotli.compress(body) if (compress and brotli is not None) else None
+
+class SnapshotCache:
+    """Serialisiert ein Objekt genau einmal pro Version seiner Quelle.
+
+    `source` ist ein Versionsmarker: eine Versionsnummer (z.B. data_version()), ein Tupel
+    daraus (z.B. mit CLOCK.now()) oder ein gecachtes Objekt (z.B. aus get_board), verglichen
+    per Identität. Solange er gleich bleibt,
+    wird der gespeicherte Snapshot ausgeliefert.
+    """
+    max_entries = 512
+
+    def __init__(self, compress: bool = False) -> None:
+        self.compress = compress
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._entries: Dict[str, Tuple[Any, Snapshot]] = {}
+
+    def get(self, key: str, source: Any, build: Callable[[], Any]) -> Snapshot:
+        entry = self._entries.get(key)
+        if entry is not None and (entry[0] is source or (isinstance(source, (int, tuple)) and entry[0] == source)):
+            return entry[1]
+        body = current_app.json.dumps(build()).encode("utf-8") + b"\n"
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                self._entries.clear()  # Schlüssel aus Query-Parametern (/api/boards?ids=) begrenzen
+            self._seq += 1
+            snap = Snapshot(f"{_BOOT}-{self._seq}", body, self.compress)
+            self._entries[key] = (source, snap)
+        return snap
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+def respond(snap: Snapshot) -> Response:
+    """Antwort aus einem Snapshot: If-None-Match -> 304, sonst (ggf. komprimierter) Body."""
+    headers = {"ETag": f'"{snap.etag}"', "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if request.if_none_match.contains_weak(snap.etag):
+        return Response(status=304, headers=headers)
+    accept = request.accept_encodings
+    if snap.br is not None and accept["br"]:
+        body, headers["Content-Encoding"] = snap.br, "br"
+    elif snap.gzip is not None and accept["gzip"]:
+        body, headers["Content-Encoding"] = snap.gzip, "gzip"
+    else:
+        body = snap.body
+    return Response(body, headers=headers, mimetype="application/json")
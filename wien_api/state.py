@@ -1,34 +1,237 @@
-from queue import Queue
-from typing import Dict, Any, Set, List
+import threading, time
+from collections import deque
+from collections.abc import Mapping
+from itertools import islice
+from typing import Dict, Any, Set, List, Deque, FrozenSet, Iterable, Iterator, Tuple, Callable
+from .model import Item
+from .metrics import REGISTRY
+from .log import LOG
 
-# In‑Memory Cache der letzten MQTT‑Items (key = ident)
-LAST_DATA: Dict[str, Dict[str, Any]] = {}
+class DataSnapshot(Mapping):
+    """Unveränderlicher Stand des Caches (ident -> Item) mit Version.
 
-# Sehr leichte SSE‑Hub Umsetzung
+    Wird nie verändert, sondern bei jedem Schreiben durch einen neuen ersetzt (copy-on-write).
+    Leser holen sich mit snapshot() einen Stand und iterieren ihn ohne Lock und ohne Kopie;
+    Inhalt und version passen immer zusammen.
+    """
+    __slots__ = ("_data", "version")
+
+    def __init__(self, data: Dict[str, Item], version: int) -> None:
+        self._data = data        # gehört dem Snapshot; nach dem Erzeugen nie mehr verändert
+        self.version = version
+
+    def __getitem__(self, ident: str) -> Item:
+        return self._data[ident]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, ident: object) -> bool:
+        return ident in self._data
+
+    def get(self, ident: str, default: Any = None) -> Any:
+        return self._data.get(ident, default)
+
+    # direkt die dict-Views: das dict ändert sich nicht mehr
+    def keys(self):
+        return self._data.keys()
+
+    def values(self):
+        return self._data.values()
+
+    def items(self):
+        return self._data.items()
+
+_SNAPSHOT = DataSnapshot({}, 0)
+_write_lock = threading.Lock()  # nur Schreiber untereinander; Leser brauchen keinen Lock
+
+def snapshot() -> DataSnapshot:
+    """Aktueller Stand des Caches (konsistent, unveränderlich)."""
+    return _SNAPSHOT
+
+class _LiveView(Mapping):
+    """LAST_DATA: Lesezugriff auf den jeweils aktuellen Snapshot (jeder Aufruf für sich konsistent).
+       Wer mehrmals liest und einen gemeinsamen Stand braucht, nimmt snapshot().
+    """
+    __slots__ = ()
+
+    def __getitem__(self, ident: str) -> Item:
+        return _SNAPSHOT[ident]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(_SNAPSHOT)
+
+    def __len__(self) -> int:
+        return len(_SNAPSHOT)
+
+    def __contains__(self, ident: object) -> bool:
+        return ident in _SNAPSHOT
+
+    def get(self, ident: str, default: Any = None) -> Any:
+        return _SNAPSHOT.get(ident, default)
+
+    def keys(self):
+        return _SNAPSHOT.keys()
+
+    def values(self):
+        return _SNAPSHOT.values()
+
+    def items(self):
+        return _SNAPSHOT.items()
+
+# In‑Memory Cache der letzten Items (key = ident), nur lesend; schreiben über update_item & Co.
+LAST_DATA: Mapping[str, Item] = _LiveView()
+
+def _swap(data: Dict[str, Item]) -> int:
+    global _SNAPSHOT
+    _SNAPSHOT = DataSnapshot(data, _SNAPSHOT.version + 1)  # Zuweisung ist atomar
+    return _SNAPSHOT.version
+
+def update_item(ident: str, data: Item) -> int:
+    """Setzt LAST_DATA[ident] (neuer Snapshot) und erhöht die Datenversion. Rückgabe: neue Version."""
+    with _write_lock:
+        new = dict(_SNAPSHOT._data)
+        new[ident] = data
+        return _swap(new)
+
+def update_items(pairs: Iterable[Tuple[str, Item]]) -> int:
+    """Mehrere Einträge in einem Snapshot setzen (eine Kopie statt einer je Item). Rückgabe: Version."""
+    with _write_lock:
+        new = dict(_SNAPSHOT._data)
+        new.update(pairs)
+        return _swap(new)
+
+def remove_items(idents: Iterable[str]) -> int:
+    """Entfernt idents aus LAST_DATA (Reload: ID nicht mehr konfiguriert). Rückgabe: Anzahl entfernt."""
+    with _write_lock:
+        new = dict(_SNAPSHOT._data)
+        n = sum(new.pop(i, None) is not None for i in idents)
+        if n:
+            _swap(new)
+        return n
+
+def replace_items(data: Dict[str, Item]) -> int:
+    """Gesamten Inhalt ersetzen (Benchmarks, Tests). Rückgabe: neue Version."""
+    with _write_lock:
+        return _swap(dict(data))
+
+def data_version() -> int:
+    return _SNAPSHOT.version
+
+class Subscription:
+    """Lesezeiger eines SSE-Clients in den gemeinsamen Ring-Buffer des Hubs."""
+    __slots__ = ("cursor", "tags", "missed")
+
+    def __init__(self, cursor: int, tags: FrozenSet[str] | None) -> None:
+        self.cursor = cursor      # letzte gelieferte Event-ID
+        self.tags = tags          # None = alles; sonst z.B. {"board:jb", "ident:diva_60200607"}
+        self.missed = False       # Frames verpasst (Ring übergelaufen) -> Client neu synchronisieren
+
+# SSE-Hub: jedes Event wird einmal als fertiger Frame (bytes) kodiert und in einem
+# begrenzten Ring-Buffer abgelegt; Subscriber lesen per Cursor daraus (Replay via Last-Event-ID).
 class SSEHub:
-    def __init__(self) -> None:
-        self._subs: Set[Queue] = set()
+    def __init__(self, replay_size: int = 256) -> None:
+        self._cond = threading.Condition()
+        self._ring: Deque[Tuple[int, FrozenSet[str] | None, bytes]] = deque(maxlen=replay_size)
+        self._last_id = 0
+        self._subs: Set[Subscription] = set()
+        self._listeners: List[Callable[[FrozenSet[str] | None], None]] = []
+        self.dropped = 0  # Frames, die langsame Subscriber verpasst haben
 
-    def subscribe(self) -> Queue:
-        q: Queue = Queue(maxsize=100)
-        self._subs.add(q)
-        return q
+    def set_replay_size(self, n: int) -> None:
+        with self._cond:
+            self._ring = deque(self._ring, maxlen=max(int(n), 1))
 
-    def unsubscribe(self, q: Queue) -> None:
-        self._subs.discard(q)
+    @property
+    def last_id(self) -> int:
+        return self._last_id
 
-    def publish(self, json_str: str) -> None:
-        dead: List[Queue] = []
-        for q in list(self._subs):
+    def subscriber_count(self) -> int:
+        return len(self._subs)
+
+    def subscribe(self, tags: Iterable[str] | None = None, last_event_id: int | None = None) -> Subscription:
+        """Neuer Subscriber; mit last_event_id werden neuere Frames aus dem Ring nachgeliefert."""
+        with self._cond:
+            cursor = self._last_id
+            sub = Subscription(cursor, frozenset(tags) if tags else None)
+            if last_event_id is not None:
+                oldest = self._ring[0][0] if self._ring else self._last_id + 1
+                # älter als der Ring oder aus einem früheren Prozess: Snapshot ab jetzt statt Replay
+                sub.missed = last_event_id > self._last_id or last_event_id + 1 < oldest
+                if not sub.missed:
+                    sub.cursor = last_event_id
+
+            self._subs.add(sub)
+            return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._cond:
+            self._subs.discard(sub)
+
+    def add_listener(self, fn: Callable[[FrozenSet[str] | None], None]) -> None:
+        """fn(tags) wird nach jedem publish aufgerufen (z.B. um einen asyncio-Loop zu wecken)."""
+        with self._cond:
+            self._listeners.append(fn)
+
+    def remove_listener(self, fn: Callable[[FrozenSet[str] | None], None]) -> None:
+        with self._cond:
+            if fn in self._listeners:
+                self._listeners.remove(fn)
+
+    def publish(self, json_str: str, tags: Iterable[str] | None = None) -> int:
+        """Kodiert den Frame einmal und weckt alle Subscriber. Rückgabe: Event-ID."""
+        with self._cond:
+            self._last_id += 1
+            eid = self._last_id
+            frame = f"id: {eid}\ndata: {json_str}\n\n".encode("utf-8")
+            tagset = frozenset(tags) if tags else None
+            self._ring.append((eid, tagset, frame))
+            self._cond.notify_all()
+            listeners = list(self._listeners)
+        for fn in listeners:
             try:
-                q.put_nowait(json_str)
-            except Exception:
-                try:
-                    _ = q.get_nowait()
-                    q.put_nowait(json_str)
-                except Exception:
-                    dead.append(q)
-        for q in dead:
-            self.unsubscribe(q)
+                fn(tagset)
+            except Exception as e:
+                LOG.error("sse", "listener error", error=e, key="sse:listener", every=10.0)
+        return eid
+
+    def _collect(self, sub: Subscription) -> List[bytes]:
+        if sub.cursor >= self._last_id:
+            return []
+        if self._ring and self._ring[0][0] > sub.cursor + 1:
+            sub.missed = True
+            self.dropped += self._ring[0][0] - sub.cursor - 1
+        # nur die neuen Einträge am Ende des Rings ansehen
+        new = list(islice(reversed(self._ring), self._last_id - sub.cursor))
+        new.reverse()
+        out = [frame for _, tags, frame in new
+               if sub.tags is None or tags is None or not sub.tags.isdisjoint(tags)]
+        sub.cursor = self._last_id
+        return out
+
+    def poll(self, sub: Subscription) -> List[bytes]:
+        """Neue Frames für sub (nicht blockierend)."""
+        with self._cond:
+            return self._collect(sub)
+
+    def wait(self, sub: Subscription, timeout: float) -> List[bytes]:
+        """Wartet bis zu timeout Sekunden auf neue Frames für sub."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                frames = self._collect(sub)
+                remaining = deadline - time.monotonic()
+                if frames or sub.missed or remaining <= 0:
+                    return frames
+                self._cond.wait(remaining)
 
 HUB = SSEHub()
+
+REGISTRY.callback("wien_sse_subscribers", "Open SSE subscriptions", HUB.subscriber_count)
+REGISTRY.callback("wien_sse_events_total", "SSE events published", lambda: HUB.last_id, kind="counter")
+REGISTRY.callback("wien_sse_dropped_total", "SSE events a subscriber missed because the replay ring overflowed",
+                  lambda: HUB.dropped, kind="counter")
+REGISTRY.callback("wien_cache_items", "Entries in the departure cache", lambda: len(LAST_DATA))
@@ -0,0 +1,114 @@
+# wien_api/traffic.py
+"""Störungsinfos (trafficInfos) einmal pro Störungs-ID statt in jedem Monitor.
+
+Wiener Linien liefert trafficInfos/trafficInfoCategories pro Antwort; bisher landete der ganze
+Block in jedem Monitor, jedem Board-Eintrag und jedem Payload. Monitore speichern jetzt nur die
+IDs; der Inhalt liegt einmal in TRAFFIC (GET /api/traffic, MQTT {base}/traffic).
+Mit inline (Default, kompatibel) werden die Infos beim Serialisieren wieder eingesetzt.
+"""
+from __future__ import annotations
+import hashlib, json, threading
+from typing import Any, Dict, Iterable, List, Tuple
+
+Refs = Tuple[Tuple[str, ...], Tuple[Any, ...]]  # (trafficInfo-IDs, Kategorie-IDs)
+NO_REFS: Refs = ((), ())
+
+def _info_id(info: Dict[str, Any]) -> str:
+    name = info.get("name")
+    if isinstance(name, str) and name:
+        return name
+    # ohne name: Inhalt als Schlüssel
+    raw = json.dumps(info, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return "h_" + hashlib.blake2b(raw, digest_size=8).hexdigest()
+
+class TrafficStore:
+    """Störungs-ID -> Info, Kategorie-ID -> Kategorie. Gleicher Inhalt = dasselbe dict-Objekt."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._infos: Dict[str, Dict[str, Any]] = {}
+        self._categories: Dict[Any, Dict[str, Any]] = {}
+        self._rev: Dict[Any, int] = {}  # je Info/Kategorie: version der letzten Änderung (für Item.digest)
+        self._version = 0
+        self.inline = True
+
+    def set_inline(self, inline: bool) -> None:
+        self.inline = bool(inline)
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def intern(self, infos: Any, categories: Any) -> Refs:
+        """trafficInfos/trafficInfoCategories einer Antwort übernehmen; Rückgabe: die IDs."""
+        if isinstance(infos, dict):
+            infos = [infos] if infos else []
+        ids: List[str] = []
+        cat_ids: List[Any] = []
+        with self._lock:
+            for info in infos or ():
+                if not isinstance(info, dict):
+                    continue
+                iid = _info_id(info)
+                if self._infos.get(iid) != info:
+                    self._infos[iid] = info
+                    self._version += 1
+                    self._rev[iid] = self._version
+                if iid not in ids:
+                    ids.append(iid)
+            for cat in categories or ():
+                if not isinstance(cat, dict):
+                    continue
+                cid = cat.get("id")
+                if self._categories.get(cid) != cat:
+                    self._categories[cid] = cat
+                    self._version += 1
+                    self._rev[("cat", cid)] = self._version
+                if cid not in cat_ids:
+                    cat_ids.append(cid)
+        return tuple(ids), tuple(cat_ids)
+
+    def infos(self, ids: Iterable[str]) -> List[Dict[str, Any]]:
+        get = self._infos.get
+        return [i for i in map(get, ids) if i is not None]
+
+    def categories(self, ids: Iterable[Any]) -> List[Dict[str, Any]]:
+        get = self._categories.get
+        return [c for c in map(get, ids) if c is not None]
+
+    def revisions(self, refs: Refs) -> Tuple[int, ...]:
+        """Änderungszähler der referenzierten Infos und Kategorien (Inhalt ändert sich -> Tupel auch)."""
+        get = self._rev.get
+        return tuple(get(i, 0) for i in refs[0]) + tuple(get(("cat", c), 0) for c in refs[1])
+
+    def prune(self, live: Refs) -> int:
+        """Alles entfernen, was kein Monitor mehr referenziert. Rückgabe: Anzahl entfernter Infos."""
+        info_ids, cat_ids = set(live[0]), set(live[1])
+        with self._lock:
+            dead = [i for i in self._infos if i not in info_ids]
+            dead_cats = [c for c in self._categories if c not in cat_ids]
+            for i in dead:
+                del self._infos[i]
+                self._rev.pop(i, None)
+            for c in dead_cats:
+                del self._categories[c]
+                self._rev.pop(("cat", c), None)
+            if dead or dead_cats:
+                self._version += 1
+            return len(dead)
+
+    def to_json(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"version": self._version,
+                    "infos": dict(self._infos),
+                    "categories": {str(k): v for k, v in self._categories.items()}}
+
+    def load_json(self, d: Dict[str, Any]) -> None:
+        """Gegenstück zu to_json (Read-Replica: {base}/traffic)."""
+        infos = d.get("infos") or {}
+        cats = d.get("categories") or {}
+        refs = self.intern(list(infos.values()) if isinstance(infos, dict) else infos,
+                           list(cats.values()) if isinstance(cats, dict) else cats)
+        self.prune(refs)
+
+TRAFFIC = TrafficStore()
@@ -1,7 +1,43 @@
-import re
+import hashlib, json, re
+from typing import Any, Dict, Tuple
 
 _topic_safe_re = re.compile(r"[^A-Za-z0-9_.\-]")
 
 def safe_topic_fragment(s: str | None) -> str:
     """Nur A‑Z a‑z 0‑9 _ . - zulassen – Rest durch '_' ersetzen."""
     return _topic_safe_re.sub("_", (s or "").strip())
+
+def content_hash(obj: Any, ignore: Tuple[str, ...] = ("ts",)) -> bytes:
+    """Stabiler Hash eines JSON-Objekts; Top-Level-Schlüssel in `ignore` (z.B. ts) zählen nicht."""
+    if isinstance(obj, dict) and ignore:
+        obj = {k: v for k, v in obj.items() if k not in ignore}
+    raw = json.dumps(obj, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=12).digest()
+
+class PublishCache:
+    """Hash des zuletzt gesendeten Payloads pro Topic; unveränderte Payloads werden übersprungen."""
+    def __init__(self) -> None:
+        self._hashes: Dict[str, bytes] = {}
+        self.sent = 0
+        self.skipped = 0
+
+    def changed(self, topic: str, obj: Any) -> bool:
+        """True (und merken), wenn obj sich seit dem letzten Senden auf topic geändert hat."""
+        return self.changed_digest(topic, content_hash(obj))
+
+    def changed_digest(self, topic: str, h: bytes) -> bool:
+        """Wie changed(), mit bereits berechnetem Hash."""
+        if self._hashes.get(topic) == h:
+            self.skipped += 1
+            return False
+        self._hashes[topic] = h
+        self.sent += 1
+        return True
+
+    def forget(self, topic: str) -> None:
+        """Nach fehlgeschlagenem Publish: beim nächsten Mal wieder senden."""
+        self._hashes.pop(topic, None)
+
+    def clear(self) -> None:
+        """Z.B. nach (Re)Connect – der Broker hat evtl. keine retained Messages mehr."""
+        self._hashes.clear()